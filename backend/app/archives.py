@@ -0,0 +1,98 @@
+import gzip
+import tarfile
+import zipfile
+import zlib
+from pathlib import PurePosixPath
+from typing import BinaryIO, Iterator
+from .config import settings
+from .storage import save_gzip_stream, save_stream
+
+# longest suffix first: .tar.gz is a bundle, a bare .gz one compressed file
+ARCHIVE_SUFFIXES = (
+    (".tar.gz", "tar.gz"), (".tgz", "tar.gz"), (".tar.zst", "tar.zst"), (".tzst", "tar.zst"),
+    (".tar", "tar"), (".zip", "zip"), (".gz", "gz"), (".zst", "zst"),
+)
+
+def archive_kind(file_name: str) -> str | None:
+    name = file_name.lower()
+    return next((kind for suffix, kind in ARCHIVE_SUFFIXES if name.endswith(suffix)), None)
+
+def _zstd_reader(src: BinaryIO) -> BinaryIO:
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd archives need the zstandard package") from None
+    return zstandard.ZstdDecompressor().stream_reader(src, read_across_frames=True)
+
+def _corrupt_errors() -> tuple:
+    # what reading a damaged member raises, per format
+    errors = (gzip.BadGzipFile, EOFError, zlib.error, zipfile.BadZipFile, tarfile.TarError)
+    try:
+        import zstandard
+    except ImportError:
+        return errors
+    return errors + (zstandard.ZstdError,)
+
+def _skipped(member: str) -> bool:
+    # directories and OS metadata (__MACOSX/, .DS_Store, ._resource forks)
+    parts = PurePosixPath(member).parts
+    return not parts or parts[0] == "__MACOSX" or parts[-1].startswith(".")
+
+def iter_members(file_name: str, src: BinaryIO) -> Iterator[tuple[str, BinaryIO]]:
+    """Yields (member name, stream) for every feed file in an upload, decompressing on the fly.
+
+    Bundle members are named "<archive>/<member path>"; non-archives yield themselves. Each stream must be read before asking for the next one;
+    only zip needs a seekable `src` (FastAPI spools uploads to a temp file).
+    """
+    kind = archive_kind(file_name)
+    if kind is None:
+        yield file_name, src
+    elif kind == "zip":
+        try:
+            with zipfile.ZipFile(src) as zf:
+                for info in zf.infolist():
+                    if info.is_dir() or _skipped(info.filename):
+                        continue
+                    with zf.open(info) as member:
+                        yield f"{file_name}/{info.filename}", member
+        except zipfile.BadZipFile as e:
+            raise ValueError(f"Invalid zip file {file_name}: {e}") from e
+    elif kind in ("gz", "zst"):
+        stream = gzip.GzipFile(fileobj=src, mode="rb") if kind == "gz" else _zstd_reader(src)
+        yield file_name[: -len(PurePosixPath(file_name).suffix)], stream
+    else:
+        if kind == "tar.gz":
+            src = gzip.GzipFile(fileobj=src, mode="rb")
+        elif kind == "tar.zst":
+            src = _zstd_reader(src)
+        try:
+            # stream mode ("r|"): members are read in order, never seeking back
+            with tarfile.open(fileobj=src, mode="r|") as tf:
+                for info in tf:
+                    if info.isfile() and not _skipped(info.name):
+                        yield f"{file_name}/{info.name}", tf.extractfile(info)
+        except tarfile.TarError as e:
+            raise ValueError(f"Invalid tar file {file_name}: {e}") from e
+
+def store_upload(file_name: str, src: BinaryIO) -> list[tuple[str, str, str, int]]:
+    """Stores every feed file in an upload; returns [(member name, stored_path, sha256, size)].
+
+    A plain .gz is kept compressed on disk with INGEST_KEEP_GZIP; other archives are expanded
+    member by member. Blocking; call from a worker thread.
+    """
+    if settings.ingest_keep_gzip and archive_kind(file_name) == "gz":
+        return [(file_name, *save_gzip_stream(file_name, src))]
+    stored = []
+    corrupt = _corrupt_errors()
+    try:
+        for name, member in iter_members(file_name, src):
+            try:
+                stored.append((name, *save_stream(name, member)))
+            except ValueError as e:
+                raise ValueError(f"{name}: {e}") from e
+    except corrupt as e:
+        # decompression errors surface while a member is read, or while a tar seeks the next one
+        raise ValueError(f"Invalid archive {file_name}: {e}") from e
+    if not stored:
+        raise ValueError(f"No files in {file_name}")
+    return stored
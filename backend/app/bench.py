@@ -0,0 +1,464 @@
+"""Synthetic vendor feeds and an end-to-end ingest -> ETL -> query benchmark.
+
+    python -m app.bench --rows 300000 --reject-rate 0.02 --fx-days 30 --out bench.json
+    python -m app.bench --database-url postgresql+psycopg://...  # scratch database only
+    python -m app.bench --startup --repeat 5  # API cold start: import, first request
+    python -m app.bench --load --concurrency 64 --requests 5000  # read endpoints, sync vs async
+
+Prints one JSON document (rows/sec per phase, p50/p95 latency per endpoint) so results
+can be diffed across commits. Without --database-url it uses a throwaway SQLite file.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+BASE_DAY = datetime(2025, 12, 20)
+# AED per unit; synthetic days drift a little around these
+FX_BASE = {"USD": 3.6725, "EUR": 4.0200}
+VENDOR_KEYS = {"V-A": "vendor_a", "V-B": "vendor_b", "V-C": "vendor_c"}
+# bad rows cycle through these (fx_error uses a currency with no rates)
+REJECT_KINDS = ("unknown_product_alias", "non_positive_price", "missing_vendor_sku", "fx_error")
+
+def synthetic_fx(fx_days: int, seed: int = 42) -> list[tuple[datetime, str, str, float]]:
+    """Daily X->AED and AED->X rates for the `fx_days` days ending on BASE_DAY."""
+    rng = random.Random(seed)
+    rows = []
+    for d in range(fx_days):
+        day = BASE_DAY - timedelta(days=d)
+        for ccy, base in FX_BASE.items():
+            rate = round(base * (1 + rng.uniform(-0.01, 0.01)), 6)
+            rows.append((day, ccy, "AED", rate))
+            rows.append((day, "AED", ccy, round(1 / rate, 6)))
+    return rows
+
+def _observed_at(i: int, fx_days: int) -> datetime:
+    # row i lands on day (i % fx_days); the offset within the day keeps (sku, time) unique
+    n = i // fx_days
+    return BASE_DAY - timedelta(days=i % fx_days) + timedelta(seconds=n % 86400, microseconds=n // 86400)
+
+def _rows(vendor_id: str, skus: list[tuple[str, str]], currency: str, rows: int, reject_rate: float, fx_days: int, rng: random.Random, sku_index=None):
+    # yields (vendor_sku, name, price, currency, observed_at)
+    for i in range(rows):
+        sku, name = skus[sku_index(i) if sku_index else i % len(skus)]
+        price = round(rng.uniform(50, 5000), 2)
+        ccy = currency
+        if rng.random() < reject_rate:
+            kind = REJECT_KINDS[i % len(REJECT_KINDS)]
+            if kind == "unknown_product_alias":
+                sku = f"UNKNOWN-{vendor_id}-{i}"
+            elif kind == "non_positive_price":
+                price = -price
+            elif kind == "missing_vendor_sku":
+                sku = ""
+            else:
+                ccy = "GBP"
+        yield sku, name, price, ccy, _observed_at(i, fx_days)
+
+def generate_feeds(
+    out_dir: str,
+    aliases: dict[str, list[tuple[str, str]]],
+    currencies: dict[str, str],
+    rows: int,
+    reject_rate: float = 0.02,
+    fx_days: int = 1,
+    seed: int = 42,
+) -> list[tuple[str, str, int]]:
+    """Writes Vendor A/B/C feeds totalling about `rows` rows; returns (vendor_key, path, rows).
+
+    `aliases` is vendor_id -> [(vendor_sku, vendor_name_raw)] from the catalog and
+    `currencies` vendor_id -> default currency. Vendor B gets one JSON file per day, since
+    its format carries a single asOf per file.
+    """
+    rng = random.Random(seed)
+    per_vendor = rows // 3
+    files = []
+
+    for vendor_id, header in (("V-A", ("sku", "name", "price", "currency", "date")),
+                              ("V-C", ("vendor_code", "desc", "unit_price", "ccy", "as_of"))):
+        path = os.path.join(out_dir, f"{VENDOR_KEYS[vendor_id]}.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(header)
+            for sku, name, price, ccy, ts in _rows(vendor_id, aliases[vendor_id], currencies[vendor_id], per_vendor, reject_rate, fx_days, rng):
+                w.writerow((sku, name, f"{price:.2f}", ccy, ts.isoformat()))
+        files.append((VENDOR_KEYS[vendor_id], path, per_vendor))
+
+    n_skus = len(aliases["V-B"])
+    chunks: dict[tuple[int, int], list] = {}
+    b_rows = _rows("V-B", aliases["V-B"], currencies["V-B"], per_vendor, reject_rate, fx_days, rng,
+                   sku_index=lambda i: (i // fx_days) % n_skus)
+    for i, (sku, name, price, ccy, _) in enumerate(b_rows):
+        key = (i % fx_days, (i // fx_days) // n_skus)
+        chunks.setdefault(key, []).append({"partNumber": sku, "title": name, "pricing": {"amount": price, "ccy": ccy}})
+    for (d, c), items in sorted(chunks.items()):
+        path = os.path.join(out_dir, f"vendor_b_{d:03d}_{c:04d}.json")
+        as_of = BASE_DAY - timedelta(days=d) + timedelta(hours=8, minutes=30, seconds=c)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"asOf": as_of.isoformat(), "items": items}, f)
+        files.append(("vendor_b", path, len(items)))
+    return files
+
+def percentiles(samples: list[float]) -> dict:
+    s = sorted(samples)
+    pick = lambda p: s[min(len(s) - 1, round(p * (len(s) - 1)))]
+    return {
+        "n": len(s),
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "max_ms": round(s[-1] * 1000, 3),
+    }
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def _prepare_catalog(db, extra_products: int, fx_days: int):
+    from sqlalchemy import select, insert
+    from .models import Vendor, Product, ProductAlias, FXRate
+    from .seed import seed
+    from .transform.lookup import invalidate_lookups
+
+    seed(db)
+    have = set(db.execute(select(Product.id).where(Product.id.like("P-SYN-%"))).scalars())
+    new = [n for n in range(extra_products) if f"P-SYN-{n:05d}" not in have]
+    if new:
+        db.execute(insert(Product), [
+            {"id": f"P-SYN-{n:05d}", "canonical_name": f"Synthetic Part {n}", "category": f"SYN-{n % 10}"}
+            for n in new
+        ])
+        db.execute(insert(ProductAlias), [
+            {"vendor_id": v, "vendor_sku": f"SYN-{v}-{n:05d}", "product_id": f"P-SYN-{n:05d}", "vendor_name_raw": f"Synthetic Part {n} ({v})"}
+            for v in VENDOR_KEYS for n in new
+        ])
+    have = set(db.execute(select(FXRate.fx_date, FXRate.base_currency, FXRate.quote_currency)).all())
+    fx = [
+        {"fx_date": d, "base_currency": b, "quote_currency": q, "rate": r}
+        for d, b, q, r in synthetic_fx(fx_days) if (d, b, q) not in have
+    ]
+    if fx:
+        db.execute(insert(FXRate), fx)
+    db.commit()
+    invalidate_lookups()
+
+    aliases: dict[str, list[tuple[str, str]]] = {v: [] for v in VENDOR_KEYS}
+    for vendor_id, sku, name in db.execute(
+        select(ProductAlias.vendor_id, ProductAlias.vendor_sku, ProductAlias.vendor_name_raw).order_by(ProductAlias.id)
+    ):
+        if vendor_id in aliases:
+            aliases[vendor_id].append((sku, name or ""))
+    currencies = dict(db.execute(select(Vendor.id, Vendor.default_currency)).all())
+    products = list(db.execute(select(Product.id).order_by(Product.id)).scalars())
+    return aliases, currencies, products
+
+def _time_requests(client, paths: list[str], cold: bool) -> dict:
+    from .response_cache import bump_generation
+    samples = []
+    for path in paths:
+        if cold:
+            bump_generation()
+        t0 = time.perf_counter()
+        r = client.get(path)
+        samples.append(time.perf_counter() - t0)
+        if r.status_code != 200:
+            raise RuntimeError(f"GET {path} -> {r.status_code}: {r.text[:200]}")
+    return percentiles(samples)
+
+def _load_dataset(client, args) -> dict:
+    """Catalog + synthetic feeds -> /ingest -> one ETL run, through the API."""
+    from .db import SessionLocal
+
+    os.makedirs(args.feeds_dir, exist_ok=True)
+    with SessionLocal() as db:
+        aliases, currencies, products = _prepare_catalog(db, args.products, args.fx_days)
+
+    t0 = time.perf_counter()
+    files = generate_feeds(args.feeds_dir, aliases, currencies, args.rows, args.reject_rate, args.fx_days, args.seed)
+    generate_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for vendor_key, path, _ in files:
+        with open(path, "rb") as fh:
+            r = client.post(f"/ingest/{vendor_key}", files={"file": (os.path.basename(path), fh)})
+        if r.status_code != 200:
+            raise RuntimeError(f"ingest {path} -> {r.status_code}: {r.text[:200]}")
+    ingest_s = time.perf_counter() - t0
+
+    params = {k: v for k, v in (("workers", args.workers), ("mode", args.mode)) if v}
+    run_id = client.post("/run-etl", params=params).json()["run_id"]
+    while (etl := client.get(f"/runs/{run_id}").json())["status"] in ("QUEUED", "RUNNING"):
+        time.sleep(0.05)
+    if etl["status"] == "FAILED":
+        raise RuntimeError(f"ETL run {run_id} failed: {etl['message']}")
+    return {
+        "files": files,
+        "products": products,
+        "generate_s": generate_s,
+        "ingest_s": ingest_s,
+        "etl": etl,
+        "etl_s": (datetime.fromisoformat(etl["finished_at"]) - datetime.fromisoformat(etl["started_at"])).total_seconds(),
+    }
+
+def run_benchmark(args) -> dict:
+    from fastapi.testclient import TestClient
+    from .db import engine
+    from .main import app
+    from .migrate import migrate
+
+    migrate()
+    rng = random.Random(args.seed)
+    with TestClient(app) as client:
+        data = _load_dataset(client, args)
+        files, products, etl = data["files"], data["products"], data["etl"]
+        generate_s, ingest_s, etl_s = data["generate_s"], data["ingest_s"], data["etl_s"]
+        rows = sum(n for _, _, n in files)
+        size = sum(os.path.getsize(p) for _, p, _ in files)
+
+        sample = [rng.choice(products) for _ in range(args.queries)]
+        endpoints = {
+            "/cheapest": ["/cheapest"] * args.queries,
+            "/compare": [f"/compare/{p}" for p in sample],
+            "/history": [f"/history/{p}" for p in sample],
+            "/history?bucket=day": [f"/history/{p}?bucket=day" for p in sample],
+        }
+        queries = {
+            name: {"cold": _time_requests(client, paths, cold=True), "warm": _time_requests(client, paths, cold=False)}
+            for name, paths in endpoints.items()
+        }
+
+    return {
+        "commit": _git_commit(),
+        "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "database": engine.dialect.name,
+        "params": {
+            "rows": args.rows, "reject_rate": args.reject_rate, "fx_days": args.fx_days, "products": args.products,
+            "seed": args.seed, "workers": args.workers, "mode": args.mode, "queries": args.queries,
+        },
+        "feeds": {"files": len(files), "rows": rows, "bytes": size, "generate_seconds": round(generate_s, 3)},
+        "ingest": {"seconds": round(ingest_s, 3), "rows_per_sec": round(rows / ingest_s, 1), "mb_per_sec": round(size / ingest_s / 1e6, 2)},
+        "etl": {
+            "seconds": round(etl_s, 3),
+            "rows_per_sec": round(rows / etl_s, 1),
+            "loaded_rows": etl["loaded_rows"],
+            "rejected_rows": etl["rejected_rows"],
+            "duplicate_rows": etl["duplicate_rows"],
+            "stages": etl.get("stages"),
+        },
+        "queries": queries,
+    }
+
+def _get(url: str, timeout: float) -> int | None:
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as r:
+            return r.status
+    except OSError:
+        return None
+
+def _spawn_api(backend_dir: str, env: dict) -> tuple[subprocess.Popen, str]:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    # stderr goes to a file: an unread pipe would block the server once it fills up
+    log = tempfile.TemporaryFile()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=backend_dir, env=env, stdout=subprocess.DEVNULL, stderr=log,
+    )
+    proc.log = log
+    return proc, f"http://127.0.0.1:{port}"
+
+def _api_log(proc: subprocess.Popen) -> str:
+    proc.log.seek(0)
+    return proc.log.read().decode(errors="replace")
+
+def _wait_ready(proc: subprocess.Popen, base: str, timeout: float = 60.0):
+    t0 = time.perf_counter()
+    while _get(f"{base}/health", 1.0) != 200:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited: {_api_log(proc)[-500:]}")
+        if time.perf_counter() - t0 > timeout:
+            raise RuntimeError("API did not become ready")
+        time.sleep(0.005)
+
+def _stop_api(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+    proc.log.close()
+
+def _time_startup(backend_dir: str, env: dict, timeout: float = 60.0) -> dict:
+    # one fresh uvicorn process: spawn -> first /health 200 -> first /products 200
+    t0 = time.perf_counter()
+    proc, base = _spawn_api(backend_dir, env)
+    try:
+        _wait_ready(proc, base, timeout)
+        ready = time.perf_counter() - t0
+        if _get(f"{base}/products", timeout) != 200:
+            raise RuntimeError("GET /products failed")
+        return {"ready": ready, "first_query": time.perf_counter() - t0}
+    finally:
+        _stop_api(proc)
+
+def run_startup_benchmark(args) -> dict:
+    """Cold-start cost of an API process: `import app.main`, then spawn -> first responses."""
+    from .db import SessionLocal, engine
+    from .migrate import migrate
+    from .seed import seed
+
+    migrate()
+    with SessionLocal() as db:
+        seed(db)
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    imports, ready, first_query = [], [], []
+    for _ in range(args.repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"],
+            cwd=backend_dir, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        imports.append(float(out.strip().splitlines()[-1]))
+        t = _time_startup(backend_dir, env)
+        ready.append(t["ready"])
+        first_query.append(t["first_query"])
+    return {
+        "commit": _git_commit(),
+        "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "database": engine.dialect.name,
+        "params": {"repeat": args.repeat},
+        "startup": {
+            "import_app_main": percentiles(imports),
+            "spawn_to_health": percentiles(ready),
+            "spawn_to_first_query": percentiles(first_query),
+        },
+    }
+
+async def _load(base: str, paths: list[str], concurrency: int) -> dict:
+    # `concurrency` clients, each sending its next request as soon as the previous one returns
+    import httpx
+
+    latencies: list[float] = []
+    errors = 0
+    pending = iter(paths)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=120) as client:
+        async def worker():
+            nonlocal errors
+            for path in pending:
+                t0 = time.perf_counter()
+                r = await client.get(path)
+                latencies.append(time.perf_counter() - t0)
+                errors += r.status_code != 200
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "latency": percentiles(latencies),
+    }
+
+def run_load_benchmark(args) -> dict:
+    """Read endpoints under concurrent load, API_ASYNC_READS=0 (sync engine on the threadpool)
+    vs 1 (async engine), each against a fresh uvicorn process on the same loaded database."""
+    from fastapi.testclient import TestClient
+    from .db import engine
+    from .main import app
+    from .migrate import migrate
+
+    migrate()
+    with TestClient(app) as client:
+        data = _load_dataset(client, args)
+    rng = random.Random(args.seed)
+    products = data["products"]
+    mix = (
+        lambda: "/cheapest?limit=50",
+        lambda: f"/compare/{rng.choice(products)}",
+        lambda: f"/history/{rng.choice(products)}?limit=200",
+        lambda: "/ingestions",
+        lambda: "/rejections?limit=20",
+    )
+    paths = [rng.choice(mix)() for _ in range(args.requests)]
+    warmup = paths[: min(len(paths), 200)]
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    for mode, flag in (("sync", "0"), ("async", "1")):
+        # the response cache would hide the database; the queue worker would compete for it
+        env = dict(os.environ, API_ASYNC_READS=flag, RESPONSE_CACHE_TTL="0", ETL_INPROCESS_WORKER="0")
+        proc, base = _spawn_api(backend_dir, env)
+        try:
+            _wait_ready(proc, base)
+            asyncio.run(_load(base, warmup, args.concurrency))
+            results[mode] = asyncio.run(_load(base, paths, args.concurrency))
+        finally:
+            _stop_api(proc)
+    return {
+        "commit": _git_commit(),
+        "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "database": engine.dialect.name,
+        "params": {
+            "rows": args.rows, "products": args.products, "seed": args.seed,
+            "concurrency": args.concurrency, "requests": args.requests,
+        },
+        "endpoints": ["/cheapest?limit=50", "/compare/{id}", "/history/{id}?limit=200", "/ingestions", "/rejections?limit=20"],
+        "load": results,
+    }
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m app.bench", description=__doc__.splitlines()[0])
+    p.add_argument("--rows", type=int, default=30000, help="total source rows across vendors")
+    p.add_argument("--reject-rate", type=float, default=0.02)
+    p.add_argument("--fx-days", type=int, default=7, help="days of observations (and FX rates) to spread rows over")
+    p.add_argument("--products", type=int, default=1000, help="synthetic products added on top of the seeded catalog")
+    p.add_argument("--queries", type=int, default=50, help="requests per endpoint")
+    p.add_argument("--workers", type=int)
+    p.add_argument("--mode", choices=("row", "columnar"))
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--database-url", help="default: a temporary SQLite file")
+    p.add_argument("--feeds-dir", help="keep the generated feeds here (default: a temp dir, removed afterwards)")
+    p.add_argument("--out", help="also write the JSON result here")
+    p.add_argument("--startup", action="store_true", help="time API cold starts instead of the ETL pipeline")
+    p.add_argument("--repeat", type=int, default=5, help="cold starts to time with --startup")
+    p.add_argument("--load", action="store_true", help="load-test the read endpoints, sync vs async engine")
+    p.add_argument("--concurrency", type=int, default=64, help="concurrent clients with --load")
+    p.add_argument("--requests", type=int, default=5000, help="requests per mode with --load")
+    args = p.parse_args(argv)
+
+    # settings are read at import time, so point them at the bench database first
+    tmp = tempfile.mkdtemp(prefix="price-bench-db-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/bench.db"
+    os.environ.setdefault("STORAGE_DIR", os.path.join(tmp, "storage"))
+    os.environ.setdefault("ETL_POLL_INTERVAL", "0.05")
+    args.feeds_dir = args.feeds_dir or os.path.join(tmp, "feeds")
+
+    try:
+        bench = run_startup_benchmark if args.startup else run_load_benchmark if args.load else run_benchmark
+        result = json.dumps(bench(args), indent=2)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(result)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(result + "\n")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""Bulk catalog import: products and vendor SKU aliases from CSV or JSON Lines.
+
+    python -m app.catalog_import --products products.csv --aliases aliases.jsonl [--remap]
+
+Both files are staged into temp tables (COPY on Postgres) and merged with set-based upserts
+in one transaction: products first, so aliases can point at products from the same import.
+"""
+import argparse
+import csv
+import json
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from .storage import CHUNK_SIZE
+from .transform.lookup import invalidate_lookups
+from .response_cache import bump_generation
+
+# header / JSON key -> staging column
+PRODUCT_FIELDS = {
+    "id": "id", "product_id": "id",
+    "canonical_name": "canonical_name", "name": "canonical_name",
+    "category": "category",
+}
+ALIAS_FIELDS = {
+    "vendor_id": "vendor_id", "vendor": "vendor_id",
+    "vendor_sku": "vendor_sku", "sku": "vendor_sku",
+    "product_id": "product_id",
+    "vendor_name_raw": "vendor_name_raw", "name": "vendor_name_raw",
+}
+PRODUCT_COLUMNS = ("id", "canonical_name", "category")
+ALIAS_COLUMNS = ("vendor_id", "vendor_sku", "product_id", "vendor_name_raw")
+INSERT_BATCH = 10_000
+
+def file_format(file_name: str) -> str:
+    return "jsonl" if file_name.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+def _csv_columns(header_line: str, fields: dict, columns: tuple, kind: str) -> list[str]:
+    # unknown header columns are staged as _skip<i> and ignored
+    header = next(csv.reader([header_line]), [])
+    cols = [fields.get(h.strip().lower(), f"_skip{i}") for i, h in enumerate(header)]
+    required = set(columns) - {"vendor_name_raw"}
+    if required - set(cols):
+        raise ValueError(f"{kind} CSV header needs {', '.join(c for c in columns if c in required)} (got {','.join(header)})")
+    return cols
+
+def _jsonl_rows(f, fields: dict, columns: tuple):
+    for n, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            rec = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {n}: {e}") from e
+        row = dict.fromkeys(columns)
+        for k, v in rec.items():
+            if (col := fields.get(k.lower())) and v is not None:
+                row[col] = str(v)
+        yield tuple(row[c] for c in columns)
+
+def _stage(db: Session, table: str, cols: list[str], rows=None, raw_csv=None):
+    """Creates temp `table` (line, *cols) and fills it from parsed `rows` or a CSV text stream."""
+    postgres = db.get_bind().dialect.name == "postgresql"
+    line = "line bigserial" if postgres else "line integer PRIMARY KEY"
+    db.execute(text(f"CREATE TEMP TABLE {table} ({line}, {', '.join(f'{c} text' for c in cols)})"))
+    if postgres:
+        import psycopg
+        cur = db.connection().connection.driver_connection.cursor()
+        fmt = "csv" if raw_csv is not None else "text"
+        try:
+            with cur.copy(f"COPY {table} ({', '.join(cols)}) FROM STDIN WITH (FORMAT {fmt})") as copy:
+                if raw_csv is not None:
+                    while chunk := raw_csv.read(CHUNK_SIZE):
+                        copy.write(chunk)
+                else:
+                    for row in rows:
+                        copy.write_row(row)
+        except psycopg.DataError as e:
+            # malformed CSV (wrong column count, bad quoting)
+            raise ValueError(str(e).splitlines()[0]) from e
+        return
+    if raw_csv is not None:
+        rows = (rec for rec in csv.reader(raw_csv) if rec)
+    insert = text(f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join(f':{c}' for c in cols)})")
+    batch = []
+    width = len(cols)
+    for row in rows:
+        if len(row) != width:
+            raise ValueError(f"expected {width} columns, got {len(row)}: {row}")
+        batch.append(dict(zip(cols, row)))
+        if len(batch) >= INSERT_BATCH:
+            db.execute(insert, batch)
+            batch = []
+    if batch:
+        db.execute(insert, batch)
+
+def _load(db: Session, table: str, f, fmt: str, fields: dict, columns: tuple, kind: str) -> int:
+    if fmt == "jsonl":
+        _stage(db, table, list(columns), rows=_jsonl_rows(f, fields, columns))
+    else:
+        _stage(db, table, _csv_columns(f.readline(), fields, columns, kind), raw_csv=f)
+        # the one optional column
+        if "vendor_name_raw" in columns and not _has_column(db, table, "vendor_name_raw"):
+            db.execute(text(f"ALTER TABLE {table} ADD COLUMN vendor_name_raw text"))
+    return db.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+
+def _has_column(db: Session, table: str, col: str) -> bool:
+    return col in db.execute(text(f"SELECT * FROM {table} LIMIT 0")).keys()
+
+def _counts(db: Session, table: str) -> tuple[dict[str, int], int]:
+    # keys per action, and how many staged rows were valid (n counts a key's rows, duplicates included)
+    counts, valid = {}, 0
+    for action, keys, rows in db.execute(text(f"SELECT action, count(*), sum(n) FROM {table} GROUP BY action")):
+        counts[action] = keys
+        valid += int(rows)
+    return counts, valid
+
+def _merge_products(db: Session) -> tuple[dict[str, int], int]:
+    # last line wins per id; rows missing a required field are invalid
+    db.execute(text("""
+        CREATE TEMP TABLE catalog_products_merge AS
+        SELECT s.id, s.canonical_name, s.category, s.n,
+               CASE WHEN p.id IS NULL THEN 'insert'
+                    WHEN p.canonical_name <> s.canonical_name OR p.category <> s.category THEN 'update'
+                    ELSE 'unchanged' END AS action
+        FROM (
+            SELECT trim(id) AS id, trim(canonical_name) AS canonical_name, trim(category) AS category,
+                   row_number() OVER (PARTITION BY trim(id) ORDER BY line DESC) AS rn,
+                   count(*) OVER (PARTITION BY trim(id)) AS n
+            FROM catalog_products
+            WHERE trim(id) <> '' AND trim(canonical_name) <> '' AND trim(category) <> ''
+        ) s
+        LEFT JOIN products p ON p.id = s.id
+        WHERE s.rn = 1
+    """))
+    db.execute(text("""
+        INSERT INTO products (id, canonical_name, category, updated_at)
+        SELECT id, canonical_name, category, :now FROM catalog_products_merge WHERE action <> 'unchanged'
+        ON CONFLICT (id) DO UPDATE
+        SET canonical_name = excluded.canonical_name, category = excluded.category, updated_at = excluded.updated_at
+    """), {"now": datetime.utcnow()})
+    return _counts(db, "catalog_products_merge")
+
+def _merge_aliases(db: Session, remap: bool) -> tuple[dict[str, int], int]:
+    # per (vendor_id, vendor_sku): conflicting when the import maps it to more than one product,
+    # or moves an existing alias to another product without `remap`; otherwise the last line wins.
+    # Rows with a blank field, an unknown vendor or an unknown product are invalid.
+    moved = "'update'" if remap else "'conflict'"
+    db.execute(text(f"""
+        CREATE TEMP TABLE catalog_aliases_merge AS
+        SELECT s.vendor_id, s.vendor_sku, s.product_id, s.vendor_name_raw, s.n,
+               CASE WHEN s.lo <> s.hi THEN 'conflict'
+                    WHEN a.id IS NULL THEN 'insert'
+                    WHEN a.product_id <> s.product_id THEN {moved}
+                    WHEN coalesce(a.vendor_name_raw, '') <> coalesce(s.vendor_name_raw, '') THEN 'update'
+                    ELSE 'unchanged' END AS action
+        FROM (
+            SELECT v.*,
+                   row_number() OVER (PARTITION BY vendor_id, vendor_sku ORDER BY line DESC) AS rn,
+                   count(*) OVER (PARTITION BY vendor_id, vendor_sku) AS n,
+                   min(product_id) OVER (PARTITION BY vendor_id, vendor_sku) AS lo,
+                   max(product_id) OVER (PARTITION BY vendor_id, vendor_sku) AS hi
+            FROM (
+                SELECT line, trim(vendor_id) AS vendor_id, trim(vendor_sku) AS vendor_sku,
+                       trim(product_id) AS product_id, nullif(trim(vendor_name_raw), '') AS vendor_name_raw
+                FROM catalog_aliases
+            ) v
+            WHERE v.vendor_sku <> ''
+              AND EXISTS (SELECT 1 FROM vendors WHERE vendors.id = v.vendor_id)
+              AND EXISTS (SELECT 1 FROM products WHERE products.id = v.product_id)
+        ) s
+        LEFT JOIN product_aliases a ON a.vendor_id = s.vendor_id AND a.vendor_sku = s.vendor_sku
+        WHERE s.rn = 1
+    """))
+    db.execute(text("""
+        INSERT INTO product_aliases (vendor_id, vendor_sku, product_id, vendor_name_raw, updated_at)
+        SELECT vendor_id, vendor_sku, product_id, vendor_name_raw, :now FROM catalog_aliases_merge
+        WHERE action IN ('insert', 'update')
+        ON CONFLICT (vendor_id, vendor_sku) DO UPDATE
+        SET product_id = excluded.product_id, vendor_name_raw = excluded.vendor_name_raw, updated_at = excluded.updated_at
+    """), {"now": datetime.utcnow()})
+    return _counts(db, "catalog_aliases_merge")
+
+def _report(rows: int, merged: tuple[dict[str, int], int]) -> dict:
+    counts, valid = merged
+    return {
+        "rows": rows,
+        "inserted": counts.get("insert", 0),
+        "updated": counts.get("update", 0),
+        "unchanged": counts.get("unchanged", 0),
+        "conflicting": counts.get("conflict", 0),
+        "invalid": rows - valid,
+    }
+
+def _drop_staging(db: Session):
+    for table in ("catalog_products", "catalog_products_merge", "catalog_aliases", "catalog_aliases_merge"):
+        db.execute(text(f"DROP TABLE IF EXISTS {table}"))
+
+def import_catalog(db: Session, products=None, aliases=None, products_format: str = "csv",
+                   aliases_format: str = "csv", remap: bool = False) -> dict:
+    """Bulk-loads products and/or aliases from text streams in one transaction.
+
+    Counts are per product id / (vendor_id, vendor_sku) key; `invalid` rows were skipped.
+    """
+    result = {}
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            # the merges of a large import must not hit an API-sized DB_STATEMENT_TIMEOUT_MS
+            db.execute(text("SET LOCAL statement_timeout = 0"))
+        if products is not None:
+            rows = _load(db, "catalog_products", products, products_format, PRODUCT_FIELDS, PRODUCT_COLUMNS, "products")
+            result["products"] = _report(rows, _merge_products(db))
+        if aliases is not None:
+            rows = _load(db, "catalog_aliases", aliases, aliases_format, ALIAS_FIELDS, ALIAS_COLUMNS, "aliases")
+            result["aliases"] = _report(rows, _merge_aliases(db, remap))
+        _drop_staging(db)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        # SQLite commits DDL as it goes, so a failed import's temp tables outlive the rollback
+        # on the pooled connection and would break the next import on it
+        _drop_staging(db)
+        db.commit()
+        raise
+    invalidate_lookups()
+    bump_generation()
+    return result
+
+if __name__ == "__main__":
+    from .db import SessionLocal
+    p = argparse.ArgumentParser(prog="python -m app.catalog_import", description="Bulk-load products and vendor SKU aliases")
+    p.add_argument("--products", help="CSV (id,canonical_name,category) or .jsonl")
+    p.add_argument("--aliases", help="CSV (vendor_id,vendor_sku,product_id[,vendor_name_raw]) or .jsonl")
+    p.add_argument("--remap", action="store_true", help="let the import move existing aliases to another product")
+    args = p.parse_args()
+    if not (args.products or args.aliases):
+        p.error("nothing to import: pass --products and/or --aliases")
+    files = {k: open(path, "r", encoding="utf-8", newline="") for k, path in (("products", args.products), ("aliases", args.aliases)) if path}
+    try:
+        with SessionLocal() as session:
+            print(json.dumps(import_catalog(
+                session,
+                products=files.get("products"),
+                aliases=files.get("aliases"),
+                products_format=file_format(args.products or ""),
+                aliases_format=file_format(args.aliases or ""),
+                remap=args.remap,
+            ), indent=2))
+    finally:
+        for fh in files.values():
+            fh.close()
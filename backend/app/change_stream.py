@@ -0,0 +1,70 @@
+import asyncio
+import traceback
+from starlette.concurrency import run_in_threadpool
+from .changes import changes_after, last_seq
+from .config import settings
+from .db import SessionLocal
+
+PAGE = 500
+QUEUE_BATCHES = 64  # a subscriber this many batches behind re-reads from the log instead
+
+def changes_page(after: int, product_id: str | None = None) -> list[dict]:
+    with SessionLocal() as db:
+        return changes_after(db, after, PAGE, product_id)
+
+def head_seq() -> int:
+    with SessionLocal() as db:
+        return last_seq(db)
+
+class ChangeBroadcaster:
+    """One poller per process for /changes/stream: it reads price_changes after the newest seq it
+    has seen and hands each batch to every subscriber's queue. It runs while anyone is subscribed.
+
+    A queue holds batches of changes, or None when the subscriber fell too far behind and must
+    re-read the log from its own cursor.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.head: int | None = None
+        self._subscribers: set[asyncio.Queue] = set()
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(QUEUE_BATCHES)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _publish(self, batch: list[dict]):
+        for queue in self._subscribers:
+            if queue.full():
+                # drop the backlog; the subscriber catches up from the log instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+            else:
+                queue.put_nowait(batch)
+
+    async def _poll(self):
+        while self._subscribers:
+            try:
+                if self.head is None:
+                    self.head = await run_in_threadpool(head_seq)
+                batch = await run_in_threadpool(changes_page, self.head)
+            except Exception:
+                traceback.print_exc()
+                batch = []
+            if batch:
+                self.head = batch[-1]["seq"]
+                self._publish(batch)
+            if len(batch) < PAGE:
+                await asyncio.sleep(self.interval)
+        # the next subscriber starts from the log's end again, not from where this poller stopped
+        self.head = None
+
+broadcaster = ChangeBroadcaster(settings.change_feed_poll_interval)
@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, func, text
+from sqlalchemy.orm import Session
+from .config import settings
+from .models import LatestPrice, PriceChange
+from .projections import newest_per_key
+
+CHANGE_KINDS = ("best_price", "price_changed", "listed", "delisted")
+
+def lock_change_log(db: Session):
+    """Serialises change-log writers until commit, so seq order matches commit order.
+
+    Without it a reader resuming after seq N could miss a lower seq committed later by a
+    concurrent worker. SQLite already has a single writer.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext('price_etl.price_changes'))"))
+
+def _moved(old: float, new: float) -> bool:
+    if not old:
+        return new != old
+    return abs(new - old) / old * 100 >= settings.change_feed_min_pct
+
+def _best(latest: dict[tuple[str, str], dict]) -> dict[str, tuple[float, str]]:
+    # product -> (lowest listed price_aed, vendor); ties go to the lower vendor id, as /cheapest lists them first
+    best: dict[str, tuple[float, str]] = {}
+    for (product_id, vendor_id), r in latest.items():
+        if r["delisted_at"] is not None:
+            continue
+        cand = (r["price_aed"], vendor_id)
+        if product_id not in best or cand < best[product_id]:
+            best[product_id] = cand
+    return best
+
+def _best_price_changes(before: dict[tuple[str, str], dict], after: dict[tuple[str, str], dict]) -> list[dict]:
+    # best_price for every product whose cheapest listed vendor or price moved between the two states
+    changes = []
+    before_best = _best(before)
+    for product_id, (price, vendor_id) in _best(after).items():
+        prev = before_best.get(product_id)
+        if prev is not None and prev[1] == vendor_id and not _moved(prev[0], price):
+            continue
+        r = after[(product_id, vendor_id)]
+        changes.append({
+            "kind": "best_price",
+            "product_id": product_id,
+            "vendor_id": vendor_id,
+            "previous_vendor_id": prev[1] if prev else None,
+            "price_aed": price,
+            "previous_price_aed": prev[0] if prev else None,
+            "observed_at": r["observed_at"],
+            "ingestion_id": r["source_ingestion_id"],
+        })
+    return changes
+
+def _latest(db: Session, products) -> dict[tuple[str, str], dict]:
+    return {
+        (r.product_id, r.vendor_id): {
+            "observed_at": r.observed_at,
+            "source_ingestion_id": r.source_ingestion_id,
+            "price_aed": float(r.price_aed),
+            "delisted_at": r.delisted_at,
+        }
+        for r in db.execute(
+            select(
+                LatestPrice.product_id, LatestPrice.vendor_id, LatestPrice.observed_at,
+                LatestPrice.source_ingestion_id, LatestPrice.price_aed, LatestPrice.delisted_at,
+            ).where(LatestPrice.product_id.in_(products))
+        )
+    }
+
+def price_changes(db: Session, rows: list[dict]) -> list[dict]:
+    """Deltas a batch of price rows written to prices causes in latest_prices; call before
+    upsert_latest_prices.
+
+    Compares each (product, vendor)'s newest row in the batch against its current latest
+    price (see upsert_latest_prices for which rows replace it): listed (no price yet, or
+    delisted), price_changed (moved at least CHANGE_FEED_MIN_PCT), and best_price when a
+    product's cheapest vendor or price moves.
+    """
+    incoming = newest_per_key(rows)
+    if not incoming:
+        return []
+    current = _latest(db, {p for p, _ in incoming})
+
+    changes = []
+    after = dict(current)
+    for (product_id, vendor_id), r in incoming.items():
+        old = current.get((product_id, vendor_id))
+        if old is not None and r["observed_at"] < old["observed_at"]:
+            continue
+        relisted = old is None or r["observed_at"] > old["observed_at"]
+        new = {**r, "price_aed": float(r["price_aed"]), "delisted_at": None if relisted else old["delisted_at"]}
+        after[(product_id, vendor_id)] = new
+        change = {
+            "product_id": product_id,
+            "vendor_id": vendor_id,
+            "price_aed": new["price_aed"],
+            "previous_price_aed": old["price_aed"] if old else None,
+            "observed_at": r["observed_at"],
+            "ingestion_id": r["source_ingestion_id"],
+        }
+        if old is None or (relisted and old["delisted_at"] is not None):
+            changes.append({"kind": "listed", **change})
+        elif new["delisted_at"] is None and _moved(old["price_aed"], new["price_aed"]):
+            changes.append({"kind": "price_changed", **change})
+    return changes + _best_price_changes(current, after)
+
+def record_changes(db: Session, changes: list[dict]):
+    # caller holds lock_change_log and commits
+    if changes:
+        db.execute(insert(PriceChange), [{"previous_vendor_id": None, **c} for c in changes])
+
+def detect_delistings(db: Session, vendor_ids) -> int:
+    """Marks a vendor's latest prices that are CHANGE_FEED_DELIST_DAYS older than its newest one
+    as delisted and logs them, with best_price for the products whose cheapest vendor went;
+    commits. Returns how many were delisted."""
+    days = settings.change_feed_delist_days
+    if days <= 0 or not vendor_ids:
+        return 0
+    lock_change_log(db)
+    newest = dict(db.execute(
+        select(LatestPrice.vendor_id, func.max(LatestPrice.observed_at))
+        .where(LatestPrice.vendor_id.in_(vendor_ids))
+        .group_by(LatestPrice.vendor_id)
+    ).all())
+    stale = {}
+    for vendor_id, last_seen in newest.items():
+        stale[vendor_id] = db.execute(
+            select(LatestPrice.product_id, LatestPrice.price_aed, LatestPrice.observed_at).where(
+                LatestPrice.vendor_id == vendor_id,
+                LatestPrice.delisted_at.is_(None),
+                LatestPrice.observed_at < last_seen - timedelta(days=days),
+            )
+        ).all()
+    if not any(stale.values()):
+        db.commit()
+        return 0
+
+    now = datetime.utcnow()
+    before = _latest(db, {s.product_id for rows in stale.values() for s in rows})
+    after = dict(before)
+    changes = []
+    for vendor_id, rows in stale.items():
+        if not rows:
+            continue
+        db.execute(
+            update(LatestPrice)
+            .where(LatestPrice.vendor_id == vendor_id, LatestPrice.product_id.in_([s.product_id for s in rows]))
+            .values(delisted_at=now)
+        )
+        for s in rows:
+            after[(s.product_id, vendor_id)] = {**before[(s.product_id, vendor_id)], "delisted_at": now}
+        changes += [{
+            "kind": "delisted",
+            "product_id": s.product_id,
+            "vendor_id": vendor_id,
+            "price_aed": None,
+            "previous_price_aed": float(s.price_aed),
+            "observed_at": s.observed_at,
+            "ingestion_id": None,
+        } for s in rows]
+    delisted = len(changes)
+    record_changes(db, changes + _best_price_changes(before, after))
+    db.commit()
+    return delisted
+
+def changes_after(db: Session, after: int = 0, limit: int = 500, product_id: str | None = None) -> list[dict]:
+    q = select(PriceChange).where(PriceChange.seq > after)
+    if product_id:
+        q = q.where(PriceChange.product_id == product_id)
+    return [{
+        "seq": c.seq,
+        "kind": c.kind,
+        "product_id": c.product_id,
+        "vendor_id": c.vendor_id,
+        "previous_vendor_id": c.previous_vendor_id,
+        "price_aed": float(c.price_aed) if c.price_aed is not None else None,
+        "previous_price_aed": float(c.previous_price_aed) if c.previous_price_aed is not None else None,
+        "observed_at": c.observed_at.isoformat() if c.observed_at else None,
+        "ingestion_id": c.ingestion_id,
+        "created_at": c.created_at.isoformat(),
+    } for c in db.execute(q.order_by(PriceChange.seq).limit(limit)).scalars()]
+
+def last_seq(db: Session) -> int:
+    return db.execute(select(func.max(PriceChange.seq))).scalar() or 0
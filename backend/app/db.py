@@ -1,8 +1,25 @@
+import importlib.util
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from starlette.concurrency import run_in_threadpool
 from .config import settings
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+def engine_options(url: str) -> dict:
+    options = {"pool_pre_ping": True}
+    if url.startswith("sqlite"):
+        return options
+    options.update(
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_recycle=settings.db_pool_recycle,
+        pool_timeout=settings.db_pool_timeout,
+    )
+    if settings.db_statement_timeout_ms and url.startswith("postgresql"):
+        options["connect_args"] = {"options": f"-c statement_timeout={settings.db_statement_timeout_ms}"}
+    return options
+
+engine = create_engine(settings.database_url, **engine_options(settings.database_url))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 class Base(DeclarativeBase):
@@ -14,3 +31,68 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# read endpoints: an async engine on the same database (psycopg's async mode; aiosqlite for SQLite)
+def async_database_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    return url
+
+def async_reads_enabled() -> bool:
+    if not settings.api_async_reads:
+        return False
+    # SQLite needs aiosqlite (in requirements.txt); an install without it keeps reads on the sync engine
+    return not settings.database_url.startswith("sqlite") or importlib.util.find_spec("aiosqlite") is not None
+
+_async_sessions: async_sessionmaker | None = None
+
+def async_session_factory() -> async_sessionmaker:
+    # created on first use, so processes that never serve reads never build the async engine
+    global _async_sessions
+    if _async_sessions is None:
+        url = async_database_url(settings.database_url)
+        _async_sessions = async_sessionmaker(create_async_engine(url, **engine_options(url)), expire_on_commit=False)
+    return _async_sessions
+
+async def dispose_async_engine():
+    global _async_sessions
+    if _async_sessions is not None:
+        await _async_sessions.kw["bind"].dispose()
+        _async_sessions = None
+
+class ReadSession:
+    """What read endpoints query through: an AsyncSession, or with API_ASYNC_READS=0 the sync
+    Session run on the threadpool. execute() returns a buffered Result either way.
+
+    On the sync path each statement ends its transaction before the thread is handed back:
+    a request holding a pooled connection across threadpool hops lets requests blocked in
+    pool checkout starve the threads the holders need to finish.
+    """
+
+    def __init__(self, session: AsyncSession | Session):
+        self.session = session
+        self.dialect = session.get_bind().dialect.name
+
+    async def execute(self, stmt):
+        if isinstance(self.session, AsyncSession):
+            return await self.session.execute(stmt)
+        return (await run_in_threadpool(self._execute_sync, stmt))()
+
+    def _execute_sync(self, stmt):
+        try:
+            return self.session.execute(stmt).freeze()
+        finally:
+            # detach first: rollback would expire returned ORM objects into lazy loads on the event loop
+            self.session.expunge_all()
+            self.session.rollback()
+
+async def get_read_db():
+    if async_reads_enabled():
+        async with async_session_factory()() as session:
+            yield ReadSession(session)
+    else:
+        db = SessionLocal()
+        try:
+            yield ReadSession(db)
+        finally:
+            await run_in_threadpool(db.close)
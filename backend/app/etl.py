@@ -1,111 +1,306 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from datetime import datetime
-from .models import RawIngestion, Price, Rejection, Run
-from .transform.vendor_a import parse_vendor_a
-from .transform.vendor_b import parse_vendor_b
-from .transform.vendor_c import parse_vendor_c
-from .transform.normalize import resolve_product_id
-from .transform.fx import fx_to_aed
-
-PARSERS = {
-    "vendor_a": parse_vendor_a,
-    "vendor_b": parse_vendor_b,
-    "vendor_c": parse_vendor_c,
-}
-
-VENDOR_ID_MAP = {
-    "vendor_a": "V-A",
-    "vendor_b": "V-B",
-    "vendor_c": "V-C",
-}
-
-def run_etl(db: Session) -> dict:
-    run = Run()
-    db.add(run)
+from sqlalchemy import insert, select, update
+from datetime import datetime, timedelta
+from time import perf_counter
+from .config import settings
+from .db import engine, SessionLocal
+from .models import RawIngestion, Run, RunStage, RejectReason
+from .loader import BatchLoader, CONFLICT_POLICIES
+from .metrics import StageTimer, STAGES, record_run, start_profile, save_profile
+from .response_cache import bump_generation
+from .changes import detect_delistings
+from .transform.feeds import CompiledFeed, get_feed
+from .transform.lookup import LookupCache
+from .matching import AliasMatcher
+from .transform.columnar import iter_column_batches, transform_columns
+
+def _claimable(now: datetime):
+    # PENDING, or RUNNING under a lease its worker stopped renewing (it resumes after checkpoint_row)
+    return (RawIngestion.status == "PENDING") | ((RawIngestion.status == "RUNNING") & (RawIngestion.lease_until < now))
+
+def claim_ingestion(db: Session, ingestion_id: int) -> bool:
+    # atomic -> RUNNING; only one worker / run can win the row
+    now = datetime.utcnow()
+    res = db.execute(
+        update(RawIngestion)
+        .where(RawIngestion.id == ingestion_id, _claimable(now))
+        .values(status="RUNNING", lease_until=now + timedelta(seconds=settings.etl_lease_seconds))
+    )
     db.commit()
-    db.refresh(run)
+    return res.rowcount == 1
+
+def _reject(loader: BatchLoader, rownum: int, reason: RejectReason, crow, detail: str | None = None):
+    raw_row = crow.model_dump(mode="json") if loader.take_sample(reason) else None
+    loader.add_rejection(rownum, reason, detail, raw_row)
+
+def _load_row(ing: RawIngestion, rownum: int, crow, lookups: LookupCache, loader: BatchLoader, stages: StageTimer, unknown: list | None):
+    t0 = perf_counter()
+    # basic validations
+    reason = (
+        RejectReason.MISSING_VENDOR_SKU if not crow.vendor_sku
+        else RejectReason.NON_POSITIVE_PRICE if crow.price <= 0
+        else RejectReason.MISSING_CURRENCY if not crow.currency
+        else None
+    )
+    t1 = perf_counter()
+    stages.add("validate", t1 - t0)
+    if reason:
+        _reject(loader, rownum, reason, crow)
+        return
+
+    product_id = lookups.resolve_product_id(ing.vendor_id, crow.vendor_sku)
+    stages.add("alias_resolve", perf_counter() - t1)
+    if product_id:
+        _add_price(ing, rownum, crow, product_id, lookups, loader, stages)
+    elif unknown is not None:
+        unknown.append((rownum, crow))
+    else:
+        _reject(loader, rownum, RejectReason.UNKNOWN_PRODUCT_ALIAS, crow)
+
+def _add_price(ing: RawIngestion, rownum: int, crow, product_id: str, lookups: LookupCache, loader: BatchLoader, stages: StageTimer):
+    t0 = perf_counter()
+    try:
+        price_aed = lookups.fx_to_aed(crow.price, crow.currency, crow.observed_at, target="AED")
+    except Exception as e:
+        _reject(loader, rownum, RejectReason.FX_ERROR, crow, str(e))
+        return
+    finally:
+        stages.add("fx_convert", perf_counter() - t0)
 
-    pending = db.execute(select(RawIngestion).where(RawIngestion.status == "PENDING").order_by(RawIngestion.id)).scalars().all()
-
-    loaded = 0
-    rejected = 0
-    processed_ing = 0
-
-    for ing in pending:
-        processed_ing += 1
-        vendor_id = ing.vendor_id
-        # pick parser based on vendor_id
-        if vendor_id == "V-A":
-            parser = PARSERS["vendor_a"]
-        elif vendor_id == "V-B":
-            parser = PARSERS["vendor_b"]
-        elif vendor_id == "V-C":
-            parser = PARSERS["vendor_c"]
+    loader.add_price({
+        "product_id": product_id,
+        "vendor_id": ing.vendor_id,
+        "observed_at": crow.observed_at,
+        "currency": crow.currency,
+        "price": crow.price,
+        "price_aed": price_aed,
+        "source_ingestion_id": ing.id,
+    })
+
+def _load_unknown(ing: RawIngestion, unknown: list, lookups: LookupCache, loader: BatchLoader):
+    # the batch's rows without an alias, matched by name in one call (as the columnar path does)
+    if not unknown:
+        return
+    t0 = perf_counter()
+    matched = loader.matcher.resolve([(crow.vendor_sku, crow.vendor_name_raw) for _, crow in unknown])
+    loader.stages.add("alias_resolve", perf_counter() - t0)
+    for rownum, crow in unknown:
+        product_id = matched.get(crow.vendor_sku)
+        if product_id:
+            _add_price(ing, rownum, crow, product_id, lookups, loader, loader.stages)
         else:
-            ing.status = "FAILED"
-            ing.message = f"Unknown vendor_id: {vendor_id}"
-            db.commit()
+            _reject(loader, rownum, RejectReason.UNKNOWN_PRODUCT_ALIAS, crow)
+    unknown.clear()
+
+def _load_rows(ing: RawIngestion, feed: CompiledFeed, lookups: LookupCache, loader: BatchLoader):
+    # "parse" covers reading the file and building the canonical rows
+    skip_through = ing.checkpoint_row
+    unknown = None
+    if loader.matcher is not None:
+        unknown = []
+        loader.before_checkpoint = lambda: _load_unknown(ing, unknown, lookups, loader)
+    for rownum, crow in loader.stages.timed(feed.rows(ing.stored_path)):
+        if rownum <= skip_through:
             continue
+        _load_row(ing, rownum, crow, lookups, loader, loader.stages, unknown)
+        loader.advance(rownum)
 
-        try:
-            for rownum, crow in parser(ing.stored_path, vendor_id):
-                # basic validations
-                if not crow.vendor_sku:
-                    rejected += 1
-                    db.add(Rejection(ingestion_id=ing.id, row_number=rownum, reason="missing_vendor_sku", raw_row=crow.model_dump()))
-                    continue
-                if crow.price <= 0:
-                    rejected += 1
-                    db.add(Rejection(ingestion_id=ing.id, row_number=rownum, reason="non_positive_price", raw_row=crow.model_dump()))
-                    continue
-                if not crow.currency:
-                    rejected += 1
-                    db.add(Rejection(ingestion_id=ing.id, row_number=rownum, reason="missing_currency", raw_row=crow.model_dump()))
-                    continue
+def _load_columnar(ing: RawIngestion, feed: CompiledFeed, lookups: LookupCache, loader: BatchLoader):
+    stages = loader.stages
+    batches = iter_column_batches(ing.stored_path, feed, loader.batch_size, ing.checkpoint_row)
+    while True:
+        t0 = perf_counter()
+        cols = next(batches, None)
+        if cols is None:
+            break
+        stages.add("parse", perf_counter() - t0, len(cols["rownum"]))
+        price_rows, rejections = transform_columns(
+            cols, ing.vendor_id, ing.id, lookups, stages, loader.take_sample, loader.matcher
+        )
+        for row in price_rows:
+            loader.add_price(row)
+        for rownum, reason, detail, raw_row in rejections:
+            loader.add_rejection(rownum, reason, detail, raw_row)
+        loader.advance(cols["rownum"][-1], len(cols["rownum"]))
 
-                product_id = resolve_product_id(db, vendor_id, crow.vendor_sku)
-                if not product_id:
-                    rejected += 1
-                    db.add(Rejection(ingestion_id=ing.id, row_number=rownum, reason="unknown_product_alias", raw_row=crow.model_dump()))
-                    continue
+def process_ingestion(db: Session, ing: RawIngestion, lookups: LookupCache, mode: str = "row") -> dict:
+    vendor_id = ing.vendor_id
+    # the vendor's feed spec, compiled once per spec (see transform.feeds)
+    try:
+        feed = get_feed(db, vendor_id)
+        problem = None if feed else f"No feed spec for vendor_id: {vendor_id}"
+    except ValueError as e:
+        feed, problem = None, f"Invalid feed spec for vendor_id {vendor_id}: {e}"
+    if feed is None:
+        ing.status = "FAILED"
+        ing.message = problem
+        db.commit()
+        return {"ingestion_id": ing.id, "status": ing.status, "loaded_rows": 0, "rejected_rows": 0, "duplicate_rows": 0, "changed_rows": 0}
+
+    matcher = AliasMatcher(db, vendor_id, ing.id, lookups) if settings.alias_matching else None
+    loader = BatchLoader(db, ing, stages=StageTimer(), matcher=matcher)
+    resumed_from = ing.checkpoint_row
+    try:
+        if mode == "columnar" and feed.columnar:
+            _load_columnar(ing, feed, lookups, loader)
+        else:
+            _load_rows(ing, feed, lookups, loader)
+        # final batch and status land in one commit
+        ing.status = "PROCESSED"
+        ing.message = "ok"
+        loader.checkpoint()
+    except Exception as e:
+        # drop rows after the last checkpoint; committed batches stay and a retry resumes after them
+        loader.discard()
+        db.rollback()
+        ing.status = "FAILED"
+        ing.message = str(e)
+        db.commit()
+
+    return {
+        "ingestion_id": ing.id,
+        "status": ing.status,
+        "resumed_from_row": resumed_from,
+        "checkpoint_row": ing.checkpoint_row,
+        "loaded_rows": loader.loaded,
+        "rejected_rows": loader.rejected,
+        "duplicate_rows": loader.duplicates,
+        "changed_rows": loader.changed,
+        "stages": loader.stages.as_dict(),
+        **({"alias_matches": matcher.stats()} if matcher else {}),
+    }
+
+def _init_worker():
+    # forked workers must not share the parent's pooled connections
+    engine.dispose(close=False)
+
+def _process_in_worker(ingestion_id: int, mode: str) -> dict | None:
+    db = SessionLocal()
+    try:
+        if not claim_ingestion(db, ingestion_id):
+            return None
+        ing = db.get(RawIngestion, ingestion_id)
+        lookups = LookupCache(db)
+        result = process_ingestion(db, ing, lookups, mode)
+        result["cache"] = lookups.stats()
+        return result
+    finally:
+        db.close()
+
+def _fail_running(db: Session, ingestion_id: int, message: str) -> dict:
+    db.execute(
+        update(RawIngestion)
+        .where(RawIngestion.id == ingestion_id, RawIngestion.status == "RUNNING")
+        .values(status="FAILED", message=message)
+    )
+    db.commit()
+    return {"ingestion_id": ingestion_id, "status": "FAILED", "loaded_rows": 0, "rejected_rows": 0, "duplicate_rows": 0, "changed_rows": 0}
 
+def _process_pending(db: Session, workers: int, mode: str) -> tuple[list[dict], dict]:
+    pending = db.execute(
+        select(RawIngestion.id, RawIngestion.vendor_id)
+        .where(_claimable(datetime.utcnow()))
+        .order_by(RawIngestion.id)
+    ).all()
+
+    results = []
+    cache = {}
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=_init_worker) as pool:
+            futures = {pool.submit(_process_in_worker, ing_id, mode): ing_id for ing_id, _ in pending}
+            for fut in as_completed(futures):
                 try:
-                    price_aed = fx_to_aed(db, crow.price, crow.currency, crow.observed_at, target="AED")
+                    result = fut.result()
                 except Exception as e:
-                    rejected += 1
-                    db.add(Rejection(ingestion_id=ing.id, row_number=rownum, reason=f"fx_error:{str(e)}", raw_row=crow.model_dump()))
+                    result = _fail_running(db, futures[fut], f"worker failed: {e}")
+                if result is None:
                     continue
+                for k, v in result.pop("cache", {}).items():
+                    cache[k] = cache.get(k, 0) + v
+                results.append(result)
+    else:
+        lookups = LookupCache(db)
+        lookups.preload_aliases({vendor_id for _, vendor_id in pending})
+        for ing_id, _ in pending:
+            if not claim_ingestion(db, ing_id):
+                continue
+            results.append(process_ingestion(db, db.get(RawIngestion, ing_id), lookups, mode))
+        cache = lookups.stats()
+    return results, cache
+
+def execute_run(db: Session, run: Run) -> dict:
+    """Processes every PENDING (or abandoned) ingestion under an already-claimed (RUNNING) run row."""
+    workers = run.workers or settings.etl_workers
+    mode = run.mode or settings.etl_mode
+    if settings.price_conflict_policy not in CONFLICT_POLICIES:
+        raise ValueError(f"PRICE_CONFLICT_POLICY must be one of {', '.join(CONFLICT_POLICIES)}")
+    started = perf_counter()
+    if run.profile:
+        # a profile only sees this process, so a profiled run stays in-process
+        profiler = start_profile(run.profile)
+        try:
+            results, cache = _process_pending(db, 1, mode)
+        finally:
+            run.profile_path = save_profile(profiler, run.id)
+    else:
+        results, cache = _process_pending(db, workers, mode)
 
-                db.add(Price(
-                    product_id=product_id,
-                    vendor_id=vendor_id,
-                    observed_at=crow.observed_at,
-                    currency=crow.currency,
-                    price=crow.price,
-                    price_aed=price_aed,
-                    source_ingestion_id=ing.id,
-                ))
-                loaded += 1
-
-            ing.status = "PROCESSED"
-            ing.message = "ok"
-            db.commit()
-        except Exception as e:
-            ing.status = "FAILED"
-            ing.message = str(e)
-            db.commit()
+    processed_ing = len(results)
+    loaded = sum(r["loaded_rows"] for r in results)
+    rejected = sum(r["rejected_rows"] for r in results)
+    duplicates = sum(r["duplicate_rows"] for r in results)
+    failed = sum(1 for r in results if r["status"] == "FAILED")
+    # overwrites change what the API serves without loading a row, so the cache follows changed_rows
+    changed = sum(r["changed_rows"] for r in results)
+    stages = {s: {"seconds": 0.0, "rows": 0} for s in STAGES}
+    stage_rows = []
+    for r in results:
+        for s, v in r.pop("stages", {}).items():
+            stages[s]["seconds"] += v["seconds"]
+            stages[s]["rows"] += v["rows"]
+            stage_rows.append({"run_id": run.id, "ingestion_id": r["ingestion_id"], "stage": s, **v})
+    if stage_rows:
+        db.execute(insert(RunStage), stage_rows)
+    if settings.change_feed and changed:
+        changed_ids = [r["ingestion_id"] for r in results if r["changed_rows"]]
+        vendor_ids = set(db.execute(select(RawIngestion.vendor_id).where(RawIngestion.id.in_(changed_ids))).scalars())
+        changed += detect_delistings(db, vendor_ids)
 
     run.finished_at = datetime.utcnow()
-    run.status = "DONE"
+    run.status = "PARTIAL" if failed else "DONE"
+    run.failed_ingestions = failed
     run.processed_ingestions = processed_ing
     run.loaded_rows = loaded
     run.rejected_rows = rejected
+    run.duplicate_rows = duplicates
     db.commit()
+    if changed:
+        bump_generation()
 
-    return {
+    result = {
         "run_id": run.id,
+        "status": run.status,
         "processed_ingestions": processed_ing,
+        "failed_ingestions": failed,
         "loaded_rows": loaded,
         "rejected_rows": rejected,
+        "duplicate_rows": duplicates,
+        "seconds": round(perf_counter() - started, 6),
+        "stages": {s: {"seconds": round(v["seconds"], 6), "rows": v["rows"]} for s, v in stages.items()},
+        "profile_path": run.profile_path,
+        "cache": cache,
     }
+    matches = [r["alias_matches"] for r in results if "alias_matches" in r]
+    if matches:
+        result["alias_matches"] = {k: sum(m[k] for m in matches) for k in matches[0]}
+    record_run(result, stages, result["seconds"])
+    return result
+
+def run_etl(db: Session, workers: int | None = None, mode: str | None = None, profile: str | None = None) -> dict:
+    # synchronous run in the caller's session (CLI, benchmarks); the API queues runs via jobs.enqueue_run
+    run = Run(status="RUNNING", trigger="cli", workers=workers, mode=mode, profile=profile)
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+    return execute_run(db, run)
@@ -0,0 +1,124 @@
+import csv
+import re
+import sys
+from datetime import datetime
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from .models import FXRate
+from .projections import upsert_insert
+from .storage import CHUNK_SIZE
+from .transform.lookup import invalidate_lookups
+
+# CSV header -> fx_rates column (samples/fx_rates.csv uses fx_date,base,quote,rate)
+HEADER_ALIASES = {
+    "fx_date": "fx_date", "date": "fx_date",
+    "base": "base_currency", "base_currency": "base_currency",
+    "quote": "quote_currency", "quote_currency": "quote_currency",
+    "rate": "rate",
+}
+FX_KEY = ["fx_date", "base_currency", "quote_currency"]
+
+def _columns(header_line: str) -> list[str]:
+    header = next(csv.reader([header_line]))
+    cols = [HEADER_ALIASES.get(h.strip().lower()) for h in header]
+    missing = {"fx_date", "base_currency", "quote_currency", "rate"} - set(cols)
+    if missing or None in cols:
+        raise ValueError(f"FX CSV header must be fx_date,base,quote,rate (got {','.join(header)})")
+    return cols
+
+def _import_copy(db: Session, cols: list[str], f) -> dict:
+    # Postgres: COPY into a temp table, then one set-based upsert (last line wins per key)
+    db.execute(text(
+        "CREATE TEMP TABLE fx_import (line bigserial, fx_date date, base_currency text, quote_currency text, rate numeric) ON COMMIT DROP"
+    ))
+    import psycopg
+    cur = db.connection().connection.driver_connection.cursor()
+    try:
+        with cur.copy(f"COPY fx_import ({', '.join(cols)}) FROM STDIN WITH (FORMAT csv)") as copy:
+            while chunk := f.read(CHUNK_SIZE):
+                copy.write(chunk)
+    except psycopg.DataError as e:
+        # malformed CSV or value; COPY's context counts lines after the header
+        line = re.search(r"line (\d+)", e.diag.context or "")
+        raise ValueError(f"line {int(line[1]) + 1}: {e.diag.message_primary}" if line else e.diag.message_primary) from e
+    blank = db.execute(text(
+        "SELECT min(line) FROM fx_import WHERE fx_date IS NULL OR rate IS NULL "
+        "OR trim(coalesce(base_currency, '')) = '' OR trim(coalesce(quote_currency, '')) = ''"
+    )).scalar()
+    if blank is not None:
+        raise ValueError(f"line {blank + 1}: fx_date, base, quote and rate are required")
+    rows = db.execute(text("SELECT count(*) FROM fx_import")).scalar()
+    changed = db.execute(text("""
+        INSERT INTO fx_rates (fx_date, base_currency, quote_currency, rate)
+        SELECT DISTINCT ON (fx_date, upper(trim(base_currency)), upper(trim(quote_currency)))
+               fx_date::timestamp, upper(trim(base_currency)), upper(trim(quote_currency)), rate
+        FROM fx_import
+        ORDER BY fx_date, upper(trim(base_currency)), upper(trim(quote_currency)), line DESC
+        ON CONFLICT ON CONSTRAINT uq_fx DO UPDATE SET rate = EXCLUDED.rate
+        WHERE fx_rates.rate IS DISTINCT FROM EXCLUDED.rate
+        RETURNING (xmax = 0) AS inserted
+    """)).scalars().all()
+    inserted = sum(1 for i in changed if i)
+    return {"rows": rows, "inserted": inserted, "updated": len(changed) - inserted}
+
+def _import_rows(db: Session, cols: list[str], f) -> dict:
+    rates: dict[tuple, float] = {}
+    rows = 0
+    reader = csv.reader(f)
+    for rec in reader:
+        if not rec:
+            continue
+        rows += 1
+        # the header was read before the reader started counting
+        line = reader.line_num + 1
+        if len(rec) != len(cols):
+            raise ValueError(f"line {line}: expected {len(cols)} columns, got {len(rec)}")
+        r = {c: v.strip() for c, v in zip(cols, rec)}
+        if not all(r.values()):
+            raise ValueError(f"line {line}: fx_date, base, quote and rate are required")
+        try:
+            key = (datetime.fromisoformat(r["fx_date"]), r["base_currency"].upper(), r["quote_currency"].upper())
+            rates[key] = float(r["rate"])
+        except ValueError as e:
+            raise ValueError(f"line {line}: {e}") from e
+    if not rates:
+        return {"rows": 0, "inserted": 0, "updated": 0}
+
+    days = {k[0] for k in rates}
+    existing = {
+        (d, b, q): float(rate)
+        for d, b, q, rate in db.execute(
+            select(FXRate.fx_date, FXRate.base_currency, FXRate.quote_currency, FXRate.rate)
+            .where(FXRate.fx_date.between(min(days), max(days)))
+        )
+    }
+    changed = {k: v for k, v in rates.items() if existing.get(k) != v}
+    if changed:
+        stmt = upsert_insert(db, FXRate)
+        db.execute(
+            stmt.on_conflict_do_update(index_elements=FX_KEY, set_={"rate": stmt.excluded.rate}),
+            [{"fx_date": d, "base_currency": b, "quote_currency": q, "rate": v} for (d, b, q), v in changed.items()],
+        )
+    inserted = sum(1 for k in changed if k not in existing)
+    return {"rows": rows, "inserted": inserted, "updated": len(changed) - inserted}
+
+def import_fx_csv(db: Session, f) -> dict:
+    """Bulk-loads FX history from a CSV text stream (fx_date,base,quote,rate) in one transaction.
+
+    Existing (fx_date, base, quote) rows get the new rate. Returns rows read, inserted, updated.
+    """
+    cols = _columns(f.readline())
+    if db.get_bind().dialect.name == "postgresql":
+        result = _import_copy(db, cols, f)
+    else:
+        result = _import_rows(db, cols, f)
+    db.commit()
+    invalidate_lookups()
+    return result
+
+if __name__ == "__main__":
+    from .db import SessionLocal
+    with SessionLocal() as session:
+        for path in sys.argv[1:]:
+            with open(path, "r", encoding="utf-8", newline="") as fh:
+                print(path, import_fx_csv(session, fh))
@@ -0,0 +1,149 @@
+import base64
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import select, func, and_, or_, literal
+from .db import ReadSession
+from .models import Price, PriceDailyRollup
+
+BUCKETS = ("hour", "day", "week")
+
+def encode_cursor(observed_at: datetime, price_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{observed_at.isoformat()}|{price_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    ts, price_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(ts), int(price_id)
+
+def _bucket_expr(dialect: str, bucket: str):
+    if dialect == "sqlite":
+        if bucket == "hour":
+            return func.strftime("%Y-%m-%d %H:00:00", Price.observed_at)
+        if bucket == "day":
+            return func.strftime("%Y-%m-%d 00:00:00", Price.observed_at)
+        # Monday on or before, like Postgres date_trunc('week')
+        return func.date(Price.observed_at, "-6 days", "weekday 1").concat(literal(" 00:00:00"))
+    return func.date_trunc(bucket, Price.observed_at)
+
+def _filters(product_id: str, vendor_id: str | None, start: datetime | None, end: datetime | None) -> list:
+    conds = [Price.product_id == product_id]
+    if vendor_id:
+        conds.append(Price.vendor_id == vendor_id)
+    if start:
+        conds.append(Price.observed_at >= start)
+    if end:
+        conds.append(Price.observed_at < end)
+    return conds
+
+async def query_points(db: ReadSession, product_id: str, vendor_id: str | None, start: datetime | None, end: datetime | None,
+                 cursor: str | None, limit: int) -> tuple[list[dict], str | None]:
+    # keyset pagination on (observed_at, id), walking ix_prices_product_time
+    conds = _filters(product_id, vendor_id, start, end)
+    if cursor:
+        after_t, after_id = decode_cursor(cursor)
+        conds.append(or_(Price.observed_at > after_t, and_(Price.observed_at == after_t, Price.id > after_id)))
+    rows = (await db.execute(
+        select(Price.id, Price.vendor_id, Price.observed_at, Price.price_aed)
+        .where(*conds)
+        .order_by(Price.observed_at.asc(), Price.id.asc())
+        .limit(limit + 1)
+    )).all()
+    next_cursor = encode_cursor(rows[limit - 1][2], rows[limit - 1][0]) if len(rows) > limit else None
+    points = [{"vendor_id": r[1], "t": r[2].isoformat(), "price_aed": float(r[3])} for r in rows[:limit]]
+    return points, next_cursor
+
+async def _raw_buckets(db: ReadSession, product_id: str, bucket: str, vendor_id: str | None,
+                       start: datetime | None, end: datetime | None) -> list[tuple]:
+    # per vendor and bucket, from raw prices: (vendor_id, bucket start, min, max, last, sum, count)
+    b = _bucket_expr(db.dialect, bucket).label("bucket")
+    ranked = select(
+        Price.vendor_id,
+        b,
+        Price.price_aed,
+        func.first_value(Price.price_aed).over(
+            partition_by=(Price.vendor_id, b),
+            order_by=(Price.observed_at.desc(), Price.id.desc()),
+        ).label("last_aed"),
+    ).where(*_filters(product_id, vendor_id, start, end)).subquery()
+
+    rows = (await db.execute(
+        select(
+            ranked.c.vendor_id,
+            ranked.c.bucket,
+            func.min(ranked.c.price_aed),
+            func.max(ranked.c.price_aed),
+            func.max(ranked.c.last_aed),
+            func.sum(ranked.c.price_aed),
+            func.count(),
+        )
+        .group_by(ranked.c.vendor_id, ranked.c.bucket)
+    )).all()
+    return [
+        (r[0], r[1] if isinstance(r[1], datetime) else datetime.fromisoformat(r[1]), *map(float, r[2:6]), r[6])
+        for r in rows
+    ]
+
+async def _rollup_days(db: ReadSession, product_id: str, vendor_id: str | None, first: date | None, last: date | None) -> list[tuple]:
+    # the same tuples per vendor and day, from price_daily_rollups; sum is None for days rolled up
+    # before sums were kept whose raw prices are gone
+    conds = [PriceDailyRollup.product_id == product_id]
+    if vendor_id:
+        conds.append(PriceDailyRollup.vendor_id == vendor_id)
+    if first:
+        conds.append(PriceDailyRollup.day >= first)
+    if last:
+        conds.append(PriceDailyRollup.day < last)
+    rows = (await db.execute(
+        select(
+            PriceDailyRollup.vendor_id, PriceDailyRollup.day, PriceDailyRollup.min_aed, PriceDailyRollup.max_aed,
+            PriceDailyRollup.close_aed, PriceDailyRollup.sum_aed, PriceDailyRollup.samples,
+        ).where(*conds)
+    )).all()
+    return [
+        (r[0], datetime.combine(r[1], time.min), float(r[2]), float(r[3]), float(r[4]),
+         float(r[5]) if r[5] is not None else None, r[6])
+        for r in rows
+    ]
+
+async def query_buckets(db: ReadSession, product_id: str, bucket: str, vendor_id: str | None,
+                  start: datetime | None, end: datetime | None) -> list[dict]:
+    """Per vendor and bucket: min / max / avg / count, and last (newest price in the bucket).
+
+    Hours come from raw prices. Days and weeks are folded from price_daily_rollups, so they
+    outlive raw partitions dropped by retention; only a day that `from` / `to` cut into is
+    read from raw prices.
+    """
+    if bucket == "hour":
+        days = await _raw_buckets(db, product_id, bucket, vendor_id, start, end)
+    else:
+        # [first, last): the days wholly inside [start, end)
+        first = start and (start.date() if start.time() == time.min else start.date() + timedelta(days=1))
+        last = end and end.date()
+        if first and last and first >= last:
+            days = await _raw_buckets(db, product_id, "day", vendor_id, start, end)
+        else:
+            days = await _rollup_days(db, product_id, vendor_id, first, last)
+            if start and start < datetime.combine(first, time.min):
+                days += await _raw_buckets(db, product_id, "day", vendor_id, start, datetime.combine(first, time.min))
+            if end and end > datetime.combine(last, time.min):
+                days += await _raw_buckets(db, product_id, "day", vendor_id, datetime.combine(last, time.min), end)
+
+    buckets: dict[tuple, list] = {}
+    for vendor_id_, t, lo, hi, close, total, count in sorted(days, key=lambda d: d[1]):
+        if bucket == "week":
+            # Monday, like Postgres date_trunc('week')
+            t -= timedelta(days=t.weekday())
+        cur = buckets.get((t, vendor_id_))
+        if cur is None:
+            buckets[(t, vendor_id_)] = [lo, hi, close, total, count]
+            continue
+        cur[0], cur[1], cur[2] = min(cur[0], lo), max(cur[1], hi), close
+        cur[3] = cur[3] + total if cur[3] is not None and total is not None else None
+        cur[4] += count
+    return [{
+        "vendor_id": vendor_id_,
+        "t": t.isoformat(),
+        "min_aed": lo,
+        "max_aed": hi,
+        "last_aed": close,
+        "avg_aed": total / count if total is not None else None,
+        "count": count,
+    } for (t, vendor_id_), (lo, hi, close, total, count) in sorted(buckets.items())]
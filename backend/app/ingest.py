@@ -0,0 +1,96 @@
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .models import RawIngestion
+
+def find_duplicate(db: Session, vendor_id: str, sha256: str) -> RawIngestion | None:
+    return db.execute(select(RawIngestion).where(
+        RawIngestion.vendor_id == vendor_id,
+        RawIngestion.content_sha256 == sha256,
+    )).scalar_one_or_none()
+
+def register_ingestion(db: Session, vendor_id: str, file_name: str, stored_path: str, sha256: str) -> tuple[RawIngestion, bool]:
+    """Creates a PENDING RawIngestion unless this vendor already sent the same bytes.
+
+    Returns (ingestion, duplicate). Duplicates return the existing row and are never reprocessed.
+    """
+    existing = find_duplicate(db, vendor_id, sha256)
+    if existing:
+        return existing, True
+
+    ing = RawIngestion(
+        vendor_id=vendor_id,
+        file_name=file_name,
+        stored_path=stored_path,
+        content_sha256=sha256,
+        status="PENDING",
+    )
+    db.add(ing)
+    try:
+        db.commit()
+    except IntegrityError:
+        # a concurrent upload of the same bytes won uq_ingestion_vendor_sha
+        db.rollback()
+        existing = find_duplicate(db, vendor_id, sha256)
+        if existing is None:
+            raise
+        return existing, True
+    db.refresh(ing)
+    return ing, False
+
+def register_ingestions(db: Session, vendor_id: str, files: list[tuple[str, str, str]]) -> list[tuple[RawIngestion, bool]]:
+    """register_ingestion for a batch of (file_name, stored_path, sha256), in one transaction.
+
+    Returns (ingestion, duplicate) per file, in order; a file repeated within the batch is a
+    duplicate of its first copy.
+    """
+    for attempt in range(2):
+        known = {i.content_sha256: i for i in db.execute(select(RawIngestion).where(
+            RawIngestion.vendor_id == vendor_id,
+            RawIngestion.content_sha256.in_(list({sha for _, _, sha in files})),
+        )).scalars()}
+        out = []
+        for file_name, stored_path, sha256 in files:
+            if sha256 in known:
+                out.append((known[sha256], True))
+                continue
+            ing = known[sha256] = RawIngestion(
+                vendor_id=vendor_id,
+                file_name=file_name,
+                stored_path=stored_path,
+                content_sha256=sha256,
+                status="PENDING",
+            )
+            db.add(ing)
+            out.append((ing, False))
+        try:
+            db.flush()
+            ids = list({i.id for i, _ in out})
+            db.commit()
+        except IntegrityError:
+            # a concurrent upload registered some of these bytes first; re-read and try once more
+            db.rollback()
+            if attempt:
+                raise
+            continue
+        if ids:
+            # commit expired them; one query reloads the lot instead of a refresh per row
+            db.execute(select(RawIngestion).where(RawIngestion.id.in_(ids))).all()
+        return out
+
+def requeue_ingestion(db: Session, ingestion_id: int, force: bool = False) -> RawIngestion | None:
+    """FAILED -> PENDING (also RUNNING when `force`, for runs that died without marking it).
+
+    The checkpoint is kept, so the next run resumes after the last committed row.
+    Returns None if the ingestion is not in a retryable state.
+    """
+    allowed = ("FAILED", "RUNNING") if force else ("FAILED",)
+    res = db.execute(
+        update(RawIngestion)
+        .where(RawIngestion.id == ingestion_id, RawIngestion.status.in_(allowed))
+        .values(status="PENDING", message=None)
+    )
+    db.commit()
+    if res.rowcount != 1:
+        return None
+    return db.get(RawIngestion, ingestion_id)
@@ -0,0 +1,177 @@
+import argparse
+import threading
+import traceback
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+from .config import settings
+from .db import SessionLocal
+from .models import Run
+from .response_cache import bump_generation
+
+def enqueue_run(
+    db: Session,
+    workers: int | None = None,
+    mode: str | None = None,
+    profile: str | None = None,
+    trigger: str = "api",
+    delay: float = 0.0,
+) -> Run:
+    now = datetime.utcnow()
+    run = Run(
+        status="QUEUED",
+        trigger=trigger,
+        workers=workers,
+        mode=mode,
+        profile=profile,
+        queued_at=now,
+        not_before=now + timedelta(seconds=delay),
+        started_at=now,
+    )
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+    return run
+
+def schedule_auto_run(db: Session) -> Run | None:
+    """Debounced auto-trigger for new ingestions.
+
+    Reuses the queued auto run if there is one and pushes its start back by the debounce
+    (never past queued_at + max delay), so a burst of uploads becomes a single run.
+    """
+    if not settings.etl_auto_trigger:
+        return None
+    now = datetime.utcnow()
+    run = db.execute(
+        select(Run).where(Run.status == "QUEUED", Run.trigger == "auto").order_by(Run.id).limit(1)
+    ).scalar_one_or_none()
+    if run is not None:
+        not_before = min(
+            now + timedelta(seconds=settings.etl_auto_debounce),
+            run.queued_at + timedelta(seconds=settings.etl_auto_max_delay),
+        )
+        # only while still queued; if a worker claimed it meanwhile, queue a fresh one
+        res = db.execute(
+            update(Run).where(Run.id == run.id, Run.status == "QUEUED").values(not_before=not_before)
+        )
+        db.commit()
+        if res.rowcount == 1:
+            db.refresh(run)
+            return run
+    return enqueue_run(db, trigger="auto", delay=settings.etl_auto_debounce)
+
+def claim_next_run(db: Session) -> Run | None:
+    # atomic QUEUED -> RUNNING, like etl.claim_ingestion; losers just poll again. A RUNNING run
+    # whose lease lapsed (its worker died) is claimed again and picks up the ingestions it left
+    now = datetime.utcnow()
+    ready = ((Run.status == "QUEUED") & (Run.not_before <= now)) | ((Run.status == "RUNNING") & (Run.lease_until < now))
+    run_id = db.execute(select(Run.id).where(ready).order_by(Run.id).limit(1)).scalar()
+    if run_id is None:
+        return None
+    res = db.execute(
+        update(Run).where(Run.id == run_id, ready)
+        .values(status="RUNNING", started_at=now, lease_until=now + timedelta(seconds=settings.etl_lease_seconds))
+    )
+    db.commit()
+    return db.get(Run, run_id) if res.rowcount == 1 else None
+
+def _renew_lease(run_id: int, stop: threading.Event):
+    # heartbeat while a claimed run executes; a killed worker stops renewing and the lease lapses
+    while not stop.wait(settings.etl_lease_seconds / 3):
+        try:
+            with SessionLocal() as db:
+                db.execute(
+                    update(Run).where(Run.id == run_id, Run.status == "RUNNING")
+                    .values(lease_until=datetime.utcnow() + timedelta(seconds=settings.etl_lease_seconds))
+                )
+                db.commit()
+        except Exception:
+            traceback.print_exc()
+
+def work_once(db: Session) -> Run | None:
+    """Claims and executes one ready run; returns it, or None if the queue had nothing ready."""
+    run = claim_next_run(db)
+    if run is None:
+        return None
+    from .etl import execute_run  # keeps the ETL out of processes that never claim a run
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_renew_lease, args=(run.id, stop), name=f"etl-lease-{run.id}", daemon=True)
+    heartbeat.start()
+    try:
+        execute_run(db, run)
+    except Exception as e:
+        db.rollback()
+        run.status = "FAILED"
+        run.message = str(e)
+        run.finished_at = datetime.utcnow()
+        db.commit()
+    finally:
+        stop.set()
+        heartbeat.join()
+    return run
+
+def _last_finished_run(db: Session) -> int | None:
+    # any finished run may have changed prices (overwrites, delistings) without loading a row
+    return db.execute(select(func.max(Run.id)).where(Run.status.in_(("DONE", "PARTIAL")))).scalar()
+
+def worker_loop(stop: threading.Event, claim: bool = True, poll_interval: float | None = None):
+    """Polls the queue until `stop` is set.
+
+    With claim=False it only watches for runs finished by other processes (e.g. a CLI
+    worker) and bumps this process's response-cache generation when one finishes.
+    """
+    interval = poll_interval or settings.etl_poll_interval
+    watching, last_finished = False, None
+    while not stop.is_set():
+        try:
+            with SessionLocal() as db:
+                if claim and work_once(db):
+                    continue
+                latest = _last_finished_run(db)
+                if watching and latest != last_finished:
+                    bump_generation()
+                watching, last_finished = True, latest
+        except Exception:
+            traceback.print_exc()
+        stop.wait(interval)
+
+_stop: threading.Event | None = None
+_thread: threading.Thread | None = None
+
+def start_background_worker():
+    global _stop, _thread
+    if _thread is not None:
+        return
+    _stop = threading.Event()
+    _thread = threading.Thread(
+        target=worker_loop, args=(_stop, settings.etl_inprocess_worker), name="etl-worker", daemon=True
+    )
+    _thread.start()
+
+def stop_background_worker(timeout: float | None = None):
+    # waits up to `timeout` for a run in progress to reach its next poll; one still going is
+    # left to its lease, and another worker reclaims it once this process is gone
+    global _stop, _thread
+    if _thread is None:
+        return
+    _stop.set()
+    _thread.join(timeout)
+    _stop = _thread = None
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m app.jobs", description="ETL job worker")
+    p.add_argument("--once", action="store_true", help="drain the runs that are ready now, then exit")
+    p.add_argument("--enqueue", action="store_true", help="queue a run before working")
+    args = p.parse_args()
+    with SessionLocal() as session:
+        if args.enqueue:
+            print(f"queued run {enqueue_run(session, trigger='cli').id}")
+        if args.once:
+            while (run := work_once(session)) is not None:
+                print(f"run {run.id}: {run.status} loaded={run.loaded_rows} rejected={run.rejected_rows}")
+    if not args.once:
+        stop = threading.Event()
+        try:
+            worker_loop(stop)
+        except KeyboardInterrupt:
+            stop.set()
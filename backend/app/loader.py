@@ -0,0 +1,230 @@
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from .models import Price, Rejection, RejectionSummary, RawIngestion
+from .config import settings
+from .projections import LATEST_COLUMNS, upsert_insert, upsert_latest_prices, upsert_daily_rollups, recompute_daily_rollups
+from .partitions import ensure_price_partitions
+from .metrics import StageTimer
+from .changes import lock_change_log, price_changes, record_changes
+
+CONFLICT_POLICIES = ("skip", "overwrite", "keep-latest-ingestion")
+NATURAL_KEY = ["product_id", "vendor_id", "observed_at"]
+
+class BatchLoader:
+    """Buffers one ingestion's Price / Rejection rows and commits them as checkpoints.
+
+    Rows go straight to the connection as multi-row INSERTs (no ORM objects in the identity
+    map), so memory stays flat regardless of file size. Each price batch is also folded into
+    latest_prices and price_daily_rollups, after creating any missing monthly partition.
+    Every `batch_size` source rows the buffers are written and committed together with the
+    ingestion's checkpoint_row, so a restarted run resumes after the last committed row
+    without duplicating prices or rejections.
+
+    Prices that repeat an existing (product_id, vendor_id, observed_at) are counted as
+    duplicates and resolved by `conflict_policy`: skip keeps the stored row, overwrite
+    replaces it, keep-latest-ingestion replaces it only from a newer ingestion.
+
+    Rejections are counted per reason in rejection_summaries; only the first
+    `sample_cap` rows per reason keep their raw row in `rejections`. Callers ask
+    take_sample() before building a raw row, so unsampled rejections cost a counter bump.
+
+    With CHANGE_FEED on, the deltas each batch makes to latest_prices are appended to the
+    price_changes log in the same commit (under the change-log lock; see changes.py).
+
+    An AliasMatcher (see matching.py) writes the aliases and candidates it decided on with
+    the same commit as the prices that used them.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        ing: RawIngestion,
+        batch_size: int | None = None,
+        conflict_policy: str | None = None,
+        stages: StageTimer | None = None,
+        sample_cap: int | None = None,
+        matcher=None,
+    ):
+        self.db = db
+        self.ing = ing
+        self.stages = stages or StageTimer()
+        self.matcher = matcher
+        # called first thing in checkpoint(), to add rows a caller held back for the batch
+        self.before_checkpoint = None
+        self.batch_size = batch_size or settings.etl_batch_size
+        self.conflict_policy = conflict_policy or settings.price_conflict_policy
+        if self.conflict_policy not in CONFLICT_POLICIES:
+            raise ValueError(f"Unknown price conflict policy: {self.conflict_policy}")
+        self._prices: list[dict] = []
+        self._rejections: list[dict] = []
+        self._changes: list[dict] = []
+        self.sample_cap = settings.rejection_sample_cap if sample_cap is None else sample_cap
+        # reason_code -> [rejected, first_row, last_row, sampled] since the last checkpoint
+        self._reasons: dict[int, list[int]] = {}
+        # samples per reason for the whole ingestion (committed, and including this batch)
+        self._committed_samples: dict[int, int] = dict(db.execute(
+            select(RejectionSummary.reason_code, RejectionSummary.sampled_rows)
+            .where(RejectionSummary.ingestion_id == ing.id)
+        ).all())
+        self._samples = dict(self._committed_samples)
+        self._pending_rows = 0
+        if self.matcher is not None:
+            self.matcher.discard()
+        self._last_row: int | None = None
+        # committed by this loader (i.e. this run)
+        self.loaded = 0
+        self.rejected = 0
+        self.duplicates = 0
+        # prices rows inserted or overwritten, i.e. whether the read side changed
+        self.changed = 0
+
+    def add_price(self, row: dict):
+        self._prices.append(row)
+
+    def take_sample(self, reason_code: int) -> bool:
+        """Reserves a sample slot for this reason; False once the cap is reached."""
+        kept = self._samples.get(reason_code, 0)
+        if 0 <= self.sample_cap <= kept:
+            return False
+        self._samples[reason_code] = kept + 1
+        return True
+
+    def add_rejection(self, row_number: int, reason_code: int, detail: str | None = None, raw_row: dict | None = None):
+        # raw_row only for rows that got a take_sample() slot
+        counts = self._reasons.get(reason_code)
+        if counts is None:
+            counts = self._reasons[reason_code] = [0, row_number, row_number, 0]
+        counts[0] += 1
+        # rows held back until the checkpoint can arrive after later ones
+        counts[1] = min(counts[1], row_number)
+        counts[2] = max(counts[2], row_number)
+        if raw_row is not None:
+            counts[3] += 1
+            self._rejections.append({
+                "ingestion_id": self.ing.id,
+                "row_number": row_number,
+                "reason_code": reason_code,
+                "detail": detail,
+                "raw_row": raw_row,
+            })
+
+    def advance(self, row_number: int, rows: int = 1):
+        # source rows up to row_number are fully handled
+        self._last_row = row_number
+        self._pending_rows += rows
+        if self._pending_rows >= self.batch_size:
+            self.checkpoint()
+
+    def checkpoint(self):
+        if self.before_checkpoint is not None:
+            self.before_checkpoint()
+        written = len(self._prices) + len(self._rejections)
+        with self.stages.stage("persist", written):
+            loaded, duplicates, changed = self._write_prices() if self._prices else (0, 0, 0)
+            rejected = sum(c[0] for c in self._reasons.values())
+            if self._rejections:
+                self.db.execute(insert(Rejection), self._rejections)
+            if self._reasons:
+                self._write_summary()
+            record_changes(self.db, self._changes)
+            if self.matcher is not None:
+                self.matcher.flush()
+            if self._last_row is not None:
+                self.ing.checkpoint_row = self._last_row
+            self.ing.lease_until = datetime.utcnow() + timedelta(seconds=settings.etl_lease_seconds)
+            self.ing.loaded_rows += loaded
+            self.ing.rejected_rows += rejected
+            self.ing.duplicate_rows += duplicates
+        with self.stages.stage("commit", written):
+            self.db.commit()
+
+        self._committed_samples = dict(self._samples)
+        self.discard()
+        self.loaded += loaded
+        self.rejected += rejected
+        self.duplicates += duplicates
+        self.changed += changed
+
+    def _write_summary(self):
+        stmt = upsert_insert(self.db, RejectionSummary)
+        new, cur = stmt.excluded, RejectionSummary.__table__.c
+        self.db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["ingestion_id", "reason_code"],
+                set_={
+                    "rejected_rows": cur.rejected_rows + new.rejected_rows,
+                    "sampled_rows": cur.sampled_rows + new.sampled_rows,
+                    "last_row": new.last_row,
+                },
+            ),
+            [
+                {"ingestion_id": self.ing.id, "reason_code": code, "rejected_rows": n,
+                 "first_row": first, "last_row": last, "sampled_rows": sampled}
+                for code, (n, first, last, sampled) in self._reasons.items()
+            ],
+        )
+
+    def _existing_keys(self, keys: set[tuple]) -> set[tuple]:
+        # one indexed probe per batch (ix_prices_vendor_time), narrowed in Python
+        times = [k[2] for k in keys]
+        found = self.db.execute(
+            select(Price.product_id, Price.vendor_id, Price.observed_at).where(
+                Price.vendor_id.in_({k[1] for k in keys}),
+                Price.observed_at.between(min(times), max(times)),
+                Price.product_id.in_({k[0] for k in keys}),
+            )
+        ).all()
+        return {tuple(r) for r in found} & keys
+
+    def _write_prices(self) -> tuple[int, int, int]:
+        # collapse repeats inside the batch (skip keeps the first, other policies the last)
+        batch: dict[tuple, dict] = {}
+        for r in self._prices:
+            key = (r["product_id"], r["vendor_id"], r["observed_at"])
+            if self.conflict_policy != "skip" or key not in batch:
+                batch[key] = r
+
+        existing = self._existing_keys(set(batch))
+        ensure_price_partitions(self.db, {r["observed_at"] for r in self._prices})
+        stmt = upsert_insert(self.db, Price)
+        if self.conflict_policy == "skip":
+            # ON CONFLICT still guards against a concurrent worker inserting the same key
+            rows = [r for k, r in batch.items() if k not in existing]
+            stmt = stmt.on_conflict_do_nothing(index_elements=NATURAL_KEY)
+        else:
+            new = stmt.excluded
+            rows = list(batch.values())
+            stmt = stmt.on_conflict_do_update(
+                index_elements=NATURAL_KEY,
+                set_={c: new[c] for c in ("currency", "price", "price_aed", "source_ingestion_id")},
+                where=(new.source_ingestion_id >= Price.__table__.c.source_ingestion_id)
+                if self.conflict_policy == "keep-latest-ingestion" else None,
+            )
+        # the projections and the change log follow the rows the statement actually wrote
+        written = [
+            r._asdict() for r in self.db.execute(stmt.returning(*(Price.__table__.c[c] for c in LATEST_COLUMNS)), rows)
+        ] if rows else []
+        loaded = sum(1 for r in written if (r["product_id"], r["vendor_id"], r["observed_at"]) not in existing)
+        if written:
+            if settings.change_feed:
+                lock_change_log(self.db)
+                self._changes += price_changes(self.db, written)
+            upsert_latest_prices(self.db, written)
+            # an upsert only folds new points into a day; days where a point was overwritten
+            # are recomputed from prices instead, fresh points on them included
+            day = lambda r: (r["product_id"], r["vendor_id"], r["observed_at"].date())
+            overwritten = {day(r) for r in written if (r["product_id"], r["vendor_id"], r["observed_at"]) in existing}
+            upsert_daily_rollups(self.db, [r for r in written if day(r) not in overwritten])
+            recompute_daily_rollups(self.db, overwritten)
+        return loaded, len(self._prices) - loaded, len(written)
+
+    def discard(self):
+        self._prices.clear()
+        self._rejections.clear()
+        self._changes.clear()
+        self._reasons.clear()
+        self._samples = dict(self._committed_samples)
+        self._pending_rows = 0
+        if self.matcher is not None:
+            self.matcher.discard()
@@ -1,19 +1,68 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query, Request, Response
+from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import io
+import json
 from sqlalchemy.orm import Session
 from sqlalchemy import select, func
 from datetime import datetime
-from .db import engine, Base, get_db
-from .models import Vendor, Product, RawIngestion, Price, Rejection
-from .storage import save_upload_bytes
-from .etl import run_etl
-from .seed import seed
+from .config import settings
+from .db import get_db, get_read_db, ReadSession, dispose_async_engine
+from .models import Vendor, Product, ProductAlias, AliasCandidate, RawIngestion, Rejection, RejectionSummary, RejectReason, LatestPrice, Run, RunStage
+from .ingest import register_ingestion, register_ingestions, requeue_ingestion
+from .archives import archive_kind, store_upload
+from .jobs import enqueue_run, schedule_auto_run, start_background_worker, stop_background_worker
+from .metrics import PROFILERS, STAGES, profiler_available, render_prometheus
+from .transform.feeds import FeedSpec, compile_feed, vendor_by_feed_key
+from .history import BUCKETS, query_points, query_buckets
+from .changes import changes_after
+from .change_stream import PAGE, broadcaster, changes_page, head_seq
+from .response_cache import response_cache, bump_generation, cache_key, make_etag, etag_matches, CachedResponse
 
 app = FastAPI(title="Price ETL Compare", version="0.1.0")
 
+# ETL, seed, FX import and projection rebuilds are imported by the endpoints that use them,
+# so read-only API processes never load them (see the startup numbers in `python -m app.bench --startup`)
+
 @app.on_event("startup")
 def on_startup():
-    # MVP: create tables automatically
-    Base.metadata.create_all(bind=engine)
+    if settings.db_auto_migrate:
+        from .migrate import migrate
+        migrate()
+    start_background_worker()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await run_in_threadpool(stop_background_worker, settings.etl_shutdown_timeout)
+    await dispose_async_engine()
+
+CACHED_PATHS = ("/products", "/cheapest", "/compare/", "/history/")
+
+@app.middleware("http")
+async def cache_read_responses(request: Request, call_next):
+    path = request.url.path
+    if request.method != "GET" or not any(path == p or (p.endswith("/") and path.startswith(p)) for p in CACHED_PATHS):
+        return await call_next(request)
+
+    # read the generation before the handler runs, so a result racing an ETL commit is filed under the old one
+    key = cache_key(path, request.query_params, response_cache.generation())
+    entry = response_cache.get(key)
+    status = "HIT"
+    if entry is None:
+        status = "MISS"
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        entry = CachedResponse(body=body, etag=make_etag(body), media_type=response.headers.get("content-type", "application/json"))
+        response_cache.set(key, entry)
+
+    headers = {"ETag": entry.etag, "X-Cache": status}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
 
 @app.get("/health")
 def health():
@@ -21,105 +70,311 @@ def health():
 
 @app.post("/admin/seed")
 def admin_seed(db: Session = Depends(get_db)):
+    from .seed import seed
     seed(db)
     return {"seeded": True}
 
+@app.post("/admin/rebuild-latest")
+def admin_rebuild_latest(db: Session = Depends(get_db)):
+    from .projections import rebuild_latest_prices
+    count = rebuild_latest_prices(db)
+    bump_generation()
+    return {"latest_prices": count}
+
+@app.post("/admin/rebuild-rollups")
+def admin_rebuild_rollups(db: Session = Depends(get_db)):
+    from .projections import rebuild_daily_rollups
+    count = rebuild_daily_rollups(db)
+    bump_generation()
+    return {"price_daily_rollups": count}
+
+@app.get("/admin/partitions")
+def admin_partitions(db: Session = Depends(get_db)):
+    from .partitions import list_price_partitions
+    return {"partitions": list_price_partitions(db)}
+
+@app.post("/admin/retention")
+def admin_retention(keep_months: int | None = Query(None, ge=1), drop: bool | None = None, db: Session = Depends(get_db)):
+    from .partitions import apply_retention
+    result = apply_retention(db, keep_months=keep_months, drop=drop)
+    bump_generation()
+    return result
+
+@app.post("/admin/fx/import")
+def admin_fx_import(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    from .fx_import import import_fx_csv
+    try:
+        return import_fx_csv(db, io.TextIOWrapper(file.file, encoding="utf-8", newline=""))
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/admin/catalog/import")
+def admin_catalog_import(
+    products: UploadFile | None = File(None),
+    aliases: UploadFile | None = File(None),
+    remap: bool = False,
+    db: Session = Depends(get_db),
+):
+    # CSV or JSON Lines (by file extension); products merge before aliases, all in one transaction
+    from .catalog_import import file_format, import_catalog
+    if products is None and aliases is None:
+        raise HTTPException(status_code=400, detail="Upload products and/or aliases")
+    try:
+        return import_catalog(
+            db,
+            products=io.TextIOWrapper(products.file, encoding="utf-8", newline="") if products else None,
+            aliases=io.TextIOWrapper(aliases.file, encoding="utf-8", newline="") if aliases else None,
+            products_format=file_format(products.filename or "") if products else "csv",
+            aliases_format=file_format(aliases.filename or "") if aliases else "csv",
+            remap=remap,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/schema")
+def admin_schema():
+    from .migrate import status
+    return status()
+
+@app.get("/admin/cache")
+def admin_cache():
+    return response_cache.stats()
+
+class VendorIn(BaseModel):
+    name: str
+    default_currency: str
+    feed_key: str
+    feed_spec: FeedSpec
+
+def _vendor_out(v: Vendor) -> dict:
+    return {"vendor_id": v.id, "name": v.name, "default_currency": v.default_currency, "feed_key": v.feed_key, "feed_spec": v.feed_spec}
+
+@app.get("/admin/vendors")
+def admin_vendors(db: Session = Depends(get_db)):
+    return [_vendor_out(v) for v in db.execute(select(Vendor).order_by(Vendor.id)).scalars()]
+
+@app.put("/admin/vendors/{vendor_id}")
+def admin_put_vendor(vendor_id: str, body: VendorIn, db: Session = Depends(get_db)):
+    # onboarding a vendor is a data change: the spec is validated and compiled here, used by the next ETL run
+    feed_key = body.feed_key.lower().strip()
+    other = vendor_by_feed_key(db, feed_key)
+    if other is not None and other.id != vendor_id:
+        raise HTTPException(status_code=409, detail=f"feed_key {feed_key} belongs to {other.id}")
+    compile_feed(vendor_id, body.feed_spec, body.default_currency)
+    v = db.get(Vendor, vendor_id) or Vendor(id=vendor_id)
+    v.name = body.name
+    v.default_currency = body.default_currency.upper()
+    v.feed_key = feed_key
+    v.feed_spec = body.feed_spec.model_dump(exclude_none=True)
+    db.add(v)
+    db.commit()
+    return _vendor_out(v)
+
+async def _ingest_vendor_id(db: Session, vendor_key: str) -> str:
+    vendor = await run_in_threadpool(vendor_by_feed_key, db, vendor_key)
+    if vendor is None:
+        keys = await run_in_threadpool(lambda: db.execute(select(Vendor.feed_key).where(Vendor.feed_key.is_not(None)).order_by(Vendor.feed_key)).scalars().all())
+        raise HTTPException(status_code=400, detail=f"Unknown vendor. Use {', '.join(keys)}")
+    return vendor.id
+
 @app.post("/ingest/{vendor_key}")
 async def ingest(vendor_key: str, file: UploadFile = File(...), db: Session = Depends(get_db)):
     vendor_key = vendor_key.lower().strip()
-    vendor_map = {"vendor_a":"V-A", "vendor_b":"V-B", "vendor_c":"V-C"}
-    if vendor_key not in vendor_map:
-        raise HTTPException(status_code=400, detail="Unknown vendor. Use vendor_a, vendor_b, vendor_c")
-    vendor_id = vendor_map[vendor_key]
-
-    data = await file.read()
-    if not data:
-        raise HTTPException(status_code=400, detail="Empty file")
-    stored_path = save_upload_bytes(file.filename or f"{vendor_key}.dat", data)
-
-    ing = RawIngestion(
-        vendor_id=vendor_id,
-        file_name=file.filename or "upload",
-        stored_path=stored_path,
-        status="PENDING",
+    vendor_id = await _ingest_vendor_id(db, vendor_key)
+
+    file_name = file.filename or f"{vendor_key}.dat"
+    if archive_kind(file_name) not in (None, "gz", "zst"):
+        raise HTTPException(status_code=400, detail=f"{file_name} is an archive; upload it to /ingest/{vendor_key}/batch")
+    # stream to disk + hash in a worker thread; never hold the whole upload in memory. A .gz / .zst
+    # is hashed on its decompressed content, as the batch endpoint does
+    try:
+        [(_, stored_path, sha256, size)] = await run_in_threadpool(store_upload, file_name, file.file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    ing, duplicate = await run_in_threadpool(register_ingestion, db, vendor_id, file.filename or "upload", stored_path, sha256)
+    if not duplicate:
+        await run_in_threadpool(schedule_auto_run, db)
+
+    return {
+        "ingestion_id": ing.id,
+        "vendor_id": vendor_id,
+        "stored_path": ing.stored_path,
+        "sha256": sha256,
+        "size": size,
+        "status": ing.status,
+        "duplicate": duplicate,
+    }
+
+@app.post("/ingest/{vendor_key}/batch")
+async def ingest_batch(vendor_key: str, files: list[UploadFile] = File(...), db: Session = Depends(get_db)):
+    # plain feeds, .gz / .zst files and .zip / .tar(.gz|.zst) bundles; members are decompressed straight
+    # to storage, and only once every file is stored are all ingestions registered, in one transaction
+    vendor_key = vendor_key.lower().strip()
+    vendor_id = await _ingest_vendor_id(db, vendor_key)
+
+    stored = []
+    try:
+        for i, file in enumerate(files, start=1):
+            stored += await run_in_threadpool(store_upload, file.filename or f"{vendor_key}-{i}.dat", file.file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    registered = await run_in_threadpool(
+        register_ingestions, db, vendor_id, [(name, path, sha256) for name, path, sha256, _ in stored],
     )
-    db.add(ing)
-    db.commit()
-    db.refresh(ing)
+    if any(not duplicate for _, duplicate in registered):
+        await run_in_threadpool(schedule_auto_run, db)
+
+    return {
+        "vendor_id": vendor_id,
+        "registered": sum(not duplicate for _, duplicate in registered),
+        "duplicates": sum(duplicate for _, duplicate in registered),
+        "files": [{
+            "file_name": name,
+            "ingestion_id": ing.id,
+            "stored_path": ing.stored_path,
+            "sha256": sha256,
+            "size": size,
+            "status": ing.status,
+            "duplicate": duplicate,
+        } for (name, _, sha256, size), (ing, duplicate) in zip(stored, registered)],
+    }
 
-    return {"ingestion_id": ing.id, "vendor_id": vendor_id, "stored_path": stored_path, "status": ing.status}
+@app.post("/run-etl", status_code=202)
+def run_all_etl(workers: int | None = None, mode: str | None = None, profile: str | None = None, db: Session = Depends(get_db)):
+    if workers is not None and workers < 1:
+        raise HTTPException(status_code=400, detail="workers must be >= 1")
+    if mode is not None and mode not in ("row", "columnar"):
+        raise HTTPException(status_code=400, detail="mode must be row or columnar")
+    if profile is not None and profile not in PROFILERS:
+        raise HTTPException(status_code=400, detail=f"profile must be one of {', '.join(PROFILERS)}")
+    if profile is not None and not profiler_available(profile):
+        raise HTTPException(status_code=400, detail=f"{profile} is not installed")
+    run = enqueue_run(db, workers=workers, mode=mode, profile=profile)
+    return {"run_id": run.id, "status": run.status, "poll": f"/runs/{run.id}"}
 
-@app.post("/run-etl")
-def run_all_etl(db: Session = Depends(get_db)):
-    return run_etl(db)
+def _run_summary(r: Run) -> dict:
+    return {
+        "run_id": r.id,
+        "status": r.status,
+        "trigger": r.trigger,
+        "message": r.message,
+        "queued_at": r.queued_at.isoformat(),
+        "started_at": r.started_at.isoformat() if r.status != "QUEUED" else None,
+        "finished_at": r.finished_at.isoformat() if r.finished_at else None,
+        "processed_ingestions": r.processed_ingestions,
+        "failed_ingestions": r.failed_ingestions,
+        "loaded_rows": r.loaded_rows,
+        "rejected_rows": r.rejected_rows,
+        "duplicate_rows": r.duplicate_rows,
+        "profile_path": r.profile_path,
+    }
+
+def _stage_totals(rows) -> dict:
+    totals = {s: {"seconds": 0.0, "rows": 0} for s in STAGES}
+    for st in rows:
+        totals[st.stage]["seconds"] = round(totals[st.stage]["seconds"] + st.seconds, 6)
+        totals[st.stage]["rows"] += st.rows
+    return totals
+
+@app.get("/runs")
+def runs(limit: int = Query(50, ge=1, le=500), db: Session = Depends(get_db)):
+    rows = db.execute(select(Run).order_by(Run.id.desc()).limit(limit)).scalars().all()
+    stages = db.execute(
+        select(RunStage).where(RunStage.run_id.in_([r.id for r in rows]))
+    ).scalars().all() if rows else []
+    by_run: dict[int, list] = {}
+    for st in stages:
+        by_run.setdefault(st.run_id, []).append(st)
+    return [{**_run_summary(r), "stages": _stage_totals(by_run.get(r.id, []))} for r in rows]
+
+@app.get("/runs/{run_id}")
+def run_detail(run_id: int, db: Session = Depends(get_db)):
+    r = db.get(Run, run_id)
+    if not r:
+        raise HTTPException(status_code=404, detail="Unknown run_id")
+    stages = db.execute(
+        select(RunStage).where(RunStage.run_id == run_id).order_by(RunStage.ingestion_id, RunStage.id)
+    ).scalars().all()
+    by_ingestion: dict[int, list] = {}
+    for st in stages:
+        by_ingestion.setdefault(st.ingestion_id, []).append(st)
+    return {
+        **_run_summary(r),
+        "stages": _stage_totals(stages),
+        "ingestions": [{"ingestion_id": i, "stages": _stage_totals(sts)} for i, sts in by_ingestion.items()],
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+# read endpoints are `async def` and query through ReadSession (the async engine; see db.get_read_db)
 
 @app.get("/products")
-def list_products(db: Session = Depends(get_db)):
-    products = db.execute(select(Product).order_by(Product.category, Product.id)).scalars().all()
+async def list_products(db: ReadSession = Depends(get_read_db)):
+    products = (await db.execute(select(Product).order_by(Product.category, Product.id))).scalars().all()
     return [{"product_id": p.id, "name": p.canonical_name, "category": p.category} for p in products]
 
 @app.get("/cheapest")
-def cheapest(db: Session = Depends(get_db)):
-    # latest observed_at per (product,vendor)
-    sub = (
+async def cheapest(
+    category: str | None = None,
+    limit: int | None = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    db: ReadSession = Depends(get_read_db),
+):
+    # min latest price per product over vendors still listing it (category filter + pagination applied per product)
+    mins = (
         select(
-            Price.product_id,
-            Price.vendor_id,
-            func.max(Price.observed_at).label("max_ts")
+            LatestPrice.product_id,
+            func.min(LatestPrice.price_aed).label("min_aed")
         )
-        .group_by(Price.product_id, Price.vendor_id)
-        .subquery()
-    )
-    latest = (
-        select(Price.product_id, Price.vendor_id, Price.price_aed, Price.observed_at)
-        .join(sub, (Price.product_id==sub.c.product_id) & (Price.vendor_id==sub.c.vendor_id) & (Price.observed_at==sub.c.max_ts))
-        .subquery()
+        .join(Product, Product.id == LatestPrice.product_id)
+        .where(LatestPrice.delisted_at.is_(None))
+        .group_by(LatestPrice.product_id)
+        .order_by(LatestPrice.product_id)
+        .offset(offset)
     )
+    if category is not None:
+        mins = mins.where(Product.category == category)
+    if limit is not None:
+        mins = mins.limit(limit)
+    mins = mins.subquery()
 
-    # now choose min price per product
-    rows = db.execute(
-        select(
-            latest.c.product_id,
-            func.min(latest.c.price_aed).label("min_aed")
-        ).group_by(latest.c.product_id)
-    ).all()
+    # one query: each page product with its name and every vendor tied at the minimum
+    rows = (await db.execute(
+        select(mins.c.product_id, Product.canonical_name, mins.c.min_aed,
+               LatestPrice.vendor_id, LatestPrice.price_aed, LatestPrice.observed_at)
+        .join(Product, Product.id == mins.c.product_id)
+        .join(LatestPrice, (LatestPrice.product_id == mins.c.product_id) & (LatestPrice.price_aed == mins.c.min_aed))
+        .where(LatestPrice.delisted_at.is_(None))
+        .order_by(mins.c.product_id, LatestPrice.vendor_id)
+    )).all()
 
     out = []
-    for product_id, min_aed in rows:
-        # find which vendor(s) match
-        vendors = db.execute(
-            select(latest.c.vendor_id, latest.c.price_aed, latest.c.observed_at)
-            .where(latest.c.product_id == product_id, latest.c.price_aed == min_aed)
-        ).all()
-        p = db.execute(select(Product).where(Product.id == product_id)).scalar_one()
-        out.append({
-            "product_id": product_id,
-            "product": p.canonical_name,
-            "cheapest_aed": float(min_aed),
-            "vendors": [{"vendor_id": v[0], "price_aed": float(v[1]), "as_of": v[2].isoformat()} for v in vendors]
-        })
+    for product_id, name, min_aed, vendor_id, price_aed, observed_at in rows:
+        if not out or out[-1]["product_id"] != product_id:
+            out.append({
+                "product_id": product_id,
+                "product": name,
+                "cheapest_aed": float(min_aed),
+                "vendors": [],
+            })
+        out[-1]["vendors"].append({"vendor_id": vendor_id, "price_aed": float(price_aed), "as_of": observed_at.isoformat()})
     return out
 
 @app.get("/compare/{product_id}")
-def compare(product_id: str, db: Session = Depends(get_db)):
-    # latest price per vendor for this product
-    sub = (
-        select(
-            Price.vendor_id,
-            func.max(Price.observed_at).label("max_ts")
-        )
-        .where(Price.product_id == product_id)
-        .group_by(Price.vendor_id)
-        .subquery()
-    )
-    latest = db.execute(
-        select(Price.vendor_id, Price.price_aed, Price.observed_at)
-        .join(sub, (Price.vendor_id==sub.c.vendor_id) & (Price.observed_at==sub.c.max_ts))
-        .where(Price.product_id == product_id)
-        .order_by(Price.price_aed.asc())
-    ).all()
-
-    p = db.execute(select(Product).where(Product.id == product_id)).scalar_one_or_none()
+async def compare(product_id: str, db: ReadSession = Depends(get_read_db)):
+    # latest price per vendor still listing this product
+    latest = (await db.execute(
+        select(LatestPrice.vendor_id, LatestPrice.price_aed, LatestPrice.observed_at)
+        .where(LatestPrice.product_id == product_id, LatestPrice.delisted_at.is_(None))
+        .order_by(LatestPrice.price_aed.asc(), LatestPrice.vendor_id)
+    )).all()
+
+    p = (await db.execute(select(Product).where(Product.id == product_id))).scalar_one_or_none()
     if not p:
         raise HTTPException(status_code=404, detail="Unknown product_id")
 
@@ -139,41 +394,257 @@ def compare(product_id: str, db: Session = Depends(get_db)):
     }
 
 @app.get("/history/{product_id}")
-def history(product_id: str, db: Session = Depends(get_db)):
-    p = db.execute(select(Product).where(Product.id == product_id)).scalar_one_or_none()
+async def history(
+    product_id: str,
+    from_: datetime | None = Query(None, alias="from"),
+    to: datetime | None = None,
+    bucket: str | None = None,
+    vendor_id: str | None = None,
+    cursor: str | None = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    db: ReadSession = Depends(get_read_db),
+):
+    p = (await db.execute(select(Product).where(Product.id == product_id))).scalar_one_or_none()
     if not p:
         raise HTTPException(status_code=404, detail="Unknown product_id")
-    rows = db.execute(
-        select(Price.vendor_id, Price.observed_at, Price.price_aed)
-        .where(Price.product_id == product_id)
-        .order_by(Price.observed_at.asc())
-    ).all()
+    if bucket is not None:
+        if bucket not in BUCKETS:
+            raise HTTPException(status_code=400, detail="bucket must be hour, day or week")
+        return {
+            "product_id": product_id,
+            "product": p.canonical_name,
+            "bucket": bucket,
+            "buckets": await query_buckets(db, product_id, bucket, vendor_id, from_, to),
+        }
+    try:
+        points, next_cursor = await query_points(db, product_id, vendor_id, from_, to, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     return {
         "product_id": product_id,
         "product": p.canonical_name,
-        "points": [{"vendor_id": r[0], "t": r[1].isoformat(), "price_aed": float(r[2])} for r in rows]
+        "points": points,
+        "next_cursor": next_cursor,
     }
 
+@app.get("/changes")
+def list_changes(
+    after: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    product_id: str | None = None,
+    db: Session = Depends(get_db),
+):
+    items = changes_after(db, after, limit, product_id)
+    return {"changes": items, "next_after": items[-1]["seq"] if items else after}
+
+@app.get("/changes/stream")
+async def price_change_stream(request: Request, after: int | None = Query(None, ge=0), product_id: str | None = None):
+    # Server-Sent Events; resumes after ?after= or the Last-Event-ID a reconnecting client sends,
+    # otherwise starts at the current end of the log. New changes come from the process's one
+    # poller (change_stream.broadcaster); a client behind it catches up from the log first.
+    last_id = request.headers.get("last-event-id", "")
+    if after is None:
+        after = int(last_id) if last_id.isdigit() else await run_in_threadpool(head_seq)
+
+    async def events():
+        queue = broadcaster.subscribe()
+        cursor, behind = after, True
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                if behind:
+                    batch = await run_in_threadpool(changes_page, cursor, product_id)
+                    behind = len(batch) == PAGE
+                else:
+                    try:
+                        batch = await asyncio.wait_for(queue.get(), timeout=15)
+                    except asyncio.TimeoutError:
+                        yield ": keepalive\n\n"
+                        continue
+                    if batch is None:
+                        behind = True
+                        continue
+                for c in batch:
+                    if c["seq"] <= cursor or (product_id and c["product_id"] != product_id):
+                        continue
+                    cursor = c["seq"]
+                    yield f"id: {c['seq']}\nevent: {c['kind']}\ndata: {json.dumps(c)}\n\n"
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.get("/ingestions")
-def ingestions(db: Session = Depends(get_db)):
-    rows = db.execute(select(RawIngestion).order_by(RawIngestion.id.desc()).limit(50)).scalars().all()
+async def ingestions(db: ReadSession = Depends(get_read_db)):
+    rows = (await db.execute(select(RawIngestion).order_by(RawIngestion.id.desc()).limit(50))).scalars().all()
     return [{
         "id": r.id,
         "vendor_id": r.vendor_id,
         "file_name": r.file_name,
         "status": r.status,
         "message": r.message,
+        "checkpoint_row": r.checkpoint_row,
+        "loaded_rows": r.loaded_rows,
+        "rejected_rows": r.rejected_rows,
+        "duplicate_rows": r.duplicate_rows,
         "ingested_at": r.ingested_at.isoformat(),
     } for r in rows]
 
+@app.post("/ingestions/{ingestion_id}/retry")
+def retry_ingestion(ingestion_id: int, force: bool = False, db: Session = Depends(get_db)):
+    ing = requeue_ingestion(db, ingestion_id, force=force)
+    if ing is None:
+        existing = db.get(RawIngestion, ingestion_id)
+        if not existing:
+            raise HTTPException(status_code=404, detail="Unknown ingestion_id")
+        raise HTTPException(status_code=409, detail=f"Ingestion is {existing.status}; only FAILED ingestions can be retried")
+    return {"ingestion_id": ing.id, "status": ing.status, "resume_after_row": ing.checkpoint_row}
+
+def _reason_code(reason: str | None) -> int | None:
+    if reason is None:
+        return None
+    try:
+        return RejectReason[reason.upper()]
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"reason must be one of: {', '.join(r.label for r in RejectReason)}")
+
+@app.get("/ingestions/{ingestion_id}/rejections/summary")
+async def rejection_summary(ingestion_id: int, db: ReadSession = Depends(get_read_db)):
+    ing = (await db.execute(select(RawIngestion).where(RawIngestion.id == ingestion_id))).scalar_one_or_none()
+    if not ing:
+        raise HTTPException(status_code=404, detail="Unknown ingestion_id")
+    rows = (await db.execute(
+        select(RejectionSummary).where(RejectionSummary.ingestion_id == ingestion_id)
+        .order_by(RejectionSummary.rejected_rows.desc(), RejectionSummary.reason_code)
+    )).scalars().all()
+    return {
+        "ingestion_id": ing.id,
+        "status": ing.status,
+        "rejected_rows": ing.rejected_rows,
+        "reasons": [{
+            "reason": RejectReason(r.reason_code).label,
+            "rejected_rows": r.rejected_rows,
+            "sampled_rows": r.sampled_rows,
+            "first_row": r.first_row,
+            "last_row": r.last_row,
+        } for r in rows],
+    }
+
 @app.get("/rejections")
-def rejections(db: Session = Depends(get_db)):
-    rows = db.execute(select(Rejection).order_by(Rejection.id.desc()).limit(100)).scalars().all()
+async def rejections(
+    ingestion_id: int | None = None,
+    reason: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: ReadSession = Depends(get_read_db),
+):
+    # sampled rows only; GET /ingestions/{id}/rejections/summary has the full counts
+    q = select(Rejection)
+    if ingestion_id is not None:
+        q = q.where(Rejection.ingestion_id == ingestion_id)
+    code = _reason_code(reason)
+    if code is not None:
+        q = q.where(Rejection.reason_code == code)
+    rows = (await db.execute(q.order_by(Rejection.id.desc()).limit(limit))).scalars().all()
     return [{
         "id": r.id,
         "ingestion_id": r.ingestion_id,
         "row_number": r.row_number,
-        "reason": r.reason,
+        "reason": RejectReason(r.reason_code).label,
+        "detail": r.detail,
         "raw_row": r.raw_row,
         "created_at": r.created_at.isoformat(),
     } for r in rows]
+
+def _candidate_out(c: AliasCandidate, canonical_name: str | None) -> dict:
+    return {
+        "id": c.id,
+        "vendor_id": c.vendor_id,
+        "vendor_sku": c.vendor_sku,
+        "vendor_name_raw": c.vendor_name_raw,
+        "product_id": c.product_id,
+        "canonical_name": canonical_name,
+        "score": c.score,
+        "status": c.status,
+        "seen_rows": c.seen_rows,
+        "last_ingestion_id": c.last_ingestion_id,
+        "updated_at": c.updated_at.isoformat(),
+    }
+
+@app.get("/aliases/candidates")
+async def alias_candidates(
+    status: str = "PROPOSED",
+    vendor_id: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: ReadSession = Depends(get_read_db),
+):
+    # name matches for unknown vendor SKUs, best first (see matching.py)
+    q = (
+        select(AliasCandidate, Product.canonical_name)
+        .outerjoin(Product, Product.id == AliasCandidate.product_id)
+        .where(AliasCandidate.status == status.upper())
+    )
+    if vendor_id is not None:
+        q = q.where(AliasCandidate.vendor_id == vendor_id)
+    rows = (await db.execute(q.order_by(AliasCandidate.score.desc(), AliasCandidate.id).limit(limit))).all()
+    return [_candidate_out(c, name) for c, name in rows]
+
+@app.get("/aliases/match")
+def alias_match(name: str, limit: int = Query(5, ge=1, le=50), db: Session = Depends(get_db)):
+    # what the matcher would propose for a vendor's product name
+    from .matching import alias_index
+    return [{"product_id": p, "score": s} for p, s in alias_index(db).match_many([name], limit)[0]]
+
+def _review_candidate(db: Session, candidate_id: int) -> AliasCandidate:
+    c = db.get(AliasCandidate, candidate_id)
+    if c is None:
+        raise HTTPException(status_code=404, detail="Unknown candidate id")
+    return c
+
+@app.post("/aliases/candidates/{candidate_id}/accept")
+def accept_alias_candidate(candidate_id: int, product_id: str | None = None, db: Session = Depends(get_db)):
+    # creates the alias (for the proposed product unless product_id overrides it); the next run loads the SKU's rows
+    from .transform.lookup import invalidate_lookups
+    c = _review_candidate(db, candidate_id)
+    product_id = product_id or c.product_id
+    if not product_id or db.get(Product, product_id) is None:
+        raise HTTPException(status_code=400, detail="Unknown product_id")
+    alias = db.execute(select(ProductAlias).where(
+        ProductAlias.vendor_id == c.vendor_id, ProductAlias.vendor_sku == c.vendor_sku,
+    )).scalar_one_or_none()
+    if alias is not None and alias.product_id != product_id:
+        raise HTTPException(status_code=409, detail=f"{c.vendor_sku} is already an alias of {alias.product_id}")
+    now = datetime.utcnow()
+    if alias is None:
+        db.add(ProductAlias(vendor_id=c.vendor_id, vendor_sku=c.vendor_sku, product_id=product_id, vendor_name_raw=c.vendor_name_raw))
+    else:
+        # confirming an auto-applied match: restamp it so the name index picks the alias up
+        alias.updated_at = now
+    c.product_id = product_id
+    c.status = "ACCEPTED"
+    c.updated_at = now
+    db.commit()
+    invalidate_lookups()
+    return _candidate_out(c, db.get(Product, product_id).canonical_name)
+
+@app.post("/aliases/candidates/{candidate_id}/reject")
+def reject_alias_candidate(candidate_id: int, db: Session = Depends(get_db)):
+    # the SKU stays unknown and is not proposed again; an applied match loses its alias
+    # (prices already loaded through it are kept)
+    from .matching import forget_alias
+    from .transform.lookup import invalidate_lookups
+    c = _review_candidate(db, candidate_id)
+    alias = None
+    if c.status in ("APPLIED", "ACCEPTED"):
+        alias = db.execute(select(ProductAlias).where(
+            ProductAlias.vendor_id == c.vendor_id, ProductAlias.vendor_sku == c.vendor_sku,
+            ProductAlias.product_id == c.product_id,
+        )).scalar_one_or_none()
+        if alias is not None:
+            db.delete(alias)
+    c.status = "REJECTED"
+    c.updated_at = datetime.utcnow()
+    db.commit()
+    if alias is not None:
+        invalidate_lookups()
+        forget_alias(alias.id)
+    return _candidate_out(c, None)
@@ -0,0 +1,357 @@
+"""Name matching for vendor SKUs that have no alias yet.
+
+AliasIndex is a token inverted index over Product.canonical_name and known
+ProductAlias.vendor_name_raw values, with a trigram index over its token vocabulary so
+misspelt tokens still find their postings. A query only scores the documents sharing a
+token with it: IDF-weighted Dice overlap, best document per product.
+
+The index is built once per process and afterwards synced with the catalog rows whose
+updated_at moved (see alias_index). Aliases the matcher applied on its own stay out of it
+until a reviewer accepts them, so a guess never scores as evidence for itself. The ETL asks
+an AliasMatcher per ingestion.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from threading import Lock
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from .config import settings
+from .models import AliasCandidate, Product, ProductAlias
+from .projections import upsert_insert
+
+_TOKEN = re.compile(r"[a-z]+|\d+")
+FUZZY_MIN_LEN = 4  # shorter tokens (and all numbers) must match exactly
+FUZZY_MIN_SIM = 0.5  # trigram Jaccard for a misspelt token to count
+FUZZY_MAX_TERMS = 3
+MAX_CANDIDATE_DF = 2000  # tokens in more documents than this still score, but don't pull in candidates
+AMBIGUITY_MARGIN = 0.05  # auto-apply needs the best product this far ahead of the runner-up
+# rows stamped by a transaction that committed after a sync are still picked up if they are
+# at most this much older than the newest row that sync saw
+SYNC_OVERLAP = timedelta(seconds=60)
+SYNC_BATCH = 10_000
+
+def tokens(name: str | None) -> tuple[str, ...]:
+    return tuple(dict.fromkeys(_TOKEN.findall((name or "").lower())))
+
+def trigrams(token: str) -> set[str]:
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class AliasIndex:
+    def __init__(self):
+        self.lock = Lock()
+        # documents are distinct (product_id, tokens); catalog rows ("p", id) / ("a", id) point at one
+        self._docs: list[tuple[str, tuple[str, ...]] | None] = []
+        self._doc_ids: dict[tuple[str, tuple[str, ...]], int] = {}
+        self._refs: list[int] = []
+        self._sources: dict[tuple[str, object], int] = {}
+        # ids of every synced catalog row per kind, indexed or not; sync compares them with the table
+        self._known: dict[str, set] = {"p": set(), "a": set()}
+        self._postings: dict[str, set[int]] = defaultdict(set)
+        self._grams: dict[str, set[str]] = defaultdict(set)
+        self.size = 0
+        # idf per token and weight per document; both depend on the whole index, so any change clears them
+        self._idf: dict[str, float] = {}
+        self._weights: dict[int, float] = {}
+        self.synced_to: datetime | None = None
+
+    def put(self, key: tuple[str, object], product_id: str, name: str | None):
+        """Adds or replaces the catalog row `key`; a no-op when it is unchanged."""
+        toks = tokens(name)
+        doc = self._sources.get(key)
+        if doc is not None:
+            if self._docs[doc] == (product_id, toks):
+                return
+            self.remove(key)
+        if not toks:
+            return
+        doc = self._doc_ids.get((product_id, toks))
+        if doc is None:
+            doc = len(self._docs)
+            self._docs.append((product_id, toks))
+            self._refs.append(0)
+            self._doc_ids[(product_id, toks)] = doc
+            self.size += 1
+            self._idf.clear()
+            self._weights.clear()
+            for t in toks:
+                if t not in self._postings and len(t) >= FUZZY_MIN_LEN and not t.isdigit():
+                    for g in trigrams(t):
+                        self._grams[g].add(t)
+                self._postings[t].add(doc)
+        self._refs[doc] += 1
+        self._sources[key] = doc
+
+    def remove(self, key: tuple[str, object]):
+        self._known[key[0]].discard(key[1])
+        doc = self._sources.pop(key, None)
+        if doc is None:
+            return
+        self._refs[doc] -= 1
+        if self._refs[doc]:
+            return
+        product_id, toks = self._docs[doc]
+        self._docs[doc] = None
+        del self._doc_ids[(product_id, toks)]
+        self.size -= 1
+        self._idf.clear()
+        self._weights.clear()
+        for t in toks:
+            postings = self._postings[t]
+            postings.discard(doc)
+            if not postings:
+                del self._postings[t]
+                for g in trigrams(t):
+                    self._grams.get(g, set()).discard(t)
+
+    def _expand(self, token: str) -> list[tuple[str, float]]:
+        # vocabulary tokens standing for a query token: itself, else its closest spellings
+        if token in self._postings:
+            return [(token, 1.0)]
+        if len(token) < FUZZY_MIN_LEN or token.isdigit():
+            return []
+        grams = trigrams(token)
+        shared = Counter(t for g in grams for t in self._grams.get(g, ()))
+        close = []
+        for t, n in shared.items():
+            sim = n / (len(grams) + len(trigrams(t)) - n)
+            if sim >= FUZZY_MIN_SIM:
+                close.append((sim, t))
+        return [(t, sim) for sim, t in sorted(close, reverse=True)[:FUZZY_MAX_TERMS]]
+
+    def match(self, name: str | None, limit: int = 3) -> list[tuple[str, float]]:
+        """Best products for a name as [(product_id, score 0-1)], best first."""
+        query = tokens(name)
+        if not query or not self.size:
+            return []
+        idf_cache, weights = self._idf, self._weights
+
+        def idf(t: str) -> float:
+            w = idf_cache.get(t)
+            if w is None:
+                w = idf_cache[t] = math.log(1 + self.size / len(self._postings[t]))
+            return w
+
+        unseen = math.log(1 + self.size)  # a query token the catalog has never used
+        terms = [self._expand(t) for t in query]
+        query_weight = sum(max((idf(t) for t, _ in exp), default=unseen) for exp in terms)
+
+        # term at a time, rarest first: each query token credits the documents holding it (or its
+        # closest spelling); tokens in more than MAX_CANDIDATE_DF documents only credit documents
+        # a rarer token already found
+        overlap: dict[int, float] = {}
+        for exp in sorted(terms, key=lambda exp: min((len(self._postings[t]) for t, _ in exp), default=0)):
+            credit: dict[int, float] = {}
+            for t, sim in exp:
+                w = sim * idf(t)
+                postings = self._postings[t]
+                if overlap and len(postings) > MAX_CANDIDATE_DF:
+                    postings = overlap.keys() & postings
+                for doc in postings:
+                    if credit.get(doc, 0.0) < w:
+                        credit[doc] = w
+            for doc, w in credit.items():
+                overlap[doc] = overlap.get(doc, 0.0) + w
+
+        best: dict[str, float] = {}
+        for doc, shared in overlap.items():
+            product_id, toks = self._docs[doc]
+            weight = weights.get(doc)
+            if weight is None:
+                weight = weights[doc] = sum(idf(t) for t in toks)
+            score = 2 * shared / (query_weight + weight)
+            if score > best.get(product_id, 0.0):
+                best[product_id] = score
+        ranked = sorted(best.items(), key=lambda kv: (-kv[1], kv[0]))
+        return [(p, round(s, 4)) for p, s in ranked[:limit]]
+
+    def match_many(self, names: list[str | None], limit: int = 3) -> list[list[tuple[str, float]]]:
+        with self.lock:
+            return [self.match(n, limit) for n in names]
+
+    def sync(self, db: Session):
+        """Applies catalog rows stamped since the last sync (all rows on the first one) and drops deleted ones."""
+        since = self.synced_to - SYNC_OVERLAP if self.synced_to else None
+        products = select(Product.id, Product.canonical_name, Product.updated_at)
+        aliases = select(ProductAlias.id, ProductAlias.product_id, ProductAlias.vendor_name_raw, ProductAlias.updated_at).where(_reviewed_alias())
+        if since is not None:
+            products = products.where(Product.updated_at >= since)
+            aliases = aliases.where(ProductAlias.updated_at >= since)
+        newest = self.synced_to
+        with self.lock:
+            for product_id, name, stamp in db.execute(products.execution_options(yield_per=SYNC_BATCH)):
+                self.put(("p", product_id), product_id, name)
+                self._known["p"].add(product_id)
+                newest = max(newest, stamp) if newest and stamp else newest or stamp
+            for alias_id, product_id, name, stamp in db.execute(aliases.execution_options(yield_per=SYNC_BATCH)):
+                self.put(("a", alias_id), product_id, name)
+                self._known["a"].add(alias_id)
+                newest = max(newest, stamp) if newest and stamp else newest or stamp
+            self.synced_to = newest
+            self._drop_deleted(db, "p", select(Product.id))
+            self._drop_deleted(db, "a", select(ProductAlias.id).where(_reviewed_alias()))
+
+    def _drop_deleted(self, db: Session, kind: str, ids):
+        # a delete leaves the table with fewer rows than ids synced; only then are the ids read
+        known = self._known[kind]
+        if db.scalar(select(func.count()).select_from(ids.subquery())) >= len(known):
+            return
+        for gone in known - set(db.scalars(ids)):
+            self.remove((kind, gone))
+
+    def stats(self) -> dict:
+        return {
+            "documents": self.size,
+            "catalog_rows": len(self._known["p"]) + len(self._known["a"]),
+            "tokens": len(self._postings),
+            "synced_to": self.synced_to.isoformat() if self.synced_to else None,
+        }
+
+def _reviewed_alias():
+    # aliases the matcher applied itself keep an APPLIED candidate until a reviewer accepts it
+    return ~select(AliasCandidate.id).where(
+        AliasCandidate.vendor_id == ProductAlias.vendor_id,
+        AliasCandidate.vendor_sku == ProductAlias.vendor_sku,
+        AliasCandidate.status == "APPLIED",
+    ).exists()
+
+_index: AliasIndex | None = None
+_index_lock = Lock()
+
+def alias_index(db: Session) -> AliasIndex:
+    """The process's index: built on first use, then brought up to date incrementally."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = AliasIndex()
+        _index.sync(db)
+        return _index
+
+def forget_alias(alias_id: int):
+    """Drops a deleted alias from the index now rather than at the next sync."""
+    with _index_lock:
+        if _index is not None:
+            with _index.lock:
+                _index.remove(("a", alias_id))
+
+class AliasMatcher:
+    """One ingestion's unknown SKUs: each is looked up in alias_candidates or scored once.
+
+    A score at or above ALIAS_MATCH_APPLY_SCORE (and clear of the runner-up) becomes an alias
+    right away, so the ingestion loads the row instead of rejecting it; scores at or above
+    ALIAS_MATCH_PROPOSE_SCORE are recorded as PROPOSED candidates. Writes are buffered until
+    the loader's checkpoint, so new aliases commit together with the prices that used them.
+    """
+
+    def __init__(self, db: Session, vendor_id: str, ingestion_id: int, lookups):
+        self.db = db
+        self.vendor_id = vendor_id
+        self.ingestion_id = ingestion_id
+        # the run's LookupCache, which syncs the name index once for the whole run
+        self.lookups = lookups
+        self._decided: dict[str, str | None] = {}
+        self._candidates: dict[str, dict] = {}
+        self._rows: Counter = Counter()
+        self._aliases: list[dict] = []
+        self.applied = 0
+        self.proposed = 0
+        self.recovered_rows = 0
+
+    def resolve(self, rows: list[tuple[str, str | None]]) -> dict[str, str]:
+        """Takes the unknown rows' (vendor_sku, vendor_name_raw); returns {vendor_sku: product_id} for matched SKUs."""
+        fresh = {}
+        for sku, name in rows:
+            if sku not in self._decided:
+                fresh.setdefault(sku, name)
+        if fresh:
+            self._decide(fresh)
+        matched = {}
+        for sku, _ in rows:
+            self._rows[sku] += 1
+            if self._decided[sku]:
+                matched[sku] = self._decided[sku]
+                self.recovered_rows += 1
+        return matched
+
+    def _decide(self, names: dict[str, str | None]):
+        earlier = {
+            sku: (status, product_id)
+            for sku, status, product_id in self.db.execute(
+                select(AliasCandidate.vendor_sku, AliasCandidate.status, AliasCandidate.product_id).where(
+                    AliasCandidate.vendor_id == self.vendor_id,
+                    AliasCandidate.vendor_sku.in_(list(names)),
+                )
+            )
+        }
+        todo = []
+        for sku in names:
+            status, product_id = earlier.get(sku, (None, None))
+            if status == "REJECTED":
+                self._decided[sku] = None
+            elif status in ("APPLIED", "ACCEPTED") and product_id:
+                # the alias exists, but this run's alias cache was loaded before it
+                self._decided[sku] = product_id
+            else:
+                todo.append(sku)
+        if not todo:
+            return
+
+        now = datetime.utcnow()
+        for sku, matches in zip(todo, self.lookups.alias_index.match_many([names[s] for s in todo])):
+            product_id, score = matches[0] if matches else (None, 0.0)
+            runner_up = matches[1][1] if len(matches) > 1 else 0.0
+            apply = score >= settings.alias_match_apply_score and score - runner_up >= AMBIGUITY_MARGIN
+            self._decided[sku] = product_id if apply else None
+            if score < settings.alias_match_propose_score:
+                continue
+            if apply:
+                self.applied += 1
+                self._aliases.append({
+                    "vendor_id": self.vendor_id, "vendor_sku": sku, "product_id": product_id,
+                    "vendor_name_raw": names[sku], "updated_at": now,
+                })
+            else:
+                self.proposed += 1
+            self._candidates[sku] = {
+                "vendor_id": self.vendor_id, "vendor_sku": sku, "vendor_name_raw": names[sku],
+                "product_id": product_id, "score": score, "status": "APPLIED" if apply else "PROPOSED",
+            }
+
+    def flush(self):
+        # called by BatchLoader.checkpoint inside its transaction
+        if self._aliases:
+            stmt = upsert_insert(self.db, ProductAlias).on_conflict_do_nothing(index_elements=["vendor_id", "vendor_sku"])
+            self.db.execute(stmt, self._aliases)
+        now = datetime.utcnow()
+        rows = [
+            {**c, "seen_rows": self._rows[sku], "last_ingestion_id": self.ingestion_id, "updated_at": now}
+            for sku, c in self._candidates.items() if self._rows[sku]
+        ]
+        if rows:
+            stmt = upsert_insert(self.db, AliasCandidate)
+            new, cur = stmt.excluded, AliasCandidate.__table__.c
+            self.db.execute(stmt.on_conflict_do_update(
+                index_elements=["vendor_id", "vendor_sku"],
+                set_={
+                    "vendor_name_raw": new.vendor_name_raw,
+                    "product_id": new.product_id,
+                    "score": new.score,
+                    "status": new.status,
+                    "seen_rows": cur.seen_rows + new.seen_rows,
+                    "last_ingestion_id": new.last_ingestion_id,
+                    "updated_at": new.updated_at,
+                },
+                # a reviewer's decision stands, including one made while this run was going
+                where=(cur.status == "PROPOSED") | ((cur.status == new.status) & (cur.product_id == new.product_id)),
+            ), rows)
+        self.discard()
+
+    def discard(self):
+        # decisions stay memoised; only the writes since the last checkpoint are dropped
+        self._aliases.clear()
+        self._rows.clear()
+
+    def stats(self) -> dict:
+        return {"applied": self.applied, "proposed": self.proposed, "recovered_rows": self.recovered_rows}
@@ -0,0 +1,119 @@
+import importlib.util
+import os
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from .config import settings
+
+STAGES = ("parse", "validate", "alias_resolve", "fx_convert", "persist", "commit")
+
+class StageTimer:
+    """Accumulates wall time and row counts per ETL stage for one ingestion."""
+
+    def __init__(self):
+        self.seconds = {s: 0.0 for s in STAGES}
+        self.rows = {s: 0 for s in STAGES}
+
+    def add(self, stage: str, seconds: float, rows: int = 1):
+        self.seconds[stage] += seconds
+        self.rows[stage] += rows
+
+    @contextmanager
+    def stage(self, stage: str, rows: int = 1):
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, perf_counter() - t0, rows)
+
+    def timed(self, items, stage: str = "parse"):
+        # wraps an iterator so the time spent producing each item is charged to `stage`
+        it = iter(items)
+        while True:
+            t0 = perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            self.add(stage, perf_counter() - t0)
+            yield item
+
+    def as_dict(self) -> dict:
+        return {s: {"seconds": round(self.seconds[s], 6), "rows": self.rows[s]} for s in STAGES}
+
+# process-wide counters for GET /metrics; only runs executed by this process are counted
+_lock = threading.Lock()
+_stage_seconds = {s: 0.0 for s in STAGES}
+_stage_rows = {s: 0 for s in STAGES}
+_runs: dict[str, int] = {}
+_rows = {"loaded": 0, "rejected": 0, "duplicate": 0}
+_last_run_seconds = 0.0
+
+def record_run(result: dict, stages: dict, seconds: float):
+    global _last_run_seconds
+    with _lock:
+        for s, v in stages.items():
+            _stage_seconds[s] += v["seconds"]
+            _stage_rows[s] += v["rows"]
+        _runs[result["status"]] = _runs.get(result["status"], 0) + 1
+        _rows["loaded"] += result["loaded_rows"]
+        _rows["rejected"] += result["rejected_rows"]
+        _rows["duplicate"] += result["duplicate_rows"]
+        _last_run_seconds = seconds
+
+def render_prometheus() -> str:
+    with _lock:
+        lines = [
+            "# HELP price_etl_stage_seconds_total Time spent in each ETL stage.",
+            "# TYPE price_etl_stage_seconds_total counter",
+            *(f'price_etl_stage_seconds_total{{stage="{s}"}} {_stage_seconds[s]:.6f}' for s in STAGES),
+            "# HELP price_etl_stage_rows_total Rows handled by each ETL stage.",
+            "# TYPE price_etl_stage_rows_total counter",
+            *(f'price_etl_stage_rows_total{{stage="{s}"}} {_stage_rows[s]}' for s in STAGES),
+            "# HELP price_etl_runs_total ETL runs by final status.",
+            "# TYPE price_etl_runs_total counter",
+            *(f'price_etl_runs_total{{status="{k}"}} {v}' for k, v in sorted(_runs.items())),
+            "# HELP price_etl_rows_total Source rows by outcome.",
+            "# TYPE price_etl_rows_total counter",
+            *(f'price_etl_rows_total{{outcome="{k}"}} {v}' for k, v in _rows.items()),
+            "# HELP price_etl_last_run_seconds Wall time of the most recent ETL run.",
+            "# TYPE price_etl_last_run_seconds gauge",
+            f"price_etl_last_run_seconds {_last_run_seconds:.6f}",
+        ]
+    return "\n".join(lines) + "\n"
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+def profiler_available(kind: str) -> bool:
+    return kind == "cprofile" or importlib.util.find_spec(kind) is not None
+
+def start_profile(kind: str):
+    if kind == "cprofile":
+        import cProfile
+        prof = cProfile.Profile()
+        prof.enable()
+        return prof
+    if kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ValueError("pyinstrument is not installed")
+        prof = Profiler()
+        prof.start()
+        return prof
+    raise ValueError(f"Unknown profiler: {kind}")
+
+def save_profile(prof, run_id: int) -> str:
+    # cProfile -> pstats dump (snakeviz / python -m pstats); pyinstrument -> HTML report
+    out_dir = os.path.join(settings.storage_dir, "profiles")
+    os.makedirs(out_dir, exist_ok=True)
+    if hasattr(prof, "dump_stats"):
+        prof.disable()
+        path = os.path.join(out_dir, f"run-{run_id}.prof")
+        prof.dump_stats(path)
+    else:
+        prof.stop()
+        path = os.path.join(out_dir, f"run-{run_id}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(prof.output_html())
+    return path
@@ -0,0 +1,432 @@
+"""Versioned schema migrations, applied by a separate command instead of on API startup.
+
+    python -m app.migrate            # upgrade to the latest version
+    python -m app.migrate --status   # print the current / latest version and what is pending
+
+Applied versions are recorded in schema_migrations; each migration runs in its own
+transaction together with its version row (Postgres serialises concurrent migrators with
+an advisory lock). New migrations are appended to MIGRATIONS and never edited once shipped.
+
+Version 1 is the schema the API created before migrations existed, written out here
+rather than taken from models.py; every later change is an explicit ALTER / backfill.
+Each step checks what is already there, so a database created by a later create_all
+(all columns present) passes through unchanged.
+"""
+import argparse
+from datetime import datetime
+from sqlalchemy import (
+    JSON, Column, DateTime, ForeignKey, Index, Integer, MetaData, Numeric, String, Table,
+    UniqueConstraint, column, inspect, select, table, text, update,
+)
+from sqlalchemy.engine import Connection, Engine
+from .db import Base, engine as default_engine
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime(timezone=False), nullable=False),
+)
+
+# the schema before versioned migrations (what the old startup create_all built); frozen
+_v1 = MetaData()
+Table(
+    "vendors", _v1,
+    Column("id", String, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("default_currency", String, nullable=False),
+)
+Table(
+    "products", _v1,
+    Column("id", String, primary_key=True),
+    Column("canonical_name", String, nullable=False),
+    Column("category", String, nullable=False),
+)
+Table(
+    "product_aliases", _v1,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("vendor_id", String, ForeignKey("vendors.id"), nullable=False),
+    Column("vendor_sku", String, nullable=False),
+    Column("product_id", String, ForeignKey("products.id"), nullable=False),
+    Column("vendor_name_raw", String, nullable=True),
+    UniqueConstraint("vendor_id", "vendor_sku", name="uq_alias_vendor_sku"),
+    Index("ix_alias_vendor_sku", "vendor_id", "vendor_sku"),
+)
+Table(
+    "fx_rates", _v1,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("fx_date", DateTime(timezone=False), nullable=False),
+    Column("base_currency", String, nullable=False),
+    Column("quote_currency", String, nullable=False),
+    Column("rate", Numeric(18, 8), nullable=False),
+    UniqueConstraint("fx_date", "base_currency", "quote_currency", name="uq_fx"),
+    Index("ix_fx_lookup", "fx_date", "base_currency", "quote_currency"),
+)
+Table(
+    "raw_ingestions", _v1,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("vendor_id", String, ForeignKey("vendors.id"), nullable=False),
+    Column("file_name", String, nullable=False),
+    Column("stored_path", String, nullable=False),
+    Column("ingested_at", DateTime(timezone=False), nullable=False),
+    Column("status", String, nullable=False),
+    Column("message", String, nullable=True),
+)
+Table(
+    "prices", _v1,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("product_id", String, ForeignKey("products.id"), nullable=False),
+    Column("vendor_id", String, ForeignKey("vendors.id"), nullable=False),
+    Column("observed_at", DateTime(timezone=False), nullable=False),
+    Column("currency", String, nullable=False),
+    Column("price", Numeric(18, 4), nullable=False),
+    Column("price_aed", Numeric(18, 4), nullable=False),
+    Column("source_ingestion_id", Integer, ForeignKey("raw_ingestions.id"), nullable=False),
+    Index("ix_prices_product_time", "product_id", "observed_at"),
+    Index("ix_prices_vendor_time", "vendor_id", "observed_at"),
+)
+Table(
+    "rejections", _v1,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("ingestion_id", Integer, ForeignKey("raw_ingestions.id"), nullable=False),
+    Column("row_number", Integer, nullable=False),
+    Column("reason", String, nullable=False),
+    Column("raw_row", JSON, nullable=False),
+    Column("created_at", DateTime(timezone=False), nullable=False),
+)
+Table(
+    "etl_runs", _v1,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("started_at", DateTime(timezone=False), nullable=False),
+    Column("finished_at", DateTime(timezone=False), nullable=True),
+    Column("status", String, nullable=False),
+    Column("processed_ingestions", Integer, nullable=False),
+    Column("loaded_rows", Integer, nullable=False),
+    Column("rejected_rows", Integer, nullable=False),
+)
+
+def _baseline(conn: Connection):
+    _v1.create_all(conn, checkfirst=True)
+
+def _columns(conn: Connection, table_name: str) -> set[str]:
+    return {c["name"] for c in inspect(conn).get_columns(table_name)}
+
+def _add_column(conn: Connection, table_name: str, column_name: str, ddl_type: str) -> bool:
+    # no-op (False) when the table already has the column
+    if column_name in _columns(conn, table_name):
+        return False
+    quoted = conn.dialect.identifier_preparer.quote(column_name)
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {quoted} {ddl_type}"))
+    return True
+
+def _create_index(conn: Connection, name: str, table_name: str, columns: str, unique: bool = False):
+    conn.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table_name} ({columns})"))
+
+def _add_unique(conn: Connection, table_name: str, name: str, columns: str):
+    # a named constraint on Postgres; SQLite cannot add constraints, a unique index does the same job there
+    insp = inspect(conn)
+    existing = {c["name"] for c in insp.get_unique_constraints(table_name)} | {i["name"] for i in insp.get_indexes(table_name)}
+    if name in existing:
+        return
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"ALTER TABLE {table_name} ADD CONSTRAINT {name} UNIQUE ({columns})"))
+    else:
+        _create_index(conn, name, table_name, columns, unique=True)
+
+def _set_not_null(conn: Connection, table_name: str, column_name: str):
+    # SQLite cannot alter a column; the models always supply a value there
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} SET NOT NULL"))
+
+def _create_table(conn: Connection, name: str) -> bool:
+    # tables new in a migration come from models.py; False when it already exists
+    from . import models  # noqa: F401  (registers the tables on Base.metadata)
+    if inspect(conn).has_table(name):
+        return False
+    Base.metadata.tables[name].create(conn)
+    return True
+
+def _ingestion_hash(conn: Connection):
+    # uploads are deduplicated per vendor on their SHA-256; older ingestions have none
+    _add_column(conn, "raw_ingestions", "content_sha256", "VARCHAR")
+    _add_unique(conn, "raw_ingestions", "uq_ingestion_vendor_sha", "vendor_id, content_sha256")
+
+def _ingestion_checkpoints(conn: Connection):
+    # per-ingestion checkpoint and row counts; counts of processed ingestions come from what they wrote
+    _add_column(conn, "raw_ingestions", "checkpoint_row", "INTEGER NOT NULL DEFAULT 0")
+    if _add_column(conn, "raw_ingestions", "loaded_rows", "INTEGER NOT NULL DEFAULT 0"):
+        conn.execute(text(
+            "UPDATE raw_ingestions SET loaded_rows = "
+            "(SELECT count(*) FROM prices WHERE prices.source_ingestion_id = raw_ingestions.id)"
+        ))
+    if _add_column(conn, "raw_ingestions", "rejected_rows", "INTEGER NOT NULL DEFAULT 0"):
+        conn.execute(text(
+            "UPDATE raw_ingestions SET rejected_rows = "
+            "(SELECT count(*) FROM rejections WHERE rejections.ingestion_id = raw_ingestions.id)"
+        ))
+
+def _price_natural_key(conn: Connection):
+    # prices unique on (product_id, vendor_id, observed_at). Repeats loaded before
+    # the constraint are dropped, keeping the first stored row (the default `skip` policy),
+    # and are counted as the ingestion's duplicate_rows instead of loaded_rows.
+    _add_column(conn, "etl_runs", "duplicate_rows", "INTEGER NOT NULL DEFAULT 0")
+    repeat = (
+        "EXISTS (SELECT 1 FROM prices q WHERE q.product_id = p.product_id AND q.vendor_id = p.vendor_id "
+        "AND q.observed_at = p.observed_at AND q.id < p.id)"
+    )
+    if _add_column(conn, "raw_ingestions", "duplicate_rows", "INTEGER NOT NULL DEFAULT 0"):
+        conn.execute(text(
+            "UPDATE raw_ingestions SET duplicate_rows = (SELECT count(*) FROM prices p "
+            f"WHERE p.source_ingestion_id = raw_ingestions.id AND {repeat})"
+        ))
+        conn.execute(text("UPDATE raw_ingestions SET loaded_rows = loaded_rows - duplicate_rows"))
+    conn.execute(text(f"DELETE FROM prices WHERE id IN (SELECT p.id FROM prices p WHERE {repeat})"))
+    _add_unique(conn, "prices", "uq_price_natural_key", "product_id, vendor_id, observed_at")
+
+def _latest_prices(conn: Connection):
+    # newest price per (product, vendor); same ordering as projections.rebuild_latest_prices
+    if not _create_table(conn, "latest_prices"):
+        return
+    conn.execute(text("""
+        INSERT INTO latest_prices (product_id, vendor_id, observed_at, currency, price, price_aed, source_ingestion_id)
+        SELECT product_id, vendor_id, observed_at, currency, price, price_aed, source_ingestion_id
+        FROM (
+            SELECT p.*, row_number() OVER (
+                PARTITION BY product_id, vendor_id
+                ORDER BY observed_at DESC, source_ingestion_id DESC, price_aed ASC, id ASC
+            ) AS rn
+            FROM prices p
+        ) ranked
+        WHERE rn = 1
+    """))
+
+def _partition_prices(conn: Connection):
+    # rebuilds an unpartitioned prices table as PARTITION BY RANGE (observed_at), one partition per month
+    from .models import PRICES_PARTITIONED
+    from .partitions import partition_name, _next_month
+    if not PRICES_PARTITIONED or conn.dialect.name != "postgresql":
+        return
+    if conn.execute(text("SELECT relkind FROM pg_class WHERE relname = 'prices'")).scalar() == "p":
+        return
+    # the new table reuses every name the old one holds
+    conn.execute(text("ALTER TABLE prices RENAME TO prices_unpartitioned"))
+    for index in conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'prices_unpartitioned'"
+    )).scalars().all():
+        conn.execute(text(f"ALTER INDEX {index} RENAME TO {index}_unpartitioned"))
+    conn.execute(text("ALTER SEQUENCE prices_id_seq RENAME TO prices_unpartitioned_id_seq"))
+    Base.metadata.tables["prices"].create(conn)
+    months = conn.execute(text(
+        "SELECT DISTINCT CAST(date_trunc('month', observed_at) AS DATE) FROM prices_unpartitioned"
+    )).scalars().all()
+    for month in months:
+        conn.execute(text(
+            f"CREATE TABLE {partition_name(month)} PARTITION OF prices "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+        ))
+    cols = "id, product_id, vendor_id, observed_at, currency, price, price_aed, source_ingestion_id"
+    conn.execute(text(f"INSERT INTO prices ({cols}) SELECT {cols} FROM prices_unpartitioned"))
+    conn.execute(text(
+        "SELECT setval(pg_get_serial_sequence('prices', 'id'), coalesce(max(id), 0) + 1, false) FROM prices"
+    ))
+    conn.execute(text("DROP TABLE prices_unpartitioned"))
+
+def _daily_rollups(conn: Connection):
+    # monthly price partitions (Postgres, PRICES_PARTITIONED) and price_daily_rollups,
+    # backfilled the way projections.rebuild_daily_rollups computes them
+    _partition_prices(conn)
+    if not _create_table(conn, "price_daily_rollups"):
+        return
+    day = "date(observed_at)" if conn.dialect.name == "sqlite" else "CAST(observed_at AS DATE)"
+    conn.execute(text(f"""
+        INSERT INTO price_daily_rollups (product_id, vendor_id, day, min_aed, max_aed, close_aed, close_at, samples)
+        SELECT product_id, vendor_id, day, min(price_aed), max(price_aed), max(close_aed), max(observed_at), count(*)
+        FROM (
+            SELECT product_id, vendor_id, {day} AS day, price_aed, observed_at,
+                   first_value(price_aed) OVER (
+                       PARTITION BY product_id, vendor_id, {day}
+                       ORDER BY observed_at DESC, source_ingestion_id DESC, id DESC
+                   ) AS close_aed
+            FROM prices
+        ) ranked
+        GROUP BY product_id, vendor_id, day
+    """))
+
+def _run_stages(conn: Connection):
+    # per-stage timings and the optional profile of a run
+    _add_column(conn, "etl_runs", "profile_path", "VARCHAR")
+    _create_table(conn, "etl_run_stages")
+
+def _run_queue(conn: Connection):
+    # etl_runs doubles as the job queue; earlier runs count as queued when they started
+    for name in ("queued_at", "not_before"):
+        if _add_column(conn, "etl_runs", name, "TIMESTAMP"):
+            conn.execute(text(f"UPDATE etl_runs SET {name} = started_at"))
+            _set_not_null(conn, "etl_runs", name)
+    _add_column(conn, "etl_runs", "trigger", "VARCHAR NOT NULL DEFAULT 'api'")
+    for name in ("workers", "mode", "profile", "message"):
+        _add_column(conn, "etl_runs", name, "INTEGER" if name == "workers" else "VARCHAR")
+    _add_column(conn, "etl_runs", "failed_ingestions", "INTEGER NOT NULL DEFAULT 0")
+    _create_index(conn, "ix_etl_runs_status", "etl_runs", "status")
+
+# the feeds the API had hard-coded parsers for before feed specs (same as seed.py at the time)
+_BUILTIN_FEEDS = {
+    "V-A": ("vendor_a", {
+        "format": "csv",
+        "fields": {"vendor_sku": "sku", "vendor_name_raw": "name", "price": "price", "currency": "currency", "observed_at": "date"},
+    }),
+    "V-B": ("vendor_b", {
+        "format": "json",
+        "items": "items",
+        "fields": {"vendor_sku": "partNumber", "vendor_name_raw": "title", "price": "pricing.amount", "currency": "pricing.ccy", "observed_at": "$.asOf"},
+    }),
+    "V-C": ("vendor_c", {
+        "format": "csv",
+        "fields": {"vendor_sku": "vendor_code", "vendor_name_raw": "desc", "price": "unit_price", "currency": "ccy", "observed_at": "as_of"},
+    }),
+}
+
+def _vendor_feeds(conn: Connection):
+    # feeds are described as data; the three built-in vendors get the specs of their old parsers
+    _add_column(conn, "vendors", "feed_key", "VARCHAR")
+    _add_column(conn, "vendors", "feed_spec", "JSON")
+    _create_index(conn, "ix_vendors_feed_key", "vendors", "feed_key", unique=True)
+    vendors = table("vendors", column("id"), column("feed_key"), column("feed_spec", JSON))
+    for vendor_id, (feed_key, spec) in _BUILTIN_FEEDS.items():
+        conn.execute(
+            update(vendors)
+            .where(vendors.c.id == vendor_id, vendors.c.feed_key.is_(None))
+            .values(feed_key=feed_key, feed_spec=spec)
+        )
+
+# rejections.reason strings before RejectReason codes (FX errors were "fx_error:<message>")
+_REASON_CODES = {
+    "missing_vendor_sku": 1, "non_positive_price": 2, "missing_currency": 3, "unknown_product_alias": 4,
+}
+
+def _rejection_codes(conn: Connection):
+    # reason strings become RejectReason codes plus a detail column, and every
+    # ingestion gets per-reason counts (all earlier rejections were kept, so all are sampled)
+    if _add_column(conn, "rejections", "reason_code", "SMALLINT NOT NULL DEFAULT 0"):
+        _add_column(conn, "rejections", "detail", "VARCHAR")
+        cases = " ".join(f"WHEN '{reason}' THEN {code}" for reason, code in _REASON_CODES.items())
+        known = ", ".join(f"'{reason}'" for reason in _REASON_CODES)
+        conn.execute(text(f"UPDATE rejections SET reason_code = CASE reason {cases} ELSE 5 END"))
+        # the FX error message (or any other free-text reason) moves to detail
+        conn.execute(text(
+            "UPDATE rejections SET detail = CASE WHEN reason LIKE 'fx_error:%' "
+            f"THEN substr(reason, length('fx_error:') + 1) ELSE reason END WHERE reason NOT IN ({known})"
+        ))
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("ALTER TABLE rejections ALTER COLUMN reason_code DROP DEFAULT"))
+    if "reason" in _columns(conn, "rejections"):
+        conn.execute(text("ALTER TABLE rejections DROP COLUMN reason"))
+    _create_index(conn, "ix_rejections_ingestion_reason", "rejections", "ingestion_id, reason_code")
+    if _create_table(conn, "rejection_summaries"):
+        conn.execute(text("""
+            INSERT INTO rejection_summaries (ingestion_id, reason_code, rejected_rows, sampled_rows, first_row, last_row)
+            SELECT ingestion_id, reason_code, count(*), count(*), min(row_number), max(row_number)
+            FROM rejections GROUP BY ingestion_id, reason_code
+        """))
+
+def _price_changes(conn: Connection):
+    _add_column(conn, "latest_prices", "delisted_at", "TIMESTAMP")
+    _create_table(conn, "price_changes")
+
+def _alias_matching(conn: Connection):
+    for table_name in ("products", "product_aliases"):
+        _add_column(conn, table_name, "updated_at", "TIMESTAMP")
+        _create_index(conn, f"ix_{table_name}_updated_at", table_name, "updated_at")
+    _create_table(conn, "alias_candidates")
+
+def _leases(conn: Connection):
+    # rows left RUNNING before leases existed can be reclaimed straight away
+    for table_name in ("etl_runs", "raw_ingestions"):
+        if _add_column(conn, table_name, "lease_until", "TIMESTAMP"):
+            conn.execute(text(f"UPDATE {table_name} SET lease_until = :now WHERE status = 'RUNNING'"), {"now": datetime.utcnow()})
+
+def _rollup_sums(conn: Connection):
+    # also fills the rows version 6 backfilled into a table that already had the column;
+    # days whose raw prices retention already dropped keep a NULL sum
+    _add_column(conn, "price_daily_rollups", "sum_aed", "NUMERIC(18, 4)")
+    day = "date(p.observed_at)" if conn.dialect.name == "sqlite" else "CAST(p.observed_at AS DATE)"
+    conn.execute(text(f"""
+        UPDATE price_daily_rollups SET sum_aed = (
+            SELECT sum(p.price_aed) FROM prices p
+            WHERE p.product_id = price_daily_rollups.product_id
+              AND p.vendor_id = price_daily_rollups.vendor_id
+              AND {day} = price_daily_rollups.day
+        )
+        WHERE sum_aed IS NULL
+    """))
+
+# (version, description, upgrade(conn))
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "ingestion content hash", _ingestion_hash),
+    (3, "ingestion checkpoints and row counts", _ingestion_checkpoints),
+    (4, "price natural key", _price_natural_key),
+    (5, "latest prices projection", _latest_prices),
+    (6, "price partitions and daily rollups", _daily_rollups),
+    (7, "run stage timings", _run_stages),
+    (8, "run queue", _run_queue),
+    (9, "vendor feed specs", _vendor_feeds),
+    (10, "rejection reason codes and summaries", _rejection_codes),
+    (11, "price change feed", _price_changes),
+    (12, "alias matching", _alias_matching),
+    (13, "run and ingestion leases", _leases),
+    (14, "daily rollup sums", _rollup_sums),
+]
+
+def head() -> int:
+    return MIGRATIONS[-1][0]
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table("schema_migrations"):
+        return 0
+    versions = conn.execute(select(schema_migrations.c.version)).scalars().all()
+    return max(versions, default=0)
+
+def status(engine: Engine | None = None) -> dict:
+    with (engine or default_engine).connect() as conn:
+        current = current_version(conn)
+    return {
+        "version": current,
+        "head": head(),
+        "pending": [{"version": v, "description": d} for v, d, _ in MIGRATIONS if v > current],
+    }
+
+def migrate(engine: Engine | None = None, target: int | None = None) -> list[int]:
+    """Applies pending migrations up to `target` (default: all); returns the versions applied."""
+    engine = engine or default_engine
+    target = head() if target is None else target
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        if version > target:
+            break
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('price_etl.schema_migrations'))"))
+                # DDL and backfills must not hit an API-sized DB_STATEMENT_TIMEOUT_MS
+                conn.execute(text("SET LOCAL statement_timeout = 0"))
+            schema_migrations.create(conn, checkfirst=True)
+            if current_version(conn) >= version:
+                continue
+            upgrade(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow(),
+            ))
+        applied.append(version)
+    return applied
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m app.migrate", description="Apply schema migrations")
+    p.add_argument("--to", type=int, help="stop at this version (default: latest)")
+    p.add_argument("--status", action="store_true", help="show the current version and pending migrations")
+    args = p.parse_args()
+    if args.status:
+        print(status())
+    else:
+        done = migrate(target=args.to)
+        print(f"applied {', '.join(map(str, done))}" if done else "schema up to date", f"(version {status()['version']})")
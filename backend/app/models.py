@@ -1,19 +1,33 @@
-from sqlalchemy import String, Integer, DateTime, Boolean, ForeignKey, Numeric, JSON, UniqueConstraint, Index
+from enum import IntEnum
+from sqlalchemy import String, Integer, SmallInteger, BigInteger, Float, Date, DateTime, Boolean, ForeignKey, Numeric, JSON, UniqueConstraint, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime, date
 from .db import Base
+from .config import settings
+
+# range partitioning is Postgres-only; other backends keep a plain prices table
+PRICES_PARTITIONED = settings.prices_partitioned and settings.database_url.startswith("postgresql")
 
 class Vendor(Base):
     __tablename__ = "vendors"
     id: Mapped[str] = mapped_column(String, primary_key=True)  # e.g. V-A
     name: Mapped[str] = mapped_column(String, nullable=False)
     default_currency: Mapped[str] = mapped_column(String, nullable=False)
+    # /ingest/{feed_key} route name and the transform.feeds.FeedSpec describing the file format
+    feed_key: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=True)
+    feed_spec: Mapped[dict] = mapped_column(JSON, nullable=True)
 
 class Product(Base):
     __tablename__ = "products"
     id: Mapped[str] = mapped_column(String, primary_key=True)  # e.g. P-RTX4070
     canonical_name: Mapped[str] = mapped_column(String, nullable=False)
     category: Mapped[str] = mapped_column(String, nullable=False)
+    # set by every catalog write; the alias matcher's index syncs rows changed since its last look
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
+
+    __table_args__ = (
+        Index("ix_products_updated_at", "updated_at"),
+    )
 
 class ProductAlias(Base):
     __tablename__ = "product_aliases"
@@ -22,10 +36,33 @@ class ProductAlias(Base):
     vendor_sku: Mapped[str] = mapped_column(String, nullable=False)
     product_id: Mapped[str] = mapped_column(String, ForeignKey("products.id"), nullable=False)
     vendor_name_raw: Mapped[str] = mapped_column(String, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
 
     __table_args__ = (
         UniqueConstraint("vendor_id", "vendor_sku", name="uq_alias_vendor_sku"),
         Index("ix_alias_vendor_sku", "vendor_id", "vendor_sku"),
+        Index("ix_product_aliases_updated_at", "updated_at"),
+    )
+
+class AliasCandidate(Base):
+    # unknown vendor SKUs the ETL matched by name (see matching.py): PROPOSED for review,
+    # APPLIED when the ETL created an alias from it on its own, ACCEPTED once a reviewer
+    # created or confirmed the alias, REJECTED to stop proposing it
+    __tablename__ = "alias_candidates"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    vendor_id: Mapped[str] = mapped_column(String, ForeignKey("vendors.id"), nullable=False)
+    vendor_sku: Mapped[str] = mapped_column(String, nullable=False)
+    vendor_name_raw: Mapped[str] = mapped_column(String, nullable=True)
+    product_id: Mapped[str] = mapped_column(String, ForeignKey("products.id"), nullable=True)
+    score: Mapped[float] = mapped_column(Float, nullable=False)
+    status: Mapped[str] = mapped_column(String, nullable=False)  # PROPOSED, APPLIED, ACCEPTED, REJECTED
+    seen_rows: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_ingestion_id: Mapped[int] = mapped_column(Integer, ForeignKey("raw_ingestions.id"), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("vendor_id", "vendor_sku", name="uq_candidate_vendor_sku"),
+        Index("ix_alias_candidates_status", "status", "score"),
     )
 
 class FXRate(Base):
@@ -49,40 +86,157 @@ class RawIngestion(Base):
     file_name: Mapped[str] = mapped_column(String, nullable=False)
     stored_path: Mapped[str] = mapped_column(String, nullable=False)
     ingested_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), default=datetime.utcnow, nullable=False)
-    status: Mapped[str] = mapped_column(String, default="PENDING", nullable=False)  # PENDING, PROCESSED, FAILED
+    status: Mapped[str] = mapped_column(String, default="PENDING", nullable=False)  # PENDING, RUNNING, PROCESSED, FAILED
     message: Mapped[str] = mapped_column(String, nullable=True)
+    content_sha256: Mapped[str] = mapped_column(String, nullable=True)
+    # last source row number whose prices/rejections are committed; a rerun resumes after it
+    checkpoint_row: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    loaded_rows: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    rejected_rows: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    duplicate_rows: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # while RUNNING: the claiming worker renews it at each checkpoint; once it lapses the ingestion can be reclaimed
+    lease_until: Mapped[datetime] = mapped_column(DateTime(timezone=False), nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("vendor_id", "content_sha256", name="uq_ingestion_vendor_sha"),
+    )
 
 class Price(Base):
     __tablename__ = "prices"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     product_id: Mapped[str] = mapped_column(String, ForeignKey("products.id"), nullable=False)
     vendor_id: Mapped[str] = mapped_column(String, ForeignKey("vendors.id"), nullable=False)
-    observed_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), nullable=False)
+    # partitioned tables need the partition key in the primary key
+    observed_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), nullable=False, primary_key=PRICES_PARTITIONED)
     currency: Mapped[str] = mapped_column(String, nullable=False)
     price: Mapped[float] = mapped_column(Numeric(18, 4), nullable=False)
     price_aed: Mapped[float] = mapped_column(Numeric(18, 4), nullable=False)
     source_ingestion_id: Mapped[int] = mapped_column(Integer, ForeignKey("raw_ingestions.id"), nullable=False)
 
     __table_args__ = (
+        # natural key; re-delivered observations resolve via settings.price_conflict_policy
+        UniqueConstraint("product_id", "vendor_id", "observed_at", name="uq_price_natural_key"),
         Index("ix_prices_product_time", "product_id", "observed_at"),
         Index("ix_prices_vendor_time", "vendor_id", "observed_at"),
+        # monthly partitions (prices_pYYYYMM) are created on demand by partitions.ensure_price_partitions
+        {"postgresql_partition_by": "RANGE (observed_at)"} if PRICES_PARTITIONED else {},
     )
 
+class RejectReason(IntEnum):
+    # stored as rejections.reason_code / rejection_summaries.reason_code: append only, never renumber
+    MISSING_VENDOR_SKU = 1
+    NON_POSITIVE_PRICE = 2
+    MISSING_CURRENCY = 3
+    UNKNOWN_PRODUCT_ALIAS = 4
+    FX_ERROR = 5
+
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
 class Rejection(Base):
+    # a sample of rejected rows: at most REJECTION_SAMPLE_CAP per reason per ingestion
     __tablename__ = "rejections"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     ingestion_id: Mapped[int] = mapped_column(Integer, ForeignKey("raw_ingestions.id"), nullable=False)
     row_number: Mapped[int] = mapped_column(Integer, nullable=False)
-    reason: Mapped[str] = mapped_column(String, nullable=False)
+    reason_code: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    detail: Mapped[str] = mapped_column(String, nullable=True)  # e.g. the FX error
     raw_row: Mapped[dict] = mapped_column(JSON, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        Index("ix_rejections_ingestion_reason", "ingestion_id", "reason_code"),
+    )
+
+class RejectionSummary(Base):
+    # every rejected row is counted here, sampled or not
+    __tablename__ = "rejection_summaries"
+    ingestion_id: Mapped[int] = mapped_column(Integer, ForeignKey("raw_ingestions.id"), primary_key=True)
+    reason_code: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    rejected_rows: Mapped[int] = mapped_column(Integer, nullable=False)
+    sampled_rows: Mapped[int] = mapped_column(Integer, nullable=False)
+    first_row: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_row: Mapped[int] = mapped_column(Integer, nullable=False)
+
 class Run(Base):
+    # also the ETL job queue: jobs.enqueue_run inserts QUEUED rows, workers claim them
     __tablename__ = "etl_runs"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    queued_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), default=datetime.utcnow, nullable=False)
+    not_before: Mapped[datetime] = mapped_column(DateTime(timezone=False), default=datetime.utcnow, nullable=False)
+    trigger: Mapped[str] = mapped_column(String, default="api", nullable=False)  # api, auto, cli
+    workers: Mapped[int] = mapped_column(Integer, nullable=True)
+    mode: Mapped[str] = mapped_column(String, nullable=True)
+    profile: Mapped[str] = mapped_column(String, nullable=True)
     started_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), default=datetime.utcnow, nullable=False)
     finished_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), nullable=True)
-    status: Mapped[str] = mapped_column(String, default="RUNNING", nullable=False)  # RUNNING, DONE, PARTIAL
+    status: Mapped[str] = mapped_column(String, default="RUNNING", nullable=False, index=True)  # QUEUED, RUNNING, DONE, PARTIAL, FAILED
+    message: Mapped[str] = mapped_column(String, nullable=True)
+    failed_ingestions: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     processed_ingestions: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     loaded_rows: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     rejected_rows: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    duplicate_rows: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    profile_path: Mapped[str] = mapped_column(String, nullable=True)
+    # while RUNNING: renewed by the executing worker's heartbeat; once it lapses another worker reclaims the run
+    lease_until: Mapped[datetime] = mapped_column(DateTime(timezone=False), nullable=True)
+
+class RunStage(Base):
+    # per-ingestion stage timings of a run (see metrics.STAGES)
+    __tablename__ = "etl_run_stages"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    run_id: Mapped[int] = mapped_column(Integer, ForeignKey("etl_runs.id"), nullable=False, index=True)
+    ingestion_id: Mapped[int] = mapped_column(Integer, ForeignKey("raw_ingestions.id"), nullable=False)
+    stage: Mapped[str] = mapped_column(String, nullable=False)
+    seconds: Mapped[float] = mapped_column(Float, nullable=False)
+    rows: Mapped[int] = mapped_column(Integer, nullable=False)
+
+class LatestPrice(Base):
+    # projection of the newest Price per (product, vendor); maintained by the ETL loader
+    __tablename__ = "latest_prices"
+    product_id: Mapped[str] = mapped_column(String, ForeignKey("products.id"), primary_key=True)
+    vendor_id: Mapped[str] = mapped_column(String, ForeignKey("vendors.id"), primary_key=True)
+    observed_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), nullable=False)
+    currency: Mapped[str] = mapped_column(String, nullable=False)
+    price: Mapped[float] = mapped_column(Numeric(18, 4), nullable=False)
+    price_aed: Mapped[float] = mapped_column(Numeric(18, 4), nullable=False)
+    source_ingestion_id: Mapped[int] = mapped_column(Integer, ForeignKey("raw_ingestions.id"), nullable=False)
+    # set when the vendor stops reporting the product (see changes.detect_delistings)
+    delisted_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), nullable=True)
+
+    __table_args__ = (
+        Index("ix_latest_prices_product_aed", "product_id", "price_aed"),
+    )
+
+class PriceChange(Base):
+    # append-only change feed written by the ETL; seq order is commit order (see changes.record_changes)
+    __tablename__ = "price_changes"
+    seq: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String, nullable=False)  # best_price | price_changed | listed | delisted
+    product_id: Mapped[str] = mapped_column(String, ForeignKey("products.id"), nullable=False)
+    vendor_id: Mapped[str] = mapped_column(String, ForeignKey("vendors.id"), nullable=False)
+    previous_vendor_id: Mapped[str] = mapped_column(String, ForeignKey("vendors.id"), nullable=True)  # best_price only
+    price_aed: Mapped[float] = mapped_column(Numeric(18, 4), nullable=True)
+    previous_price_aed: Mapped[float] = mapped_column(Numeric(18, 4), nullable=True)
+    observed_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), nullable=True)
+    ingestion_id: Mapped[int] = mapped_column(Integer, ForeignKey("raw_ingestions.id"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_price_changes_product_seq", "product_id", "seq"),
+    )
+
+class PriceDailyRollup(Base):
+    # per product / vendor / day summary maintained by the ETL; survives raw partition retention
+    __tablename__ = "price_daily_rollups"
+    product_id: Mapped[str] = mapped_column(String, ForeignKey("products.id"), primary_key=True)
+    vendor_id: Mapped[str] = mapped_column(String, ForeignKey("vendors.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    min_aed: Mapped[float] = mapped_column(Numeric(18, 4), nullable=False)
+    max_aed: Mapped[float] = mapped_column(Numeric(18, 4), nullable=False)
+    close_aed: Mapped[float] = mapped_column(Numeric(18, 4), nullable=False)
+    close_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), nullable=False)
+    samples: Mapped[int] = mapped_column(Integer, nullable=False)
+    # for /history averages; NULL on days rolled up before it was kept whose raw prices were already gone
+    sum_aed: Mapped[float | None] = mapped_column(Numeric(18, 4), nullable=True)
@@ -0,0 +1,81 @@
+from datetime import date, datetime
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from .config import settings
+from .models import PRICES_PARTITIONED
+
+# partitions seen committed; skips the catalog lookup for months already loaded
+_known: set[str] = set()
+
+def _month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+def _next_month(d: date) -> date:
+    return date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"prices_p{month.year:04d}{month.month:02d}"
+
+def partitioning_enabled(db: Session) -> bool:
+    return PRICES_PARTITIONED and db.get_bind().dialect.name == "postgresql"
+
+def ensure_price_partitions(db: Session, observed_ats):
+    """Creates the monthly prices partitions a batch needs, the first time a month is loaded."""
+    if not partitioning_enabled(db):
+        return
+    for month in {_month_start(t.date() if isinstance(t, datetime) else t) for t in observed_ats}:
+        name = partition_name(month)
+        if name in _known:
+            continue
+        if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+            # cache only partitions that already existed, never one this (maybe rolled back) transaction creates
+            _known.add(name)
+            continue
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF prices "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+        ))
+
+def list_price_partitions(db: Session) -> list[str]:
+    if not partitioning_enabled(db):
+        return []
+    return list(db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'prices' ORDER BY c.relname"
+    )).scalars())
+
+def apply_retention(db: Session, keep_months: int | None = None, drop: bool | None = None) -> dict:
+    """Detaches (or drops) raw price partitions older than `keep_months` whole months.
+
+    Daily rollups are not touched, so /history day and week buckets survive the raw data.
+    """
+    keep_months = settings.prices_retention_months if keep_months is None else keep_months
+    drop = settings.prices_retention_drop if drop is None else drop
+    if keep_months <= 0 or not partitioning_enabled(db):
+        return {"detached": [], "dropped": []}
+
+    cutoff = _month_start(date.today())
+    for _ in range(keep_months - 1):
+        cutoff = date(cutoff.year - (cutoff.month == 1), (cutoff.month - 2) % 12 + 1, 1)
+    cutoff_name = partition_name(cutoff)
+
+    detached, dropped = [], []
+    for name in list_price_partitions(db):
+        if name >= cutoff_name:
+            continue
+        db.execute(text(f"ALTER TABLE prices DETACH PARTITION {name}"))
+        detached.append(name)
+        if drop:
+            db.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+        _known.discard(name)
+    db.commit()
+    return {"detached": detached, "dropped": dropped}
+
+if __name__ == "__main__":
+    # python -m app.partitions  -> apply PRICES_RETENTION_MONTHS / PRICES_RETENTION_DROP
+    from .db import SessionLocal
+    with SessionLocal() as session:
+        print(apply_retention(session))
@@ -0,0 +1,206 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import select, delete, func, insert, case, cast, Date
+from sqlalchemy.orm import Session
+from .models import Price, LatestPrice, PriceDailyRollup
+
+LATEST_COLUMNS = ("product_id", "vendor_id", "observed_at", "currency", "price", "price_aed", "source_ingestion_id")
+
+def newer(a: dict, b: dict) -> bool:
+    # newest observed_at wins; ties go to the later ingestion, then the lower AED price
+    return (a["observed_at"], a["source_ingestion_id"], -float(a["price_aed"])) > \
+        (b["observed_at"], b["source_ingestion_id"], -float(b["price_aed"]))
+
+def upsert_insert(db: Session, model):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"{model.__tablename__} upsert not supported on {dialect}")
+    return dialect_insert(model)
+
+def newest_per_key(rows: list[dict]) -> dict[tuple[str, str], dict]:
+    # (product_id, vendor_id) -> the row latest_prices would keep
+    best: dict[tuple[str, str], dict] = {}
+    for r in rows:
+        key = (r["product_id"], r["vendor_id"])
+        cur = best.get(key)
+        if cur is None or newer(r, cur):
+            best[key] = r
+    return best
+
+def upsert_latest_prices(db: Session, rows: list[dict]):
+    """Folds a batch of price rows just written to prices into latest_prices.
+
+    A written row is what prices now holds for its (product, vendor, observed_at), so it also
+    replaces a latest price at the same observed_at, whatever the conflict policy let through.
+    """
+    best = newest_per_key(rows)
+    if not best:
+        return
+
+    stmt = upsert_insert(db, LatestPrice)
+    new = stmt.excluded
+    old = LatestPrice.__table__.c
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["product_id", "vendor_id"],
+        # a fresh price re-lists a delisted vendor; a rewrite of the point it was delisted at does not
+        set_={
+            **{c: new[c] for c in LATEST_COLUMNS[2:]},
+            "delisted_at": case((new.observed_at > old.observed_at, None), else_=old.delisted_at),
+        },
+        where=new.observed_at >= old.observed_at,
+    )
+    db.execute(stmt, [{c: r[c] for c in LATEST_COLUMNS} for r in best.values()])
+
+def rebuild_latest_prices(db: Session) -> int:
+    """Recomputes latest_prices from the full prices history (backfills / repairs)."""
+    ranked = select(
+        *(getattr(Price, c) for c in LATEST_COLUMNS),
+        func.row_number().over(
+            partition_by=(Price.product_id, Price.vendor_id),
+            order_by=(
+                Price.observed_at.desc(),
+                Price.source_ingestion_id.desc(),
+                Price.price_aed.asc(),
+                Price.id.asc(),
+            ),
+        ).label("rn"),
+    ).subquery()
+
+    db.execute(delete(LatestPrice))
+    db.execute(insert(LatestPrice).from_select(
+        list(LATEST_COLUMNS),
+        select(*(ranked.c[c] for c in LATEST_COLUMNS)).where(ranked.c.rn == 1),
+    ))
+    db.commit()
+    return db.execute(select(func.count()).select_from(LatestPrice)).scalar_one()
+
+def upsert_daily_rollups(db: Session, rows: list[dict]):
+    """Folds a batch of freshly inserted price rows into price_daily_rollups (min / max / close per day)."""
+    days: dict[tuple, dict] = {}
+    for r in rows:
+        key = (r["product_id"], r["vendor_id"], r["observed_at"].date())
+        aed = float(r["price_aed"])
+        cur = days.get(key)
+        if cur is None:
+            days[key] = {
+                "product_id": key[0], "vendor_id": key[1], "day": key[2],
+                "min_aed": aed, "max_aed": aed, "close_aed": aed, "close_at": r["observed_at"], "samples": 1, "sum_aed": aed,
+            }
+            continue
+        cur["min_aed"] = min(cur["min_aed"], aed)
+        cur["max_aed"] = max(cur["max_aed"], aed)
+        if r["observed_at"] >= cur["close_at"]:
+            cur["close_aed"], cur["close_at"] = aed, r["observed_at"]
+        cur["samples"] += 1
+        cur["sum_aed"] += aed
+    if not days:
+        return
+
+    stmt = upsert_insert(db, PriceDailyRollup)
+    new = stmt.excluded
+    old = PriceDailyRollup.__table__.c
+    # sqlite spells least/greatest as the scalar min/max
+    least, greatest = (func.min, func.max) if db.get_bind().dialect.name == "sqlite" else (func.least, func.greatest)
+    later = new.close_at >= old.close_at
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["product_id", "vendor_id", "day"],
+        set_={
+            "min_aed": least(old.min_aed, new.min_aed),
+            "max_aed": greatest(old.max_aed, new.max_aed),
+            "close_aed": case((later, new.close_aed), else_=old.close_aed),
+            "close_at": case((later, new.close_at), else_=old.close_at),
+            "samples": old.samples + new.samples,
+            "sum_aed": old.sum_aed + new.sum_aed,
+        },
+    )
+    db.execute(stmt, list(days.values()))
+
+def recompute_daily_rollups(db: Session, keys: set[tuple]):
+    """Recomputes the price_daily_rollups rows of these (product_id, vendor_id, day) keys from prices,
+    for days whose points were overwritten (an upsert can only fold new points in)."""
+    if not keys:
+        return
+    days = [k[2] for k in keys]
+    points = db.execute(
+        select(Price.product_id, Price.vendor_id, Price.observed_at, Price.price_aed, Price.source_ingestion_id, Price.id)
+        .where(
+            Price.product_id.in_({k[0] for k in keys}),
+            Price.vendor_id.in_({k[1] for k in keys}),
+            Price.observed_at >= datetime.combine(min(days), time.min),
+            Price.observed_at < datetime.combine(max(days) + timedelta(days=1), time.min),
+        )
+    ).all()
+    rollups: dict[tuple, dict] = {}
+    closes: dict[tuple, tuple] = {}
+    for product_id, vendor_id, observed_at, price_aed, ingestion_id, price_id in points:
+        key = (product_id, vendor_id, observed_at.date())
+        if key not in keys:
+            continue
+        aed = float(price_aed)
+        cur = rollups.get(key)
+        if cur is None:
+            cur = rollups[key] = {
+                "product_id": product_id, "vendor_id": vendor_id, "day": key[2],
+                "min_aed": aed, "max_aed": aed, "samples": 0, "sum_aed": 0.0,
+            }
+        cur["min_aed"] = min(cur["min_aed"], aed)
+        cur["max_aed"] = max(cur["max_aed"], aed)
+        cur["samples"] += 1
+        cur["sum_aed"] += aed
+        # same close as rebuild_daily_rollups: latest observation, then ingestion, then row
+        rank = (observed_at, ingestion_id, price_id)
+        if key not in closes or rank > closes[key]:
+            closes[key] = rank
+            cur["close_aed"], cur["close_at"] = aed, observed_at
+    if not rollups:
+        return
+
+    stmt = upsert_insert(db, PriceDailyRollup)
+    new = stmt.excluded
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["product_id", "vendor_id", "day"],
+        set_={c: new[c] for c in ("min_aed", "max_aed", "close_aed", "close_at", "samples", "sum_aed")},
+    ), list(rollups.values()))
+
+def rebuild_daily_rollups(db: Session) -> int:
+    """Recomputes price_daily_rollups from the raw prices still on hand.
+
+    Days whose raw partitions were dropped by retention are left untouched.
+    """
+    day = (func.date(Price.observed_at) if db.get_bind().dialect.name == "sqlite" else cast(Price.observed_at, Date)).label("day")
+    ranked = select(
+        Price.product_id, Price.vendor_id, day, Price.price_aed, Price.observed_at,
+        func.first_value(Price.price_aed).over(
+            partition_by=(Price.product_id, Price.vendor_id, day),
+            order_by=(Price.observed_at.desc(), Price.source_ingestion_id.desc(), Price.id.desc()),
+        ).label("close_aed"),
+    ).subquery()
+    agg = select(
+        ranked.c.product_id, ranked.c.vendor_id, ranked.c.day,
+        func.min(ranked.c.price_aed), func.max(ranked.c.price_aed),
+        func.max(ranked.c.close_aed), func.max(ranked.c.observed_at), func.count(), func.sum(ranked.c.price_aed),
+    ).group_by(ranked.c.product_id, ranked.c.vendor_id, ranked.c.day)
+
+    days_on_hand = select(ranked.c.product_id, ranked.c.vendor_id, ranked.c.day).distinct().subquery()
+    db.execute(delete(PriceDailyRollup).where(
+        select(days_on_hand.c.day).where(
+            days_on_hand.c.product_id == PriceDailyRollup.product_id,
+            days_on_hand.c.vendor_id == PriceDailyRollup.vendor_id,
+            days_on_hand.c.day == PriceDailyRollup.day,
+        ).exists()
+    ))
+    db.execute(insert(PriceDailyRollup).from_select(
+        ["product_id", "vendor_id", "day", "min_aed", "max_aed", "close_aed", "close_at", "samples", "sum_aed"], agg,
+    ))
+    db.commit()
+    return db.execute(select(func.count()).select_from(PriceDailyRollup)).scalar_one()
+
+if __name__ == "__main__":
+    # python -m app.projections  -> rebuild latest_prices and daily rollups from history
+    from .db import SessionLocal
+    with SessionLocal() as session:
+        print(f"latest_prices rebuilt: {rebuild_latest_prices(session)} rows")
+        print(f"price_daily_rollups rebuilt: {rebuild_daily_rollups(session)} rows")
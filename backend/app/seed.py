@@ -2,17 +2,33 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from .models import Vendor, Product, ProductAlias, FXRate
+from .transform.lookup import invalidate_lookups
+from .response_cache import bump_generation
 
 def seed(db: Session):
     # Vendors
     vendors = [
-        Vendor(id="V-A", name="GulfTech Parts", default_currency="AED"),
-        Vendor(id="V-B", name="US Parts Direct", default_currency="USD"),
-        Vendor(id="V-C", name="EuroComp Store", default_currency="EUR"),
+        Vendor(id="V-A", name="GulfTech Parts", default_currency="AED", feed_key="vendor_a", feed_spec={
+            "format": "csv",
+            "fields": {"vendor_sku": "sku", "vendor_name_raw": "name", "price": "price", "currency": "currency", "observed_at": "date"},
+        }),
+        Vendor(id="V-B", name="US Parts Direct", default_currency="USD", feed_key="vendor_b", feed_spec={
+            "format": "json",
+            "items": "items",
+            "fields": {"vendor_sku": "partNumber", "vendor_name_raw": "title", "price": "pricing.amount", "currency": "pricing.ccy", "observed_at": "$.asOf"},
+        }),
+        Vendor(id="V-C", name="EuroComp Store", default_currency="EUR", feed_key="vendor_c", feed_spec={
+            "format": "csv",
+            "fields": {"vendor_sku": "vendor_code", "vendor_name_raw": "desc", "price": "unit_price", "currency": "ccy", "observed_at": "as_of"},
+        }),
     ]
     for v in vendors:
-        if not db.execute(select(Vendor).where(Vendor.id == v.id)).scalar_one_or_none():
+        existing = db.execute(select(Vendor).where(Vendor.id == v.id)).scalar_one_or_none()
+        if not existing:
             db.add(v)
+        elif existing.feed_spec is None:
+            # vendors created before feed specs were stored as data
+            existing.feed_key, existing.feed_spec = v.feed_key, v.feed_spec
     # IMPORTANT: flush vendors so FK checks for aliases won’t fail
     db.flush()
 
@@ -91,3 +107,5 @@ def seed(db: Session):
             ))
 
     db.commit()
+    invalidate_lookups()
+    bump_generation()
@@ -1,24 +1,85 @@
+import gzip
+import hashlib
 import os
+import tempfile
 from pathlib import Path
+from typing import BinaryIO
 from .config import settings
 
+CHUNK_SIZE = 1 << 20
+GZIP_MAGIC = b"\x1f\x8b"
+
 def ensure_storage_dir() -> str:
     Path(settings.storage_dir).mkdir(parents=True, exist_ok=True)
     return settings.storage_dir
 
-def save_upload_bytes(file_name: str, data: bytes) -> str:
-    storage = ensure_storage_dir()
-    # avoid collisions
-    safe = file_name.replace("/", "_").replace("\\", "_")
-    path = Path(storage) / safe
-    if path.exists():
-        stem, suffix = path.stem, path.suffix
-        i = 1
-        while True:
-            candidate = Path(storage) / f"{stem}_{i}{suffix}"
-            if not candidate.exists():
-                path = candidate
-                break
-            i += 1
-    path.write_bytes(data)
+def content_path(digest: str, file_name: str) -> Path:
+    # content-addressed: identical bytes always land on the same path, so no collision handling
+    suffix = Path(file_name.replace("\\", "/")).suffix.lower()
+    return Path(ensure_storage_dir()) / digest[:2] / f"{digest}{suffix}"
+
+def _place(tmp: str, digest: str, file_name: str) -> str:
+    path = content_path(digest, file_name)
+    path.parent.mkdir(exist_ok=True)
+    os.replace(tmp, path)
     return str(path)
+
+def save_stream(file_name: str, src: BinaryIO) -> tuple[str, str, int]:
+    """Copies `src` to storage in chunks, hashing on the fly. Returns (stored_path, sha256, size).
+
+    Blocking; call from a worker thread when used inside the event loop.
+    """
+    storage = ensure_storage_dir()
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=storage, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := src.read(CHUNK_SIZE):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        if size == 0:
+            raise ValueError("Empty file")
+        path = _place(tmp, digest.hexdigest(), file_name)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return path, digest.hexdigest(), size
+
+def save_gzip_stream(file_name: str, src: BinaryIO) -> tuple[str, str, int]:
+    """Stores a gzip file as received; the ETL reads it through open_stored.
+
+    sha256 and size are of the decompressed content, so a feed dedups the same whether it was
+    sent compressed or not. Decompressing it once here also rejects a corrupt file up front.
+    """
+    storage = ensure_storage_dir()
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=storage, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := src.read(CHUNK_SIZE):
+                out.write(chunk)
+        try:
+            with gzip.open(tmp, "rb") as f:
+                while chunk := f.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+        except (OSError, EOFError) as e:
+            raise ValueError(f"Invalid gzip file {file_name}: {e}") from e
+        if size == 0:
+            raise ValueError("Empty file")
+        path = _place(tmp, digest.hexdigest(), file_name)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return path, digest.hexdigest(), size
+
+def open_stored(path: str, encoding: str = "utf-8", newline: str | None = None):
+    """Opens a stored feed as text, decompressing gzip files (by their magic bytes) on the fly."""
+    with open(path, "rb") as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    if compressed:
+        return gzip.open(path, "rt", encoding=encoding, newline=newline)
+    return open(path, "r", encoding=encoding, newline=newline)
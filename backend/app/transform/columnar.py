@@ -0,0 +1,142 @@
+import csv
+from .types import CanonicalPriceRow
+from .lookup import LookupCache
+from .feeds import DelimitedFeed
+from ..metrics import StageTimer
+from ..models import RejectReason
+from ..storage import open_stored
+
+def iter_column_batches(path: str, feed: DelimitedFeed, batch_size: int, skip_through: int = 0):
+    """Reads a CSV / TSV feed into per-column lists, `batch_size` rows at a time.
+
+    Cleans values exactly like DelimitedFeed.rows and numbers rows the same way (data rows
+    start at 2; blank lines are skipped). Rows numbered <= `skip_through` (an ingestion
+    checkpoint) are skipped without being parsed.
+    """
+    with open_stored(path, encoding=feed.spec.encoding, newline="") as f:
+        reader = csv.reader(f, delimiter=feed.delimiter)
+        header = next(reader, None)
+        if header is None:
+            return
+        idx = feed.indices(header)
+        rownum = 1
+        raw: list[list[str]] = []
+        for row in reader:
+            if not row:
+                continue
+            rownum += 1
+            if rownum <= skip_through:
+                continue
+            raw.append(row)
+            if len(raw) >= batch_size:
+                yield _columns(feed, raw, idx, rownum - len(raw) + 1)
+                raw = []
+        if raw:
+            yield _columns(feed, raw, idx, rownum - len(raw) + 1)
+
+def _column(raw: list[list[str]], i: int) -> list[str]:
+    return [(r[i] if i < len(r) else "") or "" for r in raw]
+
+def _columns(feed: DelimitedFeed, raw: list[list[str]], idx: tuple[int, ...], first_rownum: int) -> dict:
+    sku, name, price, ccy, ts = (_column(raw, i) for i in idx)
+    parse_date = feed.parse_date
+    return {
+        "rownum": list(range(first_rownum, first_rownum + len(raw))),
+        "vendor_sku": [s.strip() for s in sku],
+        "vendor_name_raw": [n.strip() or None for n in name],
+        "price": [float(p or 0) for p in price],
+        "currency": [feed.default_currency] * len(raw) if feed.columns[3] is None else [c.strip().upper() for c in ccy],
+        "observed_at": [parse_date(t) for t in ts],
+    }
+
+def transform_columns(
+    cols: dict,
+    vendor_id: str,
+    ingestion_id: int,
+    lookups: LookupCache,
+    stages: StageTimer | None = None,
+    take_sample=None,
+    matcher=None,
+):
+    """Applies the run_etl validations as whole-column passes.
+
+    The passes are list comprehensions over the column lists, not array operations: what they
+    save over the row path is building a CanonicalPriceRow and probing the caches per row.
+
+    Returns (price_rows, rejections) where rejections are (row_number, reason, detail, raw_row);
+    raw_row is only built when take_sample(reason) allows it (None otherwise). Results match
+    the row-at-a-time path in etl.process_ingestion, including SKUs an AliasMatcher resolves.
+    """
+    stages = stages or StageTimer()
+    skus = cols["vendor_sku"]
+    prices = cols["price"]
+    ccys = cols["currency"]
+    times = cols["observed_at"]
+    n = len(skus)
+
+    with stages.stage("validate", n):
+        reason: list[RejectReason | None] = [
+            RejectReason.MISSING_VENDOR_SKU if not skus[i]
+            else RejectReason.NON_POSITIVE_PRICE if prices[i] <= 0
+            else RejectReason.MISSING_CURRENCY if not ccys[i]
+            else None
+            for i in range(n)
+        ]
+
+    # alias join: one dict per vendor, probed once per row still alive
+    alive = reason.count(None)
+    with stages.stage("alias_resolve", alive):
+        aliases = lookups.alias_map(vendor_id)
+        product_ids = [aliases.get(skus[i]) if reason[i] is None else None for i in range(n)]
+        unknown = [i for i in range(n) if reason[i] is None and not product_ids[i]]
+        if unknown and matcher is not None:
+            # the batch's unknown SKUs are scored together, each distinct one once
+            matched = matcher.resolve([(skus[i], cols["vendor_name_raw"][i]) for i in unknown])
+            for i in unknown:
+                product_ids[i] = matched.get(skus[i])
+        for i in range(n):
+            if reason[i] is None and not product_ids[i]:
+                reason[i] = RejectReason.UNKNOWN_PRODUCT_ALIAS
+
+    alive = reason.count(None)
+    with stages.stage("fx_convert", alive):
+        # FX join: through the run's LookupCache, which resolves each distinct (currency, day) once
+        live = [i for i in range(n) if reason[i] is None]
+        details: dict[int, str] = {}
+        converted, errors = lookups.convert_batch(
+            [prices[i] for i in live], [ccys[i] for i in live], [times[i] for i in live], target="AED"
+        )
+        price_rows = []
+        for j, i in enumerate(live):
+            if j in errors:
+                reason[i] = RejectReason.FX_ERROR
+                details[i] = errors[j]
+                continue
+            price_rows.append({
+                "product_id": product_ids[i],
+                "vendor_id": vendor_id,
+                "observed_at": times[i],
+                "currency": ccys[i],
+                "price": prices[i],
+                "price_aed": converted[j],
+                "source_ingestion_id": ingestion_id,
+            })
+
+    rejections = []
+    with stages.stage("validate", 0):
+        for i in range(n):
+            if reason[i] is None:
+                continue
+            if take_sample is not None and not take_sample(reason[i]):
+                rejections.append((cols["rownum"][i], reason[i], details.get(i), None))
+                continue
+            raw_row = CanonicalPriceRow(
+                vendor_id=vendor_id,
+                vendor_sku=skus[i],
+                vendor_name_raw=cols["vendor_name_raw"][i],
+                price=prices[i],
+                currency=ccys[i],
+                observed_at=times[i],
+            ).model_dump(mode="json")
+            rejections.append((cols["rownum"][i], reason[i], details.get(i), raw_row))
+    return price_rows, rejections
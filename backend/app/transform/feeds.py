@@ -0,0 +1,246 @@
+import csv
+import json
+import sys
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Literal
+from pydantic import BaseModel, model_validator
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..models import Vendor
+from ..storage import open_stored
+from .types import CanonicalPriceRow
+from .jsonstream import JsonStream
+
+FIELDS = ("vendor_sku", "vendor_name_raw", "price", "currency", "observed_at")
+REQUIRED_FIELDS = ("vendor_sku", "price", "observed_at")
+# column index for an unmapped / absent CSV column; `i < len(row)` is then always False
+_ABSENT = sys.maxsize
+
+class FeedSpec(BaseModel):
+    """How a vendor's feed maps onto CanonicalPriceRow; stored as JSON on Vendor.feed_spec.
+
+    `fields` maps canonical field -> CSV/TSV header name, or for JSON / JSON Lines a dotted
+    path inside each record ("pricing.amount"). JSON paths starting with "$." read from the
+    document root instead (e.g. a feed-wide "$.asOf"). `items` is the dotted path to the
+    record array (None: the document is the array). Without a currency mapping every row
+    uses Vendor.default_currency. `date_format` is a strptime format; None means ISO 8601.
+    """
+
+    format: Literal["csv", "tsv", "json", "jsonl"]
+    fields: dict[str, str]
+    date_format: str | None = None
+    items: str | None = None
+    encoding: str = "utf-8"
+
+    @model_validator(mode="after")
+    def _check(self):
+        unknown = set(self.fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+        missing = set(REQUIRED_FIELDS) - set(self.fields)
+        if missing:
+            raise ValueError(f"missing fields: {', '.join(sorted(missing))}")
+        roots = [f for f, p in self.fields.items() if p.startswith("$.")]
+        if roots and (self.format != "json" or self.items is None):
+            raise ValueError("root ($.) paths need format json with an items path")
+        return self
+
+def _date_parser(fmt: str | None):
+    if fmt is None:
+        return lambda s: datetime.fromisoformat(str(s or "").strip())
+    return lambda s: datetime.strptime(str(s or "").strip(), fmt)
+
+class CompiledFeed(ABC):
+    columnar = False
+
+    def __init__(self, vendor_id: str, spec: FeedSpec, default_currency: str):
+        self.vendor_id = vendor_id
+        self.spec = spec
+        self.default_currency = default_currency.upper()
+        self.parse_date = _date_parser(spec.date_format)
+
+    @abstractmethod
+    def rows(self, path: str):
+        """Yields (row_number, CanonicalPriceRow); values are already typed, so rows skip validation."""
+
+class DelimitedFeed(CompiledFeed):
+    # CSV / TSV; data rows are numbered from 2 (1 is the header) and blank lines are skipped
+    columnar = True
+
+    def __init__(self, vendor_id: str, spec: FeedSpec, default_currency: str):
+        super().__init__(vendor_id, spec, default_currency)
+        self.delimiter = "\t" if spec.format == "tsv" else ","
+        self.columns = tuple(spec.fields.get(f) for f in FIELDS)
+
+    def indices(self, header: list[str]) -> tuple[int, ...]:
+        pos = {h.strip(): i for i, h in enumerate(header)}
+        return tuple(pos.get(c, _ABSENT) if c else _ABSENT for c in self.columns)
+
+    def rows(self, path: str):
+        vendor_id = self.vendor_id
+        default_ccy = self.default_currency
+        fixed_ccy = self.columns[3] is None
+        parse_date = self.parse_date
+        make = CanonicalPriceRow.model_construct
+        with open_stored(path, encoding=self.spec.encoding, newline="") as f:
+            reader = csv.reader(f, delimiter=self.delimiter)
+            header = next(reader, None)
+            if header is None:
+                return
+            i_sku, i_name, i_price, i_ccy, i_ts = self.indices(header)
+            rownum = 1
+            for row in reader:
+                if not row:
+                    continue
+                rownum += 1
+                n = len(row)
+                yield rownum, make(
+                    vendor_id=vendor_id,
+                    vendor_sku=row[i_sku].strip() if i_sku < n else "",
+                    vendor_name_raw=(row[i_name].strip() or None) if i_name < n else None,
+                    price=float((row[i_price] if i_price < n else "") or 0),
+                    currency=default_ccy if fixed_ccy else (row[i_ccy].strip().upper() if i_ccy < n else ""),
+                    observed_at=parse_date(row[i_ts] if i_ts < n else ""),
+                )
+
+def _getter(path: tuple[str, ...]):
+    if len(path) == 1:
+        key = path[0]
+        return lambda d: d.get(key) if isinstance(d, dict) else None
+
+    def get(d):
+        for key in path:
+            if not isinstance(d, dict):
+                return None
+            d = d.get(key)
+        return d
+    return get
+
+class JsonFeed(CompiledFeed):
+    """JSON documents and JSON Lines; records are numbered from 1."""
+
+    def __init__(self, vendor_id: str, spec: FeedSpec, default_currency: str):
+        super().__init__(vendor_id, spec, default_currency)
+        self.items = tuple(spec.items.split(".")) if spec.items else ()
+        self.root_paths: dict[str, tuple[str, ...]] = {}
+        self.getters = {}
+        for field in FIELDS:
+            p = spec.fields.get(field)
+            if p is None:
+                continue
+            if p.startswith("$."):
+                self.root_paths[field] = tuple(p[2:].split("."))
+            else:
+                self.getters[field] = _getter(tuple(p.split(".")))
+
+    def _row_maker(self, root: dict):
+        """Builds the per-record extractor once feed-wide (root) values are known."""
+        vendor_id = self.vendor_id
+        fixed = {f: _getter(p)(root) for f, p in self.root_paths.items()}
+        none = lambda d: None
+        get_sku = self.getters.get("vendor_sku", none)
+        get_name = self.getters.get("vendor_name_raw", none)
+        get_price = self.getters.get("price", none)
+        get_ccy = self.getters.get("currency", none)
+        get_ts = self.getters.get("observed_at", none)
+        if "currency" in fixed:
+            ccy_const = str(fixed["currency"] or "").strip().upper()
+        elif "currency" not in self.getters:
+            ccy_const = self.default_currency
+        else:
+            ccy_const = None
+        ts_const = self.parse_date(fixed["observed_at"]) if "observed_at" in fixed else None
+        parse_date = self.parse_date
+        make = CanonicalPriceRow.model_construct
+
+        def row(item):
+            return make(
+                vendor_id=vendor_id,
+                vendor_sku=str(get_sku(item) or "").strip(),
+                vendor_name_raw=str(get_name(item) or "").strip() or None,
+                price=float(get_price(item) or 0),
+                currency=ccy_const if ccy_const is not None else str(get_ccy(item) or "").strip().upper(),
+                observed_at=ts_const if ts_const is not None else parse_date(get_ts(item)),
+            )
+        return row
+
+    def _rows_loaded(self, path: str):
+        with open_stored(path, encoding=self.spec.encoding) as f:
+            payload = json.load(f)
+        records = _getter(self.items)(payload) if self.items else payload
+        row = self._row_maker(payload)
+        for idx, item in enumerate(records or [], start=1):
+            yield idx, row(item)
+
+    def _rows_streaming(self, path: str):
+        # one-level items path: stream records, provided the root fields come before them;
+        # returns False (before yielding anything) otherwise
+        root_keys = {p[0] for p in self.root_paths.values()}
+        with open_stored(path, encoding=self.spec.encoding) as f:
+            stream = JsonStream(f)
+            if not self.items:
+                row = self._row_maker({})
+                for idx, item in enumerate(stream.iter_array(), start=1):
+                    yield idx, row(item)
+                return True
+            root = {}
+            for key in stream.iter_object():
+                if key == self.items[0]:
+                    if root_keys - set(root):
+                        return False
+                    row = self._row_maker(root)
+                    for idx, item in enumerate(stream.iter_array(), start=1):
+                        yield idx, row(item)
+                elif key in root_keys:
+                    root[key] = stream.value()
+                else:
+                    stream.value()
+        if root_keys - set(root):
+            raise KeyError(", ".join(sorted(root_keys - set(root))))
+        return True
+
+    def rows(self, path: str):
+        if self.spec.format == "jsonl":
+            yield from self._rows_lines(path)
+            return
+        if len(self.items) <= 1 and all(len(p) == 1 for p in self.root_paths.values()):
+            if (yield from self._rows_streaming(path)):
+                return
+        yield from self._rows_loaded(path)
+
+    def _rows_lines(self, path: str):
+        row = self._row_maker({})
+        with open_stored(path, encoding=self.spec.encoding) as f:
+            idx = 0
+            for line in f:
+                if not line.strip():
+                    continue
+                idx += 1
+                yield idx, row(json.loads(line))
+
+def compile_feed(vendor_id: str, spec: dict | FeedSpec, default_currency: str) -> CompiledFeed:
+    spec = spec if isinstance(spec, FeedSpec) else FeedSpec.model_validate(spec)
+    cls = DelimitedFeed if spec.format in ("csv", "tsv") else JsonFeed
+    return cls(vendor_id, spec, default_currency)
+
+# vendor_id -> (spec fingerprint, compiled feed); recompiled only when the vendor row changes
+_compiled: dict[str, tuple[str, CompiledFeed]] = {}
+
+def feed_for_vendor(vendor: Vendor) -> CompiledFeed | None:
+    if not vendor.feed_spec:
+        return None
+    fingerprint = json.dumps([vendor.feed_spec, vendor.default_currency], sort_keys=True)
+    hit = _compiled.get(vendor.id)
+    if hit and hit[0] == fingerprint:
+        return hit[1]
+    feed = compile_feed(vendor.id, vendor.feed_spec, vendor.default_currency)
+    _compiled[vendor.id] = (fingerprint, feed)
+    return feed
+
+def get_feed(db: Session, vendor_id: str) -> CompiledFeed | None:
+    vendor = db.get(Vendor, vendor_id)
+    return feed_for_vendor(vendor) if vendor else None
+
+def vendor_by_feed_key(db: Session, feed_key: str) -> Vendor | None:
+    return db.execute(select(Vendor).where(Vendor.feed_key == feed_key)).scalar_one_or_none()
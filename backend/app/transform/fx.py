@@ -1,36 +1,76 @@
+from bisect import bisect_right
 from datetime import datetime, date
 from sqlalchemy.orm import Session
 from sqlalchemy import select
+from ..config import settings
 from ..models import FXRate
 
 def _midnight(d: date) -> datetime:
     return datetime(d.year, d.month, d.day)
 
-def fx_to_aed(db: Session, amount: float, currency: str, as_of: datetime, target: str = "AED") -> float:
-    c = currency.upper()
-    if c == target.upper():
-        return float(amount)
-
-    fx_date = _midnight(as_of.date())
-
-    # Try direct: c -> AED
-    stmt = select(FXRate).where(
-        FXRate.fx_date == fx_date,
-        FXRate.base_currency == c,
-        FXRate.quote_currency == target.upper(),
-    )
-    row = db.execute(stmt).scalar_one_or_none()
-    if row:
-        return float(amount) * float(row.rate)
-
-    # Try inverse: AED -> c
-    stmt2 = select(FXRate).where(
-        FXRate.fx_date == fx_date,
-        FXRate.base_currency == target.upper(),
-        FXRate.quote_currency == c,
-    )
-    row2 = db.execute(stmt2).scalar_one_or_none()
-    if row2 and float(row2.rate) != 0:
-        return float(amount) / float(row2.rate)
-
-    raise ValueError(f"No FX rate for {c}↔{target} on {fx_date.date().isoformat()}")
+class FXIndex:
+    """Rate history per (base, quote) pair, sorted by day, for "latest rate on or before" lookups.
+
+    A pair resolves from the direct or inverse series (whichever is fresher, at most
+    `max_staleness_days` old); pairs with neither are triangulated through `pivots`.
+    """
+
+    def __init__(self, rows, max_staleness_days: int | None = None, pivots=None):
+        self.max_staleness_days = settings.fx_max_staleness_days if max_staleness_days is None else max_staleness_days
+        self.pivots = tuple(p.upper() for p in (settings.fx_pivot_currencies if pivots is None else pivots))
+        series: dict[tuple[str, str], list[tuple[int, float]]] = {}
+        for fx_date, base, quote, rate in rows:
+            series.setdefault((base.upper(), quote.upper()), []).append((fx_date.toordinal(), float(rate)))
+        self._days: dict[tuple[str, str], list[int]] = {}
+        self._rates: dict[tuple[str, str], list[float]] = {}
+        for pair, points in series.items():
+            points.sort()
+            self._days[pair] = [d for d, _ in points]
+            self._rates[pair] = [r for _, r in points]
+
+    def _latest(self, base: str, quote: str, day: int) -> tuple[float, int] | None:
+        days = self._days.get((base, quote))
+        if not days:
+            return None
+        i = bisect_right(days, day) - 1
+        if i < 0 or day - days[i] > self.max_staleness_days:
+            return None
+        return self._rates[(base, quote)][i], days[i]
+
+    def _leg(self, base: str, quote: str, day: int) -> tuple[float, bool] | None:
+        direct = self._latest(base, quote, day)
+        inverse = self._latest(quote, base, day)
+        if inverse and not inverse[0]:
+            inverse = None
+        if direct and (not inverse or direct[1] >= inverse[1]):
+            return direct[0], False
+        if inverse:
+            return inverse[0], True
+        return None
+
+    def factor(self, currency: str, as_of: date, target: str = "AED") -> tuple[float, bool]:
+        # (rate, inverse): converted = amount / rate if inverse else amount * rate
+        c = currency.upper()
+        t = target.upper()
+        if c == t:
+            return 1.0, False
+        day = as_of.toordinal()
+        leg = self._leg(c, t, day)
+        if leg:
+            return leg
+        for pivot in self.pivots:
+            if pivot in (c, t):
+                continue
+            first = self._leg(c, pivot, day)
+            second = self._leg(pivot, t, day) if first else None
+            if second:
+                (r1, inv1), (r2, inv2) = first, second
+                return (1 / r1 if inv1 else r1) * (1 / r2 if inv2 else r2), False
+        raise ValueError(f"No FX rate for {c}↔{t} on {as_of.isoformat()}")
+
+def load_fx_index(db: Session, currencies=None, **kwargs) -> FXIndex:
+    # the whole history is small (currencies x days), so load it in one pass
+    stmt = select(FXRate.fx_date, FXRate.base_currency, FXRate.quote_currency, FXRate.rate)
+    if currencies:
+        stmt = stmt.where(FXRate.base_currency.in_(currencies), FXRate.quote_currency.in_(currencies))
+    return FXIndex(db.execute(stmt).all(), **kwargs)
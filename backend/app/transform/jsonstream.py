@@ -0,0 +1,89 @@
+import json
+
+CHUNK_SIZE = 1 << 16
+_WS = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+class JsonStream:
+    """Minimal pull reader over a text file: decodes one JSON value at a time from a sliding buffer."""
+
+    def __init__(self, f, chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        # next non-whitespace char ("" at EOF), without consuming it
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def next_char(self) -> str:
+        c = self.peek()
+        self.pos += 1
+        return c
+
+    def expect(self, ch: str):
+        c = self.next_char()
+        if c != ch:
+            raise ValueError(f"Malformed JSON: expected {ch!r}, got {c!r}")
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+                # a scalar ending exactly at the buffer edge may be truncated (e.g. 12|34)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def iter_object(self):
+        # yields keys of the current object; caller must consume each value
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            c = self.next_char()
+            if c == "}":
+                return
+            if c != ",":
+                raise ValueError(f"Malformed JSON: expected ',' or '}}', got {c!r}")
+
+    def iter_array(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            c = self.next_char()
+            if c == "]":
+                return
+            if c != ",":
+                raise ValueError(f"Malformed JSON: expected ',' or ']', got {c!r}")
@@ -0,0 +1,133 @@
+from datetime import datetime, date
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from ..models import ProductAlias
+from ..matching import AliasIndex, alias_index
+from .fx import FXIndex, load_fx_index
+
+# bumped on seed / alias / FX writes; live caches compare against it and reload
+_generation = 0
+
+def invalidate_lookups():
+    # called by every writer of product_aliases / fx_rates after it commits
+    global _generation
+    _generation += 1
+
+class LookupCache:
+    """Per-run in-memory alias and FX tables, so per-row lookups are dict hits."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._generation = _generation
+        # vendor_id -> {vendor_sku: product_id}
+        self._aliases: dict[str, dict[str, str]] = {}
+        self._fx_index: FXIndex | None = None
+        self._alias_index: AliasIndex | None = None
+        # (currency, target, day) -> (rate, inverse) or the error message
+        self._fx: dict[tuple[str, str, date], tuple[float, bool] | str] = {}
+        self.alias_hits = 0
+        self.alias_misses = 0
+        self.fx_hits = 0
+        self.fx_misses = 0
+
+    def _check_generation(self):
+        if self._generation != _generation:
+            self._aliases.clear()
+            self._fx_index = None
+            self._fx.clear()
+            self._generation = _generation
+
+    def preload_aliases(self, vendor_ids):
+        self._check_generation()
+        missing = [v for v in set(vendor_ids) if v not in self._aliases]
+        if not missing:
+            return
+        for v in missing:
+            self._aliases[v] = {}
+        rows = self.db.execute(
+            select(ProductAlias.vendor_id, ProductAlias.vendor_sku, ProductAlias.product_id)
+            .where(ProductAlias.vendor_id.in_(missing))
+        ).all()
+        for vendor_id, vendor_sku, product_id in rows:
+            self._aliases[vendor_id][vendor_sku] = product_id
+
+    @property
+    def fx_index(self) -> FXIndex:
+        self._check_generation()
+        if self._fx_index is None:
+            self._fx_index = load_fx_index(self.db)
+        return self._fx_index
+
+    @property
+    def alias_index(self) -> AliasIndex:
+        # the process's product name index (see matching.py), synced once per run on first use
+        if self._alias_index is None:
+            self._alias_index = alias_index(self.db)
+        return self._alias_index
+
+    def alias_map(self, vendor_id: str) -> dict[str, str]:
+        self._check_generation()
+        skus = self._aliases.get(vendor_id)
+        if skus is None:
+            self.alias_misses += 1
+            self.preload_aliases([vendor_id])
+            return self._aliases[vendor_id]
+        self.alias_hits += 1
+        return skus
+
+    def resolve_product_id(self, vendor_id: str, vendor_sku: str) -> str | None:
+        if not vendor_sku:
+            return None
+        return self.alias_map(vendor_id).get(vendor_sku)
+
+    def fx_factor(self, currency: str, as_of: datetime, target: str = "AED") -> tuple[float, bool]:
+        # (rate, inverse): converted = amount / rate if inverse else amount * rate
+        c = currency.upper()
+        t = target.upper()
+        if c == t:
+            return 1.0, False
+        index = self.fx_index
+        key = (c, t, as_of.date())
+        factor = self._fx.get(key)
+        if factor is None:
+            self.fx_misses += 1
+            try:
+                factor = index.factor(c, key[2], t)
+            except ValueError as e:
+                factor = str(e)
+            self._fx[key] = factor
+        else:
+            self.fx_hits += 1
+        if isinstance(factor, str):
+            raise ValueError(factor)
+        return factor
+
+    def fx_to_aed(self, amount: float, currency: str, as_of: datetime, target: str = "AED") -> float:
+        if currency.upper() == target.upper():
+            return float(amount)
+        rate, inverse = self.fx_factor(currency, as_of, target)
+        return float(amount) / rate if inverse else float(amount) * rate
+
+    def convert_batch(self, amounts, currencies, times, target: str = "AED") -> tuple[list[float | None], dict[int, str]]:
+        """Converts a batch; returns (converted, errors) with errors keyed by position.
+
+        Goes through the same (currency, day) cache as fx_to_aed, so each distinct pair is
+        resolved once per run and the hit / miss counters match the row path.
+        """
+        out: list[float | None] = []
+        errors: dict[int, str] = {}
+        for i, (amount, currency, t) in enumerate(zip(amounts, currencies, times)):
+            try:
+                out.append(self.fx_to_aed(amount, currency, t, target))
+            except ValueError as e:
+                out.append(None)
+                errors[i] = str(e)
+        return out, errors
+
+    def stats(self) -> dict:
+        return {
+            "alias_hits": self.alias_hits,
+            "alias_misses": self.alias_misses,
+            "fx_hits": self.fx_hits,
+            "fx_misses": self.fx_misses,
+        }
@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+# settings are read at import time, so the test database and storage are set before app is imported
+_tmp = tempfile.mkdtemp(prefix="price-etl-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{_tmp}/test.db")
+os.environ["STORAGE_DIR"] = f"{_tmp}/storage"
+os.environ["ETL_INPROCESS_WORKER"] = "0"
+os.environ["DB_AUTO_MIGRATE"] = "0"
+os.environ["RESPONSE_CACHE_TTL"] = "0"
+
+from pathlib import Path
+import pytest
+from sqlalchemy import delete
+from app import matching
+from app.db import Base, SessionLocal, engine
+from app.migrate import migrate
+from app.response_cache import bump_generation
+from app.seed import seed
+from app.transform.lookup import invalidate_lookups
+
+SAMPLES = Path(__file__).resolve().parents[2] / "samples"
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    migrate(engine)
+
+@pytest.fixture
+def db(monkeypatch):
+    """A session on an emptied, freshly seeded database."""
+    session = SessionLocal()
+    for table in reversed(Base.metadata.sorted_tables):
+        session.execute(delete(table))
+    session.commit()
+    seed(session)
+    invalidate_lookups()
+    bump_generation()
+    monkeypatch.setattr(matching, "_index", None)
+    yield session
+    session.close()
@@ -0,0 +1,69 @@
+import gzip
+import io
+import tarfile
+import zipfile
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from app.main import app
+from app.models import RawIngestion
+from conftest import SAMPLES
+
+FEED = (SAMPLES / "vendor_a.csv").read_bytes()
+
+def _tar_gz(members: dict[str, bytes]) -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tf:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+def _zip(members: dict[str, bytes]) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+def _ingestions(db) -> int:
+    return db.scalar(select(func.count()).select_from(RawIngestion))
+
+@pytest.mark.parametrize("keep_gzip", [True, False])
+def test_compressed_copies_dedupe_against_the_plain_feed(db, monkeypatch, keep_gzip):
+    monkeypatch.setattr("app.archives.settings.ingest_keep_gzip", keep_gzip)
+    with TestClient(app) as client:
+        plain = client.post("/ingest/vendor_a", files={"file": ("a.csv", FEED)}).json()
+        gz = client.post("/ingest/vendor_a", files={"file": ("a.csv.gz", gzip.compress(FEED))}).json()
+        batch = client.post("/ingest/vendor_a/batch", files=[
+            ("files", ("feeds.zip", _zip({"a.csv": FEED, "__MACOSX/._a.csv": b"x"}))),
+            ("files", ("feeds.tar.gz", _tar_gz({"x/a.csv": FEED, "x/b.csv": FEED.replace(b"2599.00", b"2598.00")}))),
+        ]).json()
+
+    assert plain["duplicate"] is False
+    assert (gz["duplicate"], gz["ingestion_id"], gz["sha256"], gz["size"]) == (True, plain["ingestion_id"], plain["sha256"], len(FEED))
+    assert [(f["file_name"], f["duplicate"]) for f in batch["files"]] == [
+        ("feeds.zip/a.csv", True), ("feeds.tar.gz/x/a.csv", True), ("feeds.tar.gz/x/b.csv", False),
+    ]
+    assert _ingestions(db) == 2
+
+def test_a_corrupt_member_fails_the_whole_upload(db):
+    good = _zip({"a.csv": FEED.replace(b"2599.00", b"2597.00")})
+    damaged = bytearray(_zip({"b.csv": FEED * 20}))
+    # flip bytes inside the deflated member data, past its local header
+    damaged[60:70] = bytes(b ^ 0xFF for b in damaged[60:70])
+    with TestClient(app) as client:
+        batch = client.post("/ingest/vendor_a/batch", files=[
+            ("files", ("good.zip", good)), ("files", ("bad.zip", bytes(damaged))),
+        ])
+        truncated = client.post("/ingest/vendor_a", files={"file": ("a.csv.gz", gzip.compress(FEED)[:-12])})
+        tar = client.post("/ingest/vendor_a/batch", files={"files": ("t.tar.gz", _tar_gz({"a.csv": FEED})[:-40])})
+        bundle = client.post("/ingest/vendor_a", files={"file": ("t.zip", good)})
+
+    assert batch.status_code == 400 and "bad.zip" in batch.json()["detail"]
+    assert truncated.status_code == 400 and "Invalid gzip file" in truncated.json()["detail"]
+    assert tar.status_code == 400
+    assert bundle.status_code == 400 and "/batch" in bundle.json()["detail"]
+    # nothing from the rejected uploads was registered
+    assert _ingestions(db) == 0
@@ -0,0 +1,64 @@
+import io
+import pytest
+from sqlalchemy import select
+from app.catalog_import import import_catalog
+from app.models import Product, ProductAlias
+
+PRODUCTS = """id,canonical_name,category
+P-NEW1,New GPU,GPU
+P-B650,MSI B650 ATX Board,Motherboard
+P-PSU750,750W 80+ Gold PSU,PSU
+,No id,GPU
+P-NEW1,New GPU v2,GPU
+"""
+# one insert (pointing at a product from the same import), one name update, one unchanged,
+# one move without remap, one SKU mapped two ways, and rows with an unknown vendor / product / blank SKU
+ALIASES = """vendor_id,vendor_sku,product_id,vendor_name_raw
+V-A,GT-NEW1,P-NEW1,New GPU (GulfTech)
+V-A,GT-MSI-B650-ATX,P-B650,MSI B650 ATX rev2
+V-A,GT-PSU-750-GOLD,P-PSU750,PSU 750W Gold
+V-A,GT-R7-7800X3D,P-B650,
+V-C,EC-X,P-B650,
+V-C,EC-X,P-PSU750,
+V-Z,GT-Z,P-B650,
+V-A,GT-Y,P-NOPE,
+V-A,,P-B650,
+"""
+
+def _import(db, products=None, aliases=None, **kwargs):
+    return import_catalog(
+        db,
+        products=io.StringIO(products) if products is not None else None,
+        aliases=io.StringIO(aliases) if aliases is not None else None,
+        **kwargs,
+    )
+
+def _alias(db, vendor_id, sku):
+    db.expire_all()
+    return db.scalar(select(ProductAlias.product_id).where(ProductAlias.vendor_id == vendor_id, ProductAlias.vendor_sku == sku))
+
+def test_rows_are_classified_per_key(db):
+    result = _import(db, PRODUCTS, ALIASES)
+    assert result["products"] == {"rows": 5, "inserted": 1, "updated": 1, "unchanged": 1, "conflicting": 0, "invalid": 1}
+    assert result["aliases"] == {"rows": 9, "inserted": 1, "updated": 1, "unchanged": 1, "conflicting": 2, "invalid": 3}
+    assert db.get(Product, "P-NEW1").canonical_name == "New GPU v2"
+    assert _alias(db, "V-A", "GT-NEW1") == "P-NEW1"
+    # neither conflict is written
+    assert _alias(db, "V-A", "GT-R7-7800X3D") == "P-RYZEN7800X3D"
+    assert _alias(db, "V-C", "EC-X") is None
+
+def test_remap_moves_existing_aliases(db):
+    result = _import(db, aliases="vendor_id,vendor_sku,product_id\nV-A,GT-R7-7800X3D,P-B650\n", remap=True)
+    assert (result["aliases"]["updated"], result["aliases"]["conflicting"]) == (1, 0)
+    assert _alias(db, "V-A", "GT-R7-7800X3D") == "P-B650"
+
+def test_a_failed_import_leaves_no_staging_tables(db):
+    # the products stage before the aliases header fails; nothing is kept, and the next import
+    # can create its staging tables again
+    with pytest.raises(ValueError, match="aliases CSV header"):
+        _import(db, PRODUCTS, "foo,bar\n1,2\n")
+    assert db.get(Product, "P-NEW1") is None
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            _import(db, aliases="vendor_id,vendor_sku,product_id\nV-A,GT-X\n")
+    assert _import(db, PRODUCTS)["products"]["inserted"] == 1
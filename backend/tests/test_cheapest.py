@@ -0,0 +1,65 @@
+from contextlib import contextmanager
+from datetime import datetime
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app.db import async_reads_enabled, async_session_factory, engine
+from app.main import app
+from app.models import LatestPrice, Product, RawIngestion, Vendor
+
+@pytest.fixture
+def catalog(db):
+    # 40 products in 4 categories, priced by 6 vendors with ties at the minimum
+    vendors = [f"V-T{v}" for v in range(6)]
+    for v in vendors:
+        db.add(Vendor(id=v, name=v, default_currency="AED"))
+    db.flush()
+    ing = RawIngestion(vendor_id=vendors[0], file_name="t.csv", stored_path="t.csv", status="PROCESSED")
+    db.add(ing)
+    db.flush()
+    for p in range(40):
+        product_id = f"P-T{p:02d}"
+        db.add(Product(id=product_id, canonical_name=f"Test part {p}", category=f"cat{p % 4}"))
+        db.flush()
+        for i, v in enumerate(vendors):
+            db.add(LatestPrice(
+                product_id=product_id, vendor_id=v, observed_at=datetime(2025, 12, 20),
+                currency="AED", price=100 + (i + p) % 3, price_aed=100 + (i + p) % 3, source_ingestion_id=ing.id,
+            ))
+    db.commit()
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = [engine]
+    if async_reads_enabled():
+        engines.append(async_session_factory().kw["bind"].sync_engine)
+    for e in engines:
+        event.listen(e, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for e in engines:
+            event.remove(e, "before_cursor_execute", before_cursor_execute)
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"category": "cat1"},
+    {"limit": 5},
+    {"category": "cat2", "limit": 3, "offset": 4},
+])
+def test_cheapest_is_one_statement(catalog, params):
+    with TestClient(app) as client:
+        assert client.get("/cheapest").status_code == 200  # connects and initialises the engines
+        with count_statements() as statements:
+            resp = client.get("/cheapest", params=params)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body and all(len(p["vendors"]) == 2 for p in body if p["product_id"].startswith("P-T"))
+    if "limit" in params:
+        assert len(body) == params["limit"]
+    assert len(statements) == 1, statements
@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import delete, select
+from app.etl import run_etl
+from app.models import AliasCandidate, LatestPrice, Price, PriceChange, PriceDailyRollup, RawIngestion, Rejection, RejectionSummary, RunStage
+from conftest import SAMPLES
+
+FEEDS = [
+    ("V-A", "vendor_a.csv"),
+    ("V-A", "vendor_a_bad.csv"),
+    ("V-B", "vendor_b.json"),
+    ("V-C", "vendor_c.csv"),
+]
+
+def _run(db, mode: str):
+    for model in (PriceChange, LatestPrice, PriceDailyRollup, Price, Rejection, RejectionSummary, RunStage, AliasCandidate, RawIngestion):
+        db.execute(delete(model))
+    db.commit()
+    db.expunge_all()
+    for vendor_id, name in FEEDS:
+        db.add(RawIngestion(vendor_id=vendor_id, file_name=name, stored_path=str(SAMPLES / name), status="PENDING"))
+    db.commit()
+    result = run_etl(db, mode=mode)
+    files = dict(db.execute(select(RawIngestion.id, RawIngestion.file_name)).all())
+    prices = sorted(
+        (p.product_id, p.vendor_id, p.observed_at, p.currency, float(p.price), float(p.price_aed))
+        for p in db.scalars(select(Price))
+    )
+    rejections = sorted(
+        (files[r.ingestion_id], r.row_number, r.reason_code, r.detail, sorted(r.raw_row.items()))
+        for r in db.scalars(select(Rejection))
+    )
+    summaries = sorted(
+        (files[s.ingestion_id], s.reason_code, s.rejected_rows, s.sampled_rows, s.first_row, s.last_row)
+        for s in db.scalars(select(RejectionSummary))
+    )
+    return result, prices, rejections, summaries
+
+@pytest.mark.parametrize("batch_size", [2, 5000])
+def test_columnar_matches_row_path(db, monkeypatch, batch_size):
+    monkeypatch.setattr("app.loader.settings.etl_batch_size", batch_size)
+    row, row_prices, row_rejections, row_summaries = _run(db, "row")
+    col, col_prices, col_rejections, col_summaries = _run(db, "columnar")
+
+    assert (row["loaded_rows"], row["rejected_rows"]) == (18, 4)
+    assert (col["loaded_rows"], col["rejected_rows"]) == (18, 4)
+    assert col_prices == row_prices
+    assert col_rejections == row_rejections
+    assert col_summaries == row_summaries
+    # the columnar FX lookups go through the same cache, so they show up in the run's counters
+    fx = lambda r: (r["cache"]["fx_hits"], r["cache"]["fx_misses"])
+    assert fx(col) == fx(row) and sum(fx(row)) > 0
+    assert {r[2] for r in row_rejections} == {1, 2, 4}
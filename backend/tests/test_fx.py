@@ -0,0 +1,54 @@
+import io
+from datetime import date, datetime
+import pytest
+from sqlalchemy import func, select
+from app.fx_import import import_fx_csv
+from app.models import FXRate
+from app.transform.fx import FXIndex
+
+def _index(*rows, **kwargs):
+    return FXIndex([(datetime.fromisoformat(d), b, q, r) for d, b, q, r in rows], **kwargs)
+
+def test_rates_older_than_the_staleness_cutoff_are_not_used():
+    index = _index(("2025-12-01", "USD", "AED", 3.67), max_staleness_days=7, pivots=())
+    assert index.factor("usd", date(2025, 12, 8)) == (3.67, False)
+    with pytest.raises(ValueError, match="No FX rate for USD"):
+        index.factor("USD", date(2025, 12, 9))
+    # nor rates from after the day
+    with pytest.raises(ValueError):
+        index.factor("USD", date(2025, 11, 30))
+
+def test_the_fresher_of_the_direct_and_inverse_series_wins():
+    index = _index(
+        ("2025-12-01", "EUR", "AED", 4.0), ("2025-12-05", "AED", "EUR", 0.25),
+        max_staleness_days=7, pivots=(),
+    )
+    assert index.factor("EUR", date(2025, 12, 6)) == (0.25, True)
+    assert index.factor("EUR", date(2025, 12, 3)) == (4.0, False)
+    # a zero inverse rate is unusable rather than a division by zero
+    with pytest.raises(ValueError, match="No FX rate for EUR"):
+        _index(("2025-12-01", "AED", "EUR", 0), pivots=()).factor("EUR", date(2025, 12, 1))
+
+def test_pairs_without_a_series_are_triangulated_through_a_pivot():
+    index = _index(
+        ("2025-12-01", "USD", "GBP", 0.8), ("2025-12-01", "USD", "AED", 3.6),
+        max_staleness_days=7, pivots=("USD",),
+    )
+    # GBP -> USD from the inverse of USD/GBP, then USD -> AED
+    rate, inverse = index.factor("GBP", date(2025, 12, 2))
+    assert (round(rate, 6), inverse) == (4.5, False)
+    with pytest.raises(ValueError, match="No FX rate for JPY↔AED on 2025-12-02"):
+        index.factor("JPY", date(2025, 12, 2))
+
+@pytest.mark.parametrize("body, error", [
+    ("2025-12-20,AED,USD\n", "line 2: "),
+    ("2025-12-20,AED,USD,0.27\nbad,AED,USD,1\n", "line 3: "),
+    ("2025-12-20,,USD,0.27\n", "line 2: fx_date, base, quote and rate are required"),
+    ("2025-12-20,AED,USD,x\n", "line 2: "),
+])
+def test_malformed_fx_rows_are_rejected_with_their_line(db, body, error):
+    before = db.scalar(select(func.count()).select_from(FXRate))
+    with pytest.raises(ValueError, match=error):
+        import_fx_csv(db, io.StringIO("fx_date,base,quote,rate\n" + body))
+    db.rollback()
+    assert db.scalar(select(func.count()).select_from(FXRate)) == before
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+from app.etl import run_etl
+from app.main import app
+from app.models import Price, RawIngestion
+
+# 2025-12-20 is a Saturday: two days in one week, then a day in the next
+POINTS = [
+    ("2025-12-20T10:00:00", 2599), ("2025-12-20T12:00:00", 2610), ("2025-12-20T18:00:00", 2590),
+    ("2025-12-21T09:00:00", 2580), ("2025-12-22T09:00:00", 2570), ("2025-12-22T15:00:00", 2575),
+]
+
+def _expected(bucket, start=None):
+    buckets = {}
+    for t, price in POINTS:
+        t = datetime.fromisoformat(t)
+        if start and t < start:
+            continue
+        day = t.replace(hour=0)
+        key = day - timedelta(days=day.weekday()) if bucket == "week" else day
+        buckets.setdefault(key, []).append(price)
+    return [
+        {"vendor_id": "V-A", "t": t.isoformat(), "min_aed": min(p), "max_aed": max(p), "last_aed": p[-1],
+         "avg_aed": sum(p) / len(p), "count": len(p)}
+        for t, p in sorted(buckets.items())
+    ]
+
+def _buckets(client, bucket, **params):
+    return client.get("/history/P-RTX4070", params={"bucket": bucket, **params}).json()["buckets"]
+
+def test_day_and_week_buckets_come_from_rollups(db, tmp_path):
+    path = tmp_path / "a.csv"
+    path.write_text("sku,name,price,currency,date\n" + "".join(f"GT-RTX4070-12G,x,{p},AED,{t}\n" for t, p in POINTS))
+    db.add(RawIngestion(vendor_id="V-A", file_name=path.name, stored_path=str(path), status="PENDING"))
+    db.commit()
+    run_etl(db)
+
+    with TestClient(app) as client:
+        for bucket in ("day", "week"):
+            assert _buckets(client, bucket) == _expected(bucket)
+        # a cut-into first day is read from raw prices, the rest from the rollups
+        start = datetime(2025, 12, 20, 11)
+        assert _buckets(client, "week", **{"from": start.isoformat()}) == _expected("week", start)
+
+        # raw prices gone (as after retention): whole days still answer
+        db.execute(delete(Price))
+        db.commit()
+        assert _buckets(client, "day") == _expected("day")
+        assert _buckets(client, "hour") == []
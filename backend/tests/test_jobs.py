@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+from app.etl import run_etl
+from app.jobs import claim_next_run, work_once
+from app.models import RawIngestion, Run
+from app.response_cache import response_cache
+from conftest import SAMPLES
+
+def _abandoned(db, lease_until):
+    # what a worker killed mid-run leaves behind: its run and ingestion still RUNNING
+    now = datetime.utcnow()
+    run = Run(status="RUNNING", trigger="api", queued_at=now, not_before=now, started_at=now, lease_until=lease_until)
+    ing = RawIngestion(
+        vendor_id="V-A", file_name="vendor_a.csv", stored_path=str(SAMPLES / "vendor_a.csv"),
+        status="RUNNING", lease_until=lease_until,
+    )
+    db.add_all([run, ing])
+    db.commit()
+    return run, ing
+
+def test_expired_leases_are_reclaimed(db):
+    run, ing = _abandoned(db, datetime.utcnow() - timedelta(seconds=1))
+    assert work_once(db).id == run.id
+    db.refresh(run)
+    db.refresh(ing)
+    assert (run.status, run.processed_ingestions) == ("DONE", 1)
+    assert (ing.status, ing.loaded_rows) == ("PROCESSED", 6)
+
+def test_live_leases_are_left_alone(db):
+    run, ing = _abandoned(db, datetime.utcnow() + timedelta(minutes=5))
+    assert claim_next_run(db) is None
+    db.refresh(ing)
+    assert ing.status == "RUNNING"
+
+def test_an_overwrite_only_run_bumps_the_cache(db, tmp_path, monkeypatch):
+    monkeypatch.setattr("app.loader.settings.price_conflict_policy", "overwrite")
+    for i, price in enumerate((2599, 2400)):
+        path = tmp_path / f"a{i}.csv"
+        path.write_text(f"sku,name,price,currency,date\nGT-RTX4070-12G,x,{price},AED,2025-12-20T10:00:00\n")
+        db.add(RawIngestion(vendor_id="V-A", file_name=path.name, stored_path=str(path), status="PENDING"))
+        db.commit()
+        before = response_cache.generation()
+        result = run_etl(db)
+    assert (result["loaded_rows"], result["duplicate_rows"]) == (0, 1)
+    assert response_cache.generation() > before
@@ -0,0 +1,66 @@
+import json
+from datetime import datetime
+import pytest
+from app.transform import feeds
+from app.transform.feeds import compile_feed
+from app.transform.jsonstream import JsonStream
+from conftest import SAMPLES
+
+SPEC = {
+    "format": "json",
+    "items": "items",
+    "fields": {"vendor_sku": "partNumber", "vendor_name_raw": "title", "price": "pricing.amount", "currency": "pricing.ccy", "observed_at": "$.asOf"},
+}
+
+def _expected(path):
+    # what the feed should yield, read with json.load
+    doc = json.loads(path.read_text())
+    as_of = datetime.fromisoformat(doc["asOf"])
+    return [
+        (i, item["partNumber"], item["title"], float(item["pricing"]["amount"]), item["pricing"]["ccy"].upper(), as_of)
+        for i, item in enumerate(doc["items"], start=1)
+    ]
+
+def _rows(path, spec=SPEC):
+    return [
+        (i, r.vendor_sku, r.vendor_name_raw, r.price, r.currency, r.observed_at)
+        for i, r in compile_feed("V-B", spec, "USD").rows(str(path))
+    ]
+
+def _doc(n, as_of_last=False):
+    items = [
+        {"partNumber": f"PN-{i}", "title": f"Part \"{i}\" é", "pricing": {"amount": 10 + i / 8, "ccy": "usd"}, "extra": [i, {"x": None}]}
+        for i in range(n)
+    ]
+    doc = {"vendor": "x", "items": items, "asOf": "2025-12-20T08:30:00"} if as_of_last else \
+          {"vendor": "x", "asOf": "2025-12-20T08:30:00", "items": items}
+    return json.dumps(doc, indent=1)
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # values and keys straddle the buffer edge
+    monkeypatch.setattr(feeds, "JsonStream", lambda f: JsonStream(f, chunk_size=7))
+
+def test_streamed_rows_match_json_load(tmp_path, small_chunks):
+    assert _rows(SAMPLES / "vendor_b.json") == _expected(SAMPLES / "vendor_b.json")
+    path = tmp_path / "b.json"
+    path.write_text(_doc(200))
+    assert _rows(path) == _expected(path)
+
+def test_as_of_after_the_items_falls_back_to_json_load(tmp_path, monkeypatch):
+    path = tmp_path / "b.json"
+    path.write_text(_doc(50, as_of_last=True))
+    loaded = []
+    rows_loaded = feeds.JsonFeed._rows_loaded
+    monkeypatch.setattr(feeds.JsonFeed, "_rows_loaded", lambda self, p: loaded.append(p) or rows_loaded(self, p))
+    assert _rows(path) == _expected(path)
+    assert loaded == [str(path)]
+
+def test_a_bare_array_is_streamed(tmp_path, small_chunks):
+    path = tmp_path / "b.json"
+    path.write_text(json.dumps([{"sku": "A", "price": "1.5", "ts": "2025-12-20T08:30:00"}, {"sku": "B", "price": 2, "ts": "2025-12-21T08:30:00"}]))
+    spec = {"format": "json", "fields": {"vendor_sku": "sku", "price": "price", "observed_at": "ts"}}
+    assert _rows(path, spec) == [
+        (1, "A", None, 1.5, "USD", datetime(2025, 12, 20, 8, 30)),
+        (2, "B", None, 2.0, "USD", datetime(2025, 12, 21, 8, 30)),
+    ]
@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import select
+from app.changes import changes_after
+from app.etl import run_etl
+from app.models import LatestPrice, Price, RawIngestion
+from app.projections import rebuild_latest_prices
+
+FIRST = """sku,name,price,currency,date
+GT-RTX4070-12G,x,2599,AED,2025-12-20T10:00:00
+GT-R7-7800X3D,x,1650,AED,2025-12-20T10:00:00
+"""
+# the same points again at other prices
+SECOND = """sku,name,price,currency,date
+GT-RTX4070-12G,x,2400,AED,2025-12-20T10:00:00
+GT-R7-7800X3D,x,1700,AED,2025-12-20T10:00:00
+"""
+
+def _ingest(db, path, body):
+    path.write_text(body)
+    ing = RawIngestion(vendor_id="V-A", file_name=path.name, stored_path=str(path), status="PENDING")
+    db.add(ing)
+    db.commit()
+    run_etl(db)
+    return ing
+
+def _state(db):
+    db.expire_all()
+    latest = sorted((r.product_id, float(r.price_aed), r.source_ingestion_id) for r in db.scalars(select(LatestPrice)))
+    prices = sorted((r.product_id, float(r.price_aed), r.source_ingestion_id) for r in db.scalars(select(Price)))
+    return latest, prices
+
+@pytest.mark.parametrize("policy", ["skip", "overwrite", "keep-latest-ingestion"])
+def test_latest_prices_follow_the_rows_written(db, tmp_path, monkeypatch, policy):
+    monkeypatch.setattr("app.loader.settings.price_conflict_policy", policy)
+    monkeypatch.setattr("app.loader.settings.change_feed", True)
+    first = _ingest(db, tmp_path / "a.csv", FIRST)
+    _ingest(db, tmp_path / "b.csv", SECOND)
+    # replaying the older ingestion
+    first.status, first.checkpoint_row = "PENDING", 0
+    db.commit()
+    run_etl(db)
+
+    latest, prices = _state(db)
+    assert latest == prices
+    winner = {"skip": first.id, "overwrite": first.id, "keep-latest-ingestion": first.id + 1}[policy]
+    assert {r[2] for r in latest} == {winner}
+    last = {}
+    for c in changes_after(db, 0, 1000):
+        if c["kind"] in ("listed", "price_changed"):
+            last[c["product_id"]] = c["price_aed"]
+    assert last == {p: aed for p, aed, _ in latest}
+
+    rebuild_latest_prices(db)
+    assert _state(db)[0] == latest
@@ -0,0 +1,74 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.etl import run_etl
+from app.main import app
+from app.matching import AliasMatcher, alias_index
+from app.models import AliasCandidate, ProductAlias, RawIngestion
+from app.transform.lookup import LookupCache
+
+ROWS = [
+    ("GT-NEW-4070", "NVIDIA GeForce RTX 4070 12GB"),  # the canonical name: applied
+    ("GT-RYZN", "AMD Ryzn 7 7800X3D"),  # close, under the apply score: proposed
+    ("GT-NOPE", "Some New Part"),  # nothing near it
+]
+
+def _ingest(db, tmp_path, day):
+    path = tmp_path / f"m{day}.csv"
+    path.write_text("sku,name,price,currency,date\n" + "".join(f"{s},{n},100,AED,2025-12-{day}T10:00:00\n" for s, n in ROWS))
+    db.add(RawIngestion(vendor_id="V-A", file_name=path.name, stored_path=str(path), status="PENDING"))
+    db.commit()
+    return run_etl(db)
+
+def _candidates(db):
+    db.expire_all()
+    return {c.vendor_sku: (c.status, c.product_id, c.seen_rows) for c in db.scalars(select(AliasCandidate))}
+
+def _alias(db, sku):
+    return db.scalar(select(ProductAlias).where(ProductAlias.vendor_id == "V-A", ProductAlias.vendor_sku == sku))
+
+def test_matches_are_applied_or_proposed(db, tmp_path):
+    result = _ingest(db, tmp_path, 20)
+    assert (result["loaded_rows"], result["rejected_rows"]) == (1, 2)
+    assert result["alias_matches"] == {"applied": 1, "proposed": 1, "recovered_rows": 1}
+    assert _candidates(db) == {
+        "GT-NEW-4070": ("APPLIED", "P-RTX4070", 1),
+        "GT-RYZN": ("PROPOSED", "P-RYZEN7800X3D", 1),
+    }
+    assert _alias(db, "GT-NEW-4070").product_id == "P-RTX4070"
+    # an applied guess stays out of the name index until a reviewer accepts it
+    assert ("a", _alias(db, "GT-NEW-4070").id) not in alias_index(db)._sources
+
+    # the next ingestion uses the alias and counts the proposal again
+    result = _ingest(db, tmp_path, 21)
+    assert (result["loaded_rows"], result["rejected_rows"]) == (1, 2)
+    assert _candidates(db)["GT-RYZN"] == ("PROPOSED", "P-RYZEN7800X3D", 2)
+
+def test_rejecting_an_applied_match_drops_its_alias(db, tmp_path):
+    _ingest(db, tmp_path, 20)
+    applied = db.scalar(select(AliasCandidate).where(AliasCandidate.vendor_sku == "GT-NEW-4070"))
+    with TestClient(app) as client:
+        assert client.post(f"/aliases/candidates/{applied.id}/accept").json()["status"] == "ACCEPTED"
+        alias_id = _alias(db, "GT-NEW-4070").id
+        assert ("a", alias_id) in alias_index(db)._sources
+        assert client.post(f"/aliases/candidates/{applied.id}/reject").json()["status"] == "REJECTED"
+
+    assert _alias(db, "GT-NEW-4070") is None
+    assert ("a", alias_id) not in alias_index(db)._sources
+    # the SKU is not matched again
+    result = _ingest(db, tmp_path, 21)
+    assert (result["loaded_rows"], result["rejected_rows"]) == (0, 3)
+    assert _candidates(db)["GT-NEW-4070"][0] == "REJECTED"
+
+def test_discarded_decisions_are_not_written(db):
+    ing = RawIngestion(vendor_id="V-A", file_name="m.csv", stored_path="m.csv", status="RUNNING")
+    db.add(ing)
+    db.commit()
+    matcher = AliasMatcher(db, "V-A", ing.id, LookupCache(db))
+    assert matcher.resolve(ROWS) == {"GT-NEW-4070": "P-RTX4070"}
+    # what BatchLoader does when an ingestion fails after the last checkpoint
+    matcher.discard()
+    db.rollback()
+    matcher.flush()
+    db.commit()
+    assert _candidates(db) == {}
+    assert _alias(db, "GT-NEW-4070") is None
@@ -0,0 +1,43 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.etl import run_etl
+from app.main import app
+from app.loader import BatchLoader
+from app.models import RawIngestion, RejectReason
+
+# per data row: a good price, a missing SKU or a zero price
+KINDS = "gsppsgssgpss"
+
+def _row(i, kind):
+    sku = "" if kind == "s" else "GT-RTX4070-12G"
+    price = 0 if kind == "p" else 2500 + i
+    return f"{sku},RTX 4070,{price},AED,2025-12-20T{i:02d}:00:00\n"
+
+@pytest.mark.parametrize("mode", ["row", "columnar"])
+def test_summaries_count_every_rejection_across_checkpoints(db, tmp_path, monkeypatch, mode):
+    monkeypatch.setattr("app.etl.settings.etl_mode", mode)
+    monkeypatch.setattr("app.loader.settings.etl_batch_size", 3)
+    monkeypatch.setattr("app.loader.settings.rejection_sample_cap", 2)
+    path = tmp_path / "r.csv"
+    path.write_text("sku,name,price,currency,date\n" + "".join(_row(i, k) for i, k in enumerate(KINDS)))
+    ing = RawIngestion(vendor_id="V-A", file_name=path.name, stored_path=str(path), status="PENDING")
+    db.add(ing)
+    db.commit()
+    result = run_etl(db)
+    assert (result["loaded_rows"], result["rejected_rows"]) == (3, 9)
+
+    with TestClient(app) as client:
+        summary = client.get(f"/ingestions/{ing.id}/rejections/summary").json()
+        sampled = client.get("/rejections", params={"ingestion_id": ing.id}).json()
+    # rows are file lines; the header is line 1
+    assert summary["reasons"] == [
+        {"reason": "missing_vendor_sku", "rejected_rows": 6, "sampled_rows": 2, "first_row": 3, "last_row": 13},
+        {"reason": "non_positive_price", "rejected_rows": 3, "sampled_rows": 2, "first_row": 4, "last_row": 11},
+    ]
+    assert sorted((r["reason"], r["row_number"]) for r in sampled) == [
+        ("missing_vendor_sku", 3), ("missing_vendor_sku", 6), ("non_positive_price", 4), ("non_positive_price", 5),
+    ]
+    # a loader resuming the ingestion starts from the committed sample counts
+    loader = BatchLoader(db, ing, sample_cap=2)
+    assert not loader.take_sample(RejectReason.MISSING_VENDOR_SKU)
+    assert loader.take_sample(RejectReason.FX_ERROR)
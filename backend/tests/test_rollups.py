@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import select
+from app.etl import run_etl
+from app.models import PriceDailyRollup, RawIngestion
+from app.projections import rebuild_daily_rollups
+
+FIRST = """sku,name,price,currency,date
+GT-RTX4070-12G,x,2599,AED,2025-12-20T10:00:00
+GT-RTX4070-12G,x,2610,AED,2025-12-20T12:00:00
+GT-R7-7800X3D,x,1650,AED,2025-12-20T10:00:00
+"""
+# overwrites the 12:00 RTX point (now the day's low), adds a later one that day, and a new day
+SECOND = """sku,name,price,currency,date
+GT-RTX4070-12G,x,2400,AED,2025-12-20T12:00:00
+GT-RTX4070-12G,x,2620,AED,2025-12-20T18:00:00
+GT-R7-7800X3D,x,1640,AED,2025-12-21T10:00:00
+"""
+
+def _rollups(db):
+    db.expire_all()
+    return sorted(
+        (r.product_id, r.vendor_id, str(r.day), float(r.min_aed), float(r.max_aed), float(r.close_aed), r.close_at, r.samples, float(r.sum_aed))
+        for r in db.scalars(select(PriceDailyRollup))
+    )
+
+@pytest.mark.parametrize("policy", ["skip", "overwrite", "keep-latest-ingestion"])
+def test_rollups_match_a_rebuild(db, tmp_path, monkeypatch, policy):
+    monkeypatch.setattr("app.loader.settings.price_conflict_policy", policy)
+    for i, body in enumerate((FIRST, SECOND)):
+        path = tmp_path / f"a{i}.csv"
+        path.write_text(body)
+        db.add(RawIngestion(vendor_id="V-A", file_name=path.name, stored_path=str(path), status="PENDING"))
+        db.commit()
+        run_etl(db)
+
+    incremental = _rollups(db)
+    rebuild_daily_rollups(db)
+    assert incremental == _rollups(db)
+    rtx = next(r for r in incremental if r[0] == "P-RTX4070")
+    assert rtx[3:5] == ((2400.0, 2620.0) if policy != "skip" else (2599.0, 2620.0))
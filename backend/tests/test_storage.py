@@ -0,0 +1,45 @@
+import gzip
+import io
+from pathlib import Path
+import pytest
+from app import ingest
+from app.ingest import register_ingestion, register_ingestions
+from app.storage import content_path, open_stored, save_gzip_stream, save_stream
+from conftest import SAMPLES
+
+FEED = (SAMPLES / "vendor_a.csv").read_bytes()
+
+def test_the_same_bytes_are_stored_once():
+    path, sha, size = save_stream("a.csv", io.BytesIO(FEED))
+    again = save_stream("copy.csv", io.BytesIO(FEED))
+    assert again == (path, sha, size) and size == len(FEED)
+    assert path == str(content_path(sha, "a.csv"))
+    # the second copy's temp file is replaced onto the same path, not left behind
+    assert not list(Path(path).parents[1].glob(".upload-*"))
+    # a gzip copy hashes as its content, and reads back the same
+    gz_path, gz_sha, gz_size = save_gzip_stream("a.csv.gz", io.BytesIO(gzip.compress(FEED)))
+    assert (gz_sha, gz_size) == (sha, size) and gz_path != path
+    with open_stored(gz_path) as f:
+        assert f.read().encode() == FEED
+    with pytest.raises(ValueError, match="Empty file"):
+        save_stream("empty.csv", io.BytesIO(b""))
+
+def test_registering_known_bytes_returns_the_existing_ingestion(db, monkeypatch):
+    path, sha, _ = save_stream("a.csv", io.BytesIO(FEED))
+    first, duplicate = register_ingestion(db, "V-A", "a.csv", path, sha)
+    assert not duplicate
+    again, duplicate = register_ingestion(db, "V-A", "renamed.csv", path, sha)
+    assert duplicate and again.id == first.id and again.file_name == "a.csv"
+    # the same bytes from another vendor are a separate feed
+    assert register_ingestion(db, "V-C", "a.csv", path, sha)[1] is False
+
+    # a concurrent upload that registered the bytes between the check and the insert
+    lookups = iter([None])
+    monkeypatch.setattr(ingest, "find_duplicate", lambda *a: next(lookups, first))
+    assert register_ingestion(db, "V-A", "a.csv", path, sha) == (first, True)
+
+def test_a_batch_dedupes_against_itself_and_stored_ingestions(db):
+    known, _ = register_ingestion(db, "V-A", "a.csv", "a", "sha-a")
+    out = register_ingestions(db, "V-A", [("b.csv", "b", "sha-b"), ("a2.csv", "a", "sha-a"), ("b2.csv", "b", "sha-b")])
+    assert [(i.file_name, duplicate) for i, duplicate in out] == [("b.csv", False), ("a.csv", True), ("b.csv", True)]
+    assert out[1][0].id == known.id and out[2][0].id == out[0][0].id